@@ -1,36 +1,38 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
 import numpy as np
+from scipy.constants import Boltzmann
 import matplotlib.cm as cm
 from scipy.stats import linregress
 
-plt.style.use('seaborn-whitegrid')  # Set a clean and professional style
-plt.rcParams.update({'font.size': 12, 'figure.dpi': 500}) 
-
 # Getting the differential data and cleaning it up
 parent_directory = os.path.abspath(os.path.join(os.getcwd(), os.pardir))
-csv_files_directory = os.path.join(parent_directory, 'Good_Cryo_Data')
+sys.path.append(parent_directory)
+from noise_store import load_sweeps
+from noise_models import johnson_noise, lookup_table
+from cryo_analysis import CRYO_RESISTANCE, read_temperature_log, spectrum_temperature
+from plot_rendering import apply_style
 
-# List all CSV files in the directory
-csv_files = [f for f in os.listdir(csv_files_directory) if f.endswith('.csv')]
+apply_style(publication_dpi=500)
 
-# Add the 'Feb_06_405_Cold_Diff.csv' file back to the list
-csv_files.append('Feb_06_405_Cold_Diff.csv')
+csv_files_directory = os.path.join(parent_directory, 'Good_cryo_data')
+store = load_sweeps(csv_files_directory)
 
 dataframes = {}
 
-# Loop through each CSV file and create a DataFrame
-for file in csv_files:
-    file_path = os.path.join(csv_files_directory, file)
-    # Read the CSV file and skip the first row (header) using skiprows=1
-    data = pd.read_csv(file_path, skiprows=1, names=['Frequency', '998 kohm'])
+# Create a DataFrame for each spectrum in the store
+for file in store.files:
+    frequency, noise = store.spectrum(file)
     # Store the DataFrame in the dictionary with the file name as the key
-    dataframes[file] = data
+    dataframes[file] = pd.DataFrame({'Frequency': frequency, '998 kohm': noise})
 
 # Constants for theoretical calculations
-k = 1.38e-23  # Boltzmann's constant in J/K
-T = 170  # Convert temperature from Celsius to Kelvin
+k = Boltzmann  # Boltzmann's constant in J/K
+# Temperature of the cold run from the folder's temperature log, or its Cold tag
+T, T_err, _ = spectrum_temperature('Feb_06_405_Cold_Diff.csv', store.metadata['Feb_06_405_Cold_Diff.csv'],
+                                   read_temperature_log(csv_files_directory))
 
 # Get the DataFrame for the experimental results of the 998 kohm resistor
 experimental_df = dataframes['Feb_06_405_Cold_Diff.csv']
@@ -39,7 +41,7 @@ experimental_df = dataframes['Feb_06_405_Cold_Diff.csv']
 color_both = cm.tab10(0)  # Choose a color from tab10 colormap
 
 def thermal_noise_psd(R):
-    return np.sqrt(4 * k * T * R)
+    return johnson_noise(R, T)
 
 # Plotting
 plt.figure(figsize=(10, 6))
@@ -55,13 +57,13 @@ plt.text(max_freq, 0.000001, f'{max_freq} Hz', rotation=90, verticalalignment='b
 # Plot experimental data
 plt.plot(experimental_df['Frequency'], experimental_df['998 kohm'], label='Experimental', color=color_both, marker='o')
 
-# Plot theoretical data
-theoretical_psd = thermal_noise_psd(998e3)  # Calculate theoretical PSD for 998 kohm resistor
-plt.plot(experimental_df['Frequency'], [theoretical_psd] * len(experimental_df), label='Theoretical', linestyle='--', color=color_both)
+# Plot theoretical data for the 998 kohm resistor on the measured frequencies
+theoretical = lookup_table([998e3], T, experimental_df['Frequency'])
+plt.plot(theoretical['Frequency'], theoretical['998000.0 Ohms'], label='Theoretical', linestyle='--', color=color_both)
 
 plt.xlabel("Frequency (Hz)")
 plt.ylabel("Noise (V/$\sqrt{\mathrm{Hz}}$)")
-plt.title("Experimental vs Theoretical Noise, Cryostat (998 kΩ, T ≈ 170 K)")
+plt.title(f"Experimental vs Theoretical Noise, Cryostat (998 kΩ, T ≈ {T:.0f} K)")
 plt.legend()
 
 plt.grid(True)
@@ -75,8 +77,8 @@ frequency_values = experimental_df['Frequency']
 # Calculate theoretical thermal noise PSD uncertainty for each resistor
 std_noise_values = {}
 for file, df in dataframes.items():
-    resistor_value = file.split('_')[2].split('.')[0]  # Extract resistor value from filename
-    Delta_R = 0.01 * float(resistor_value)  # 1% uncertainty in resistance
+    resistor_value = store.metadata[file]['resistance'] or CRYO_RESISTANCE  # Resistor value parsed from the filename
+    Delta_R = 0.01 * resistor_value  # 1% uncertainty in resistance
     
     # Theoretical thermal noise PSD uncertainty
     Delta_S_v = np.sqrt((4 * k * T * Delta_R)**2)
@@ -106,14 +108,14 @@ df_998 = dataframes['Feb_06_405_Cold_Diff.csv']
 # Filter the dataframe to include only the specified frequency range
 filtered_df_998 = df_998[(df_998['Frequency'] >= 190) & (df_998['Frequency'] <= 2000)]
 
-# Calculate theoretical thermal noise PSD for the 998 kΩ resistor
-theoretical_psd_998 = thermal_noise_psd(998e3)
+# Theoretical thermal noise for the 998 kΩ resistor on the filtered frequencies
+theoretical_998 = lookup_table([998e3], T, filtered_df_998['Frequency'])
 
 # Plot experimental data with error bars
 plt.errorbar(filtered_df_998['Frequency'], filtered_df_998['998 kohm'], yerr=std_noise_values['Feb_06_405_Cold_Diff.csv'], label='Experimental 998 kΩ', fmt='o', markersize=3, ecolor='lightgray', elinewidth=3, capsize=0)
 
 # Plot theoretical data
-plt.plot(filtered_df_998['Frequency'], [theoretical_psd_998] * len(filtered_df_998), label='Theoretical 998 kΩ', linestyle='--', color=color_998)
+plt.plot(theoretical_998['Frequency'], theoretical_998['998000.0 Ohms'], label='Theoretical 998 kΩ', linestyle='--', color=color_998)
 
 plt.xlabel("Frequency (Hz)")
 plt.ylabel("Noise (V/$\sqrt{\mathrm{Hz}}$)")
@@ -1,102 +1,73 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 import os
+import sys
 import numpy as np
+from scipy.constants import Boltzmann
 import matplotlib.cm as cm
-from scipy.stats import linregress
-
-plt.style.use('seaborn-whitegrid')  # A clean and professional style
-plt.rcParams.update({'font.size': 12, 'figure.dpi': 500}) 
 
 #%% Getting the differential data and cleaning it up
 
 parent_directory = os.path.abspath(os.path.join(os.getcwd(), os.pardir))
+sys.path.append(parent_directory)
+from noise_store import load_sweeps
+from noise_models import johnson_noise, lookup_table
+from paired_comparison import compare_sweeps
+from band_stats import band_statistics, fit_lines, boltzmann_from_slope
+from plot_rendering import apply_style, show_figure
+sys.path.append(os.path.dirname(parent_directory))
+from monte_carlo import boltzmann_distribution
+
+apply_style(publication_dpi=500)
+
 csv_files_directory = os.path.join(parent_directory, 'Differential')
 
-# List all CSV files in the directory
-csv_files = [f for f in os.listdir(csv_files_directory) if f.endswith('.csv')]
-
-# Initialize an empty dictionary to store DataFrames
-dataframes = {}
-
-# Loop through each CSV file and create a DataFrame with the title as the resistance value
-for file in csv_files:
-    resistor_value = file.split('_')[3]
-    file_path = os.path.join(csv_files_directory, file)
-    data = pd.read_csv(file_path, sep=',', names=['Frequency', 'Noise'])
-    dataframes[resistor_value] = data
-
-# Remove the headers from all three dataframes
-for resistor_value, dataframe in dataframes.items():
-    dataframes[resistor_value] = dataframe.drop(0)
-# Combine all dataframes into one dataframe
-# Initialize an empty dataframe with just the 'Frequency' column
-combined_dataframe = dataframes[list(dataframes.keys())[0]][['Frequency']]
-
-# Iterate through the dataframes and append the 'Noise' columns
-for resistor_value, dataframe in dataframes.items():
-    if resistor_value != '50':
-        combined_dataframe[resistor_value + ' Ohms'] = dataframe['Noise'].values
-
-# Reset the index
-combined_dataframe.reset_index(drop=True, inplace=True)
-combined_dataframe = combined_dataframe.apply(pd.to_numeric, errors='coerce')
-headers = ['Frequency', '1492500.0 Ohms', '250000.0 Ohms', '510000.0 Ohms', '998000.0 Ohms']
-
-# Set the headers of the combined_dataframe
-combined_dataframe.columns = headers
+store = load_sweeps(csv_files_directory)
+
+# Combine all spectra into one dataframe, with the resistor value of each file (sweep_metadata) as the header
+columns = {file: str(store.metadata[file]['resistance']) + ' Ohms' for file in store.files}
+combined_dataframe = store.combined_dataframe(columns)
 print(combined_dataframe)
 #%% Calculating theoretical stuff
 # Constants
-k = 1.38e-23  # Boltzmann's constant in J/K
+k = Boltzmann  # Boltzmann's constant in J/K
 T = 22.5 + 273.15  # Convert temperature from Celsius to Kelvin
 
 # Resistance values for specific comparison points
-special_resistances = [1492.5e3, 250e3, 510e3, 0.998e6]  # Omitting the 50 ohm value for clarity
+special_resistances = [store.metadata[file]['resistance'] for file in store.files]
 
 
 def thermal_noise_psd(R):
-    return np.sqrt(4 * k * T * R)
+    return johnson_noise(R, T)
 
 def thermal_noise_psd_squared(R, k_fit):
     return 4 * k_fit * T * R
 
 frequency_values = combined_dataframe['Frequency'].values
+# Theoretical Johnson noise of every resistor on the measured frequency grid
+theoretical = lookup_table(special_resistances, T, frequency_values)
 
 print(combined_dataframe)
 
 #%%Plotting
-plt.figure(figsize=(10, 6))
 colors = cm.tab10(np.linspace(0, 1, len(special_resistances)))
 
 # Iterate through the combined_dataframe columns and special_resistances with corresponding colors
+series = []
 for i, (resistor_value, color) in enumerate(zip(combined_dataframe.columns[1:], colors)):
     formatted_resistor_value = f'{resistor_value.split("KOhm")[0]} K$\\Omega$'
-    plt.plot(frequency_values, combined_dataframe[resistor_value], label=formatted_resistor_value, linewidth=2, color=color, marker ='o')
+    series.append({'x': frequency_values, 'y': combined_dataframe[resistor_value], 'label': formatted_resistor_value,
+                   'color': color, 'fmt': '-o', 'kwargs': {'linewidth': 2}})
 
 for i, R in enumerate(special_resistances):
-    noise_psd = thermal_noise_psd(R)
     label = f'Theoretical {R / 1e3:.0f} kΩ' if R >= 1e3 else f'Theoretical {R:.0f} Ω'
     theoretical_color = colors[i % len(colors)]  # Reuse the same colors from the list
-    plt.plot(frequency_values, [noise_psd]*len(frequency_values), label=label, linewidth=2, linestyle='--', color=theoretical_color)
+    series.append({'x': frequency_values, 'y': theoretical[f"{float(R)} Ohms"], 'label': label,
+                   'color': theoretical_color, 'fmt': '--', 'kwargs': {'linewidth': 2}})
 
 min_freq = 190
 max_freq = 2000
-plt.axvline(x=min_freq, color='gray', linestyle='--', linewidth=1)
-plt.axvline(x=max_freq, color='gray', linestyle='--', linewidth=1)
-plt.text(min_freq, 0.000001, f'{min_freq} Hz', rotation=90, verticalalignment='bottom')
-plt.text(max_freq, 0.000001, f'{max_freq} Hz', rotation=90, verticalalignment='bottom')
-
-
-plt.xlabel("Frequency (Hz)")
-plt.ylabel("Noise (V/$\sqrt{\mathrm{Hz}}$)")
-plt.title("Differential Noise Measurements for Different Resistors")
-plt.legend(title="Resistor Value")
-plt.grid(True)
-plt.yscale('log')
-plt.xscale('log')
-plt.tight_layout()
-plt.show()
+show_figure({'template': {'kind': 'spectrum', 'title': "Differential Noise Measurements for Different Resistors",
+                          'band': (min_freq, max_freq), 'legend_title': "Resistor Value"},
+             'series': series})
 
 #%% Noise calculations
 T_Celsius = 22.5  # Temperature in Celsius
@@ -129,91 +100,63 @@ for resistor, uncertainty in std_noise_values.items():
 # Filter the frequency values
 filtered_frequency_values = frequency_values[(frequency_values >= 190) & (frequency_values <= 2000)]
 
-plt.figure(figsize=(10, 6))
-
-
-# Iterate through the combined_dataframe columns and special_resistances with corresponding colors
+series = []
 for i, (resistor_value, color) in enumerate(zip(combined_dataframe.columns[1:], colors)):
     R_value = float(resistor_value.split()[0])  # Extract the numeric resistor value from the column name
     label = f'{R_value / 1e3:.0f} kΩ' if R_value >= 1e3 else f'{R_value:.0f} Ω'
-    # Filter the noise values based on the filtered frequency values
     filtered_noise_values = combined_dataframe[resistor_value][(frequency_values >= 190) & (frequency_values <= 2000)]
     std_noise = std_noise_values[resistor_value]  # Assuming you have a dictionary of standard deviations
-    plt.plot(filtered_frequency_values, filtered_noise_values, color=color, linestyle='-', marker='o', label=label)
-
-    # Plot with error bars
-    plt.errorbar(filtered_frequency_values, filtered_noise_values, yerr=std_noise, fmt='o', color=color, ecolor='lightgray', elinewidth=3, capsize=0)
+    series.append({'x': filtered_frequency_values, 'y': filtered_noise_values, 'label': label, 'color': color, 'fmt': '-o'})
+    # Error bars
+    series.append({'x': filtered_frequency_values, 'y': filtered_noise_values, 'yerr': std_noise, 'style': 'errorbar',
+                   'color': color})
 
+# Theoretical noise, in the colors of the experimental data
 for i, R in enumerate(special_resistances):
-    noise_psd = thermal_noise_psd(R)
     label = f'Theoretical {R / 1e3:.0f} kΩ' if R >= 1e3 else f'Theoretical {R:.0f} Ω'
-    theoretical_color = colors[i % len(colors)]  # Reuse the same colors from the list
-    # Plot the theoretical noise values only for the filtered frequency values
-    plt.plot(filtered_frequency_values, [noise_psd] * len(filtered_frequency_values), label=label, linewidth=2, linestyle='--', color=theoretical_color)
-
-plt.xlabel("Frequency (Hz)")
-plt.ylabel("Noise (V/$\sqrt{\mathrm{Hz}}$)")
-plt.title("Experimental and Theoretical Thermal Noise vs. Frequency (190 Hz to 2000 Hz)")
-plt.legend(title="Resistor Value", loc='upper left', bbox_to_anchor=(1.02, 1), ncol=1)
-plt.grid(True)
-plt.yscale('log')
-plt.xscale('log')
-plt.tight_layout()
-plt.show()
+    filtered_theoretical = theoretical[f"{float(R)} Ohms"][(frequency_values >= 190) & (frequency_values <= 2000)]
+    series.append({'x': filtered_frequency_values, 'y': filtered_theoretical, 'label': label,
+                   'color': colors[i % len(colors)], 'fmt': '--', 'kwargs': {'linewidth': 2}})
+
+# Legend outside the plot
+show_figure({'template': {'kind': 'spectrum', 'title': "Experimental and Theoretical Thermal Noise vs. Frequency (190 Hz to 2000 Hz)",
+                          'legend_title': "Resistor Value", 'legend_outside': True},
+             'series': series})
 
 #%%
 
-average_noise_squared_and_uncertainty = {}
-
-for resistor_value in combined_dataframe.columns[1:]:
-    # Filter the noise values for the frequency band
-    filtered_noise_values = combined_dataframe[resistor_value][(combined_dataframe['Frequency'] >= 190) & (combined_dataframe['Frequency'] <= 1500)]
-    avg_noise = np.mean(filtered_noise_values)
-    avg_noise_squared = avg_noise ** 2
-    std_dev_noise = np.std(filtered_noise_values, ddof=1)  # Calculate standard deviation
-    # Number of measurements
-    N = len(filtered_noise_values)
-    # Standard error of the mean
-    sem_noise = std_dev_noise / np.sqrt(N)
-    # Error propagation for the average noise squared
-    error_avg_noise_squared = 2 * avg_noise * sem_noise
-    # Store in the dictionary
-    average_noise_squared_and_uncertainty[str(resistor_value)] = (avg_noise_squared, error_avg_noise_squared)
-
-# ... [additional code] ...
-
-# Extract the average noise squared values and their uncertainties
-avg_noise_squared_values = [val[0] for val in average_noise_squared_and_uncertainty.values()]
-avg_noise_squared_uncertainties = [val[1] for val in average_noise_squared_and_uncertainty.values()]
+# Average noise squared and its propagated uncertainty for every resistor in one pass
+noise_matrix = combined_dataframe[combined_dataframe.columns[1:]].values.T
+band = band_statistics(combined_dataframe['Frequency'].values, noise_matrix, (190, 1500))
+avg_noise_squared_values = band['mean_squared']
+avg_noise_squared_uncertainties = band['mean_squared_error']
 resistance_values = special_resistances
 # Calculate the 1% resistance uncertainties for the x-axis
 resistance_uncertainties = [0.01 * R for R in resistance_values]
 
 
-plt.figure(figsize=(10, 6))
-# Plot the average noise squared with error bars
-plt.errorbar(resistance_values, avg_noise_squared_values, xerr=resistance_uncertainties, yerr=avg_noise_squared_uncertainties, fmt='o', color='black', label='Average Noise Squared', ecolor='red', elinewidth=3, capsize=0)
-
 # Perform linear regression
 # Calculate Boltzmann's constant
-slope, intercept, r_value, p_value, std_err = linregress(resistance_values, avg_noise_squared_values)
+fit = fit_lines(resistance_values, avg_noise_squared_values)
+slope, intercept, r_value, std_err = fit['slope'], fit['intercept'], fit['r_value'], fit['slope_err']
+
+# Weighted fit using the uncertainty of each average noise squared point
+weighted_fit = fit_lines(resistance_values, avg_noise_squared_values, sigma=avg_noise_squared_uncertainties)
 
 # Create the linear regression line
 linear_fit = slope * np.array(resistance_values) + intercept
 noise = 'noise'
 equation_text = f'Linear Fit: $V_{{{noise}}}^2 = {slope:.2e} \\cdot R + {intercept:.2e}$'
 
-# Plot the linear regression line
-plt.plot(resistance_values, linear_fit, color='blue', label = equation_text)
-
-plt.legend()
-plt.title("Differential Average Noise Squared Vs Resistance", y = 1.05)
-plt.xlabel("Resistance ($\Omega$)")
-plt.ylabel("Noise Squared ($V^2$/${\mathrm{Hz}}$)")
-plt.tight_layout()
-plt.show()
+# Average noise squared with error bars and the fitted line
+show_figure({'template': {'kind': 'errorbar', 'title': "Differential Average Noise Squared Vs Resistance",
+                          'xlabel': "Resistance ($\\Omega$)", 'ylabel': "Noise Squared ($V^2$/${\\mathrm{Hz}}$)"},
+             'series': [{'x': resistance_values, 'y': avg_noise_squared_values, 'xerr': resistance_uncertainties,
+                         'yerr': avg_noise_squared_uncertainties, 'style': 'errorbar', 'color': 'black',
+                         'ecolor': 'red', 'label': 'Average Noise Squared'},
+                        {'x': resistance_values, 'y': linear_fit, 'color': 'blue', 'label': equation_text}]})
 
-actual_boltzmann_constant = 1.38e-23  # Actual Boltzmann's constant value
+actual_boltzmann_constant = Boltzmann  # CODATA value
 calculated_slope = slope/(4 * T)  # Your calculated slope
 
 # The error in the slope from the linear regression is std_err
@@ -224,9 +167,6 @@ boltzmann_constant_error = std_err / (4 * T)
 calculated_slope = slope / (4 * T)
 calculated_slope_error = boltzmann_constant_error
 
-# Calculate percent error
-actual_boltzmann_constant = 1.38e-23
-
 # Calculate the experimental Boltzmann's constant
 experimental_boltzmann_constant = calculated_slope
 
@@ -244,18 +184,21 @@ print(f"Experimental Boltzmann's constant: {experimental_boltzmann_constant:.2e}
 
 # Print the percent error and its uncertainty
 print(f"Percent error: {percent_error:.2f}% ± {percent_error_uncertainty:.2f}%")
+
+# Boltzmann's constant from the fit weighted by the noise squared uncertainties
+weighted_k, weighted_k_error, weighted_percent_error = boltzmann_from_slope(weighted_fit['slope'], weighted_fit['slope_err'], T)
+print(f"Weighted fit Boltzmann's constant: {weighted_k:.2e} J/K ± {weighted_k_error:.2e} J/K ({weighted_percent_error:.2f}% error)")
+
+# Distribution of k with the 1% resistor tolerance, the V^2 uncertainties and Delta_T propagated
+k_distribution = boltzmann_distribution(resistance_values, avg_noise_squared_values, avg_noise_squared_uncertainties, T,
+                                        delta_T=Delta_T, tolerance=0.01, n_draws=100000, seed=0)['k']
+print(f"Monte Carlo Boltzmann's constant: {k_distribution['mean']:.2e} J/K ± {k_distribution['std']:.2e} J/K "
+      f"(95% interval {k_distribution['ci'][0]:.2e} to {k_distribution['ci'][1]:.2e} J/K)")
 #%%
-average_noise_bandwidth = {}
-average_noise_bandwidth_uncertainty = {}
-
-for resistor_value in resistance_values:
-    noise_data = combined_dataframe[str(resistor_value) + ' Ohms'][(combined_dataframe['Frequency'] >= min_freq) & (combined_dataframe['Frequency'] <= max_freq)]
-    average_noise = np.mean(noise_data)
-    std_dev_noise = np.std(noise_data, ddof=1)
-    N = len(noise_data)
-    sem_noise = std_dev_noise / np.sqrt(N)
-    average_noise_bandwidth[str(resistor_value)] = average_noise
-    average_noise_bandwidth_uncertainty[str(resistor_value)] = sem_noise
+# Average noise over the limited bandwidth for every resistor
+band = band_statistics(combined_dataframe['Frequency'].values, noise_matrix, (min_freq, max_freq))
+average_noise_bandwidth = dict(zip(map(str, resistance_values), band['mean']))
+average_noise_bandwidth_uncertainty = dict(zip(map(str, resistance_values), band['sem']))
 
 # Print the average noise reading over the limited bandwidth with the uncertainty
 for resistor_value in sorted(resistance_values):
@@ -263,3 +206,12 @@ for resistor_value in sorted(resistance_values):
     uncertainty = average_noise_bandwidth_uncertainty[str(resistor_value)]
     theoretical_noise = thermal_noise_psd(resistor_value)
     print(f"Resistor {resistor_value / 1e3:.0f} kΩ: Average Noise = {average_noise:.2e} V/sqrt(Hz) ± {uncertainty:.2e}, Theoretical = {theoretical_noise:.2e} V/sqrt(Hz)")
+
+#%% Single-ended vs differential
+# The same resistors measured single-ended, paired by resistance on a shared frequency index
+comparison = compare_sweeps(os.path.join(parent_directory, 'Jan_30_Clean_Data'), csv_files_directory, band=(190, 1500), T=T, T_err=Delta_T)
+for mode in ('single_ended', 'differential'):
+    mode_fit = comparison[mode + '_fit']
+    print(f"{mode.replace('_', '-').capitalize()} Boltzmann's constant: {mode_fit['k']:.2e} J/K ± {mode_fit['k_err']:.2e} J/K ({mode_fit['percent_error']:.2f}% error)")
+joint = comparison['joint']
+print(f"Combined Boltzmann's constant: {joint['k']:.2e} J/K ± {joint['k_err']:.2e} J/K (Birge ratio {joint['birge_ratio']:.1f}), modes differ by {joint['z']:.1f} sigma")
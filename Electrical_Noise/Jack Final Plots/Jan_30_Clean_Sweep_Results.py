@@ -1,106 +1,70 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 import os
+import sys
 import numpy as np
+from scipy.constants import Boltzmann
 import matplotlib.cm as cm
-from scipy.stats import linregress
 
-plt.style.use('seaborn-whitegrid')  # Set a clean and professional style
-plt.rcParams.update({'font.size': 12, 'figure.dpi': 500}) 
-
-# Getting the differential data and cleaning it up
+# Getting the single-ended data from the binary noise store
 parent_directory = os.path.abspath(os.path.join(os.getcwd(), os.pardir))
-csv_files_directory = os.path.join(parent_directory, 'Jan_30_Clean_Data')
-
-# List all CSV files in the directory
-csv_files = [f for f in os.listdir(csv_files_directory) if f.endswith('.csv')]
-
-dataframes = {}
-
-# Specify the resistor values directly, excluding the 50 Ohm data
-resistance_values = [1492.5e3, 250e3, 50, 510e3, 998e3]
-
-# Sort the CSV files to match the resistor values and exclude the 50 Ohm data
-sorted_csv_files = sorted([f for f in csv_files if f.endswith('.csv') and not f.startswith('50')])
-
-# Check if the number of sorted files matches the number of resistor values
-if len(sorted_csv_files) != len(resistance_values):
-    raise ValueError("The number of sorted CSV files does not match the number of resistor values provided.")
+sys.path.append(parent_directory)
+from noise_store import load_sweeps
+from noise_models import johnson_noise, lookup_table
+from band_stats import band_statistics, fit_lines, boltzmann_from_slope
+from plot_rendering import apply_style, show_figure
+from instrument_response import corrected_matrix
+sys.path.append(os.path.dirname(parent_directory))
+from monte_carlo import boltzmann_distribution
 
-# Loop through each CSV file and map it to a resistor value
-for file, resistor_value in zip(sorted_csv_files, resistance_values):
-    file_path = os.path.join(csv_files_directory, file)
-    data = pd.read_csv(file_path, sep=',', names=['Frequency', 'Noise'])
+apply_style(publication_dpi=500)
 
-    # Store the DataFrame in the dictionary with the resistor value as the key
-    dataframes[str(resistor_value)] = data
-
-#%%
-# Remove the headers from all dataframes
-for resistor_value, dataframe in dataframes.items():
-    if resistor_value != '50':
-        dataframes[resistor_value] = dataframe.drop(0)
-
-# Combine all dataframes into one dataframe with just the 'Frequency' column initially
-combined_dataframe = dataframes[list(dataframes.keys())[0]][['Frequency']]
+csv_files_directory = os.path.join(parent_directory, 'Jan_30_Clean_Data')
+store = load_sweeps(csv_files_directory)
 
-# Iterate through the dataframes and append the 'Noise' columns
-for resistor_value, dataframe in dataframes.items():
-    if resistor_value != '50':
-        combined_dataframe[resistor_value + ' Ohms'] = dataframe['Noise'].values
+# Resistor value of each file, parsed from the file name
+resistance_by_file = {file: store.metadata[file]['resistance'] for file in store.files}
+resistance_values = list(resistance_by_file.values())
 
-# Reset the index of the combined dataframe and convert all columns to numeric
-combined_dataframe.reset_index(drop=True, inplace=True)
-combined_dataframe = combined_dataframe.apply(pd.to_numeric, errors='coerce')
+# Map each file to a resistor value column, excluding the 50 Ohm data
+columns = {file: str(resistor_value) + ' Ohms' for file, resistor_value in resistance_by_file.items() if resistor_value != 50}
+combined_dataframe = store.combined_dataframe(columns)
 
 
 # Constants for theoretical calculations
-k = 1.38e-23  # Boltzmann's constant in J/K
+k = Boltzmann  # Boltzmann's constant in J/K
 T = 22.5 + 273.15  # Convert temperature from Celsius to Kelvin
 
 def thermal_noise_psd(R):
-    return np.sqrt(4 * k * T * R)
+    return johnson_noise(R, T)
 
 frequency_values = combined_dataframe['Frequency'].values
 resistance_values = [value for value in resistance_values if value != 50]
+# Theoretical Johnson noise of every resistor on the measured frequency grid
+theoretical = lookup_table(resistance_values, T, frequency_values)
 print(combined_dataframe.columns)
 #%% Plotting
-plt.figure(figsize=(10, 6))
-
 # Define a list of colors for the plots
 colors = cm.tab10(np.linspace(0, 1, len(resistance_values)))
 
-# Plot experimental data
-# Plot experimental data
+# Experimental data
+series = []
 for i, (resistor_value, color) in enumerate(zip(combined_dataframe.columns[1:], colors)):
     R_value = float(resistor_value.split()[0])  # Extract the numeric resistor value from the column name
     label = f'{R_value / 1e3:.0f} kΩ' if R_value >= 1e3 else f'{R_value:.0f} Ω'
-    plt.plot(frequency_values, combined_dataframe[resistor_value], label=label, linewidth=2, color=color, marker = 'o')
+    series.append({'x': frequency_values, 'y': combined_dataframe[resistor_value], 'label': label, 'color': color,
+                   'fmt': '-o', 'kwargs': {'linewidth': 2}})
 
-# Plot theoretical data
+# Theoretical data, in the same color as the experimental data
 for i, R in enumerate(resistance_values):
-    noise_psd = thermal_noise_psd(R)
     label = f'Theoretical {R / 1e3:.0f} kΩ' if R >= 1e3 else f'Theoretical {R:.0f} Ω'
-    # Use the same color for the theoretical line as the experimental data
-    plt.plot(frequency_values, [noise_psd]*len(frequency_values), label=label, linewidth=2, linestyle='--', color=colors[i])
+    series.append({'x': frequency_values, 'y': theoretical[f"{float(R)} Ohms"], 'label': label, 'color': colors[i],
+                   'fmt': '--', 'kwargs': {'linewidth': 2}})
 min_freq = 190
 max_freq = 1500
-plt.axvline(x=min_freq, color='gray', linestyle='--', linewidth=1)
-plt.axvline(x=max_freq, color='gray', linestyle='--', linewidth=1)
-
-plt.text(min_freq, 0.000001, f'{min_freq} Hz', rotation=90, verticalalignment='bottom')
-plt.text(max_freq, 0.000001, f'{max_freq} Hz', rotation=90, verticalalignment='bottom')
-
 
-plt.xlabel("Frequency (Hz)")
-plt.ylabel("Noise (V/$\sqrt{\mathrm{Hz}}$)")
-plt.title("Single-Ended Noise Measurements for Different Resistors")
-plt.legend(title="Resistor Value", loc='upper right', ncol=2)  # Adjust legend columns for better readability
-plt.grid(True)
-plt.yscale('log')
-plt.xscale('log')
-plt.tight_layout()
-plt.show()
+show_figure({'template': {'kind': 'spectrum', 'title': "Single-Ended Noise Measurements for Different Resistors",
+                          'band': (min_freq, max_freq), 'legend_title': "Resistor Value", 'legend_loc': 'upper right',
+                          'legend_columns': 2},
+             'series': series})
 
 #%% Noise calculations
 T_Celsius = 22.5  # Temperature in Celsius
@@ -132,92 +96,65 @@ for resistor, uncertainty in std_noise_values.items():
 # Filter the frequency values
 filtered_frequency_values = frequency_values[(frequency_values >= 190) & (frequency_values <= 1500)]
 
-plt.figure(figsize=(10, 6))
-# Plot experimental data with filtered noise values
+series = []
 for i, (resistor_value, color) in enumerate(zip(combined_dataframe.columns[1:], colors)):
     R_value = float(resistor_value.split()[0])  # Extract the numeric resistor value from the column name
     label = f'{R_value / 1e3:.0f} kΩ' if R_value >= 1e3 else f'{R_value:.0f} Ω'
     filtered_noise_values = combined_dataframe[resistor_value][(frequency_values >= 190) & (frequency_values <= 1500)]
     std_noise = std_noise_values[resistor_value]  # Assuming you have a dictionary of standard deviations
-    plt.plot(filtered_frequency_values, filtered_noise_values, color=color, linestyle='-', marker='o', label=label)
+    series.append({'x': filtered_frequency_values, 'y': filtered_noise_values, 'label': label, 'color': color, 'fmt': '-o'})
+    # Error bars
+    series.append({'x': filtered_frequency_values, 'y': filtered_noise_values, 'yerr': std_noise, 'style': 'errorbar',
+                   'color': color})
 
-    # Plot with error bars
-    plt.errorbar(filtered_frequency_values, filtered_noise_values, yerr=std_noise, fmt='o', color=color, ecolor='lightgray', elinewidth=3, capsize=0)
-
-
-# Plot theoretical data with matching colors
+# Theoretical noise, in the colors of the experimental data
 for i, R in enumerate(resistance_values):
-    noise_psd = thermal_noise_psd(R)
     label = f'Theoretical {R / 1e3:.0f} kΩ' if R >= 1e3 else f'Theoretical {R:.0f} Ω'
-    plt.plot(filtered_frequency_values, [noise_psd] * len(filtered_frequency_values), label=label, linewidth=2, linestyle='--', color=colors[i])
+    filtered_theoretical = theoretical[f"{float(R)} Ohms"][(frequency_values >= 190) & (frequency_values <= 1500)]
+    series.append({'x': filtered_frequency_values, 'y': filtered_theoretical, 'label': label,
+                   'color': colors[i], 'fmt': '--', 'kwargs': {'linewidth': 2}})
 
-plt.xlabel("Frequency (Hz)")
-plt.ylabel("Noise(V/$\sqrt{\mathrm{Hz}}$)")
-plt.title("Experimental and Theoretical Thermal Noise (190 Hz to 1500 Hz)")
-# Move the legend outside the plot and adjust its position
-plt.legend(title="Resistor Value", loc='upper left', bbox_to_anchor=(1.02, 1), ncol=1)
-plt.grid(True)
-plt.yscale('log')
-plt.xscale('log')
-plt.tight_layout()
-plt.show()
+# Legend outside the plot
+show_figure({'template': {'kind': 'spectrum', 'title': "Experimental and Theoretical Thermal Noise (190 Hz to 1500 Hz)",
+                          'legend_title': "Resistor Value", 'legend_outside': True},
+             'series': series})
 
 
 #%%Determining Boltzmann's constant
 
 
-# Calculate the average noise squared and its uncertainty for each resistor
-average_noise_squared_and_uncertainty = {}
-
-for resistor_value in combined_dataframe.columns[1:]:
-    # Filter the noise values for the frequency band
-    filtered_noise_values = combined_dataframe[resistor_value][(combined_dataframe['Frequency'] >= 190) & (combined_dataframe['Frequency'] <= 1500)]
-    avg_noise = np.mean(filtered_noise_values)
-    avg_noise_squared = avg_noise ** 2
-    std_dev_noise = np.std(filtered_noise_values, ddof=1)  # Calculate standard deviation
-    # Number of measurements
-    N = len(filtered_noise_values)
-    # Standard error of the mean
-    sem_noise = std_dev_noise / np.sqrt(N)
-    # Error propagation for the average noise squared
-    error_avg_noise_squared = 2 * avg_noise * sem_noise
-    # Store in the dictionary
-    average_noise_squared_and_uncertainty[str(resistor_value)] = (avg_noise_squared, error_avg_noise_squared)
-
-# ... [additional code] ...
-
-# Extract the average noise squared values and their uncertainties
-avg_noise_squared_values = [val[0] for val in average_noise_squared_and_uncertainty.values()]
-avg_noise_squared_uncertainties = [val[1] for val in average_noise_squared_and_uncertainty.values()]
+# Average noise squared and its propagated uncertainty for every resistor in one pass
+noise_matrix = combined_dataframe[combined_dataframe.columns[1:]].values.T
+band = band_statistics(combined_dataframe['Frequency'].values, noise_matrix, (190, 1500))
+avg_noise_squared_values = band['mean_squared']
+avg_noise_squared_uncertainties = band['mean_squared_error']
 
 # Calculate the 1% resistance uncertainties for the x-axis
 resistance_uncertainties = [0.01 * R for R in resistance_values]
 
 
-plt.figure(figsize=(10, 6))
-# Plot the average noise squared with error bars
-plt.errorbar(resistance_values, avg_noise_squared_values, xerr=resistance_uncertainties, yerr=avg_noise_squared_uncertainties, fmt='o', color='black', label='Average Noise Squared', ecolor='red', elinewidth=3, capsize=0)
-
 # Perform linear regression
 # Calculate Boltzmann's constant
-slope, intercept, r_value, p_value, std_err = linregress(resistance_values, avg_noise_squared_values)
+fit = fit_lines(resistance_values, avg_noise_squared_values)
+slope, intercept, r_value, std_err = fit['slope'], fit['intercept'], fit['r_value'], fit['slope_err']
+
+# Weighted fit using the uncertainty of each average noise squared point
+weighted_fit = fit_lines(resistance_values, avg_noise_squared_values, sigma=avg_noise_squared_uncertainties)
 
 # Create the linear regression line
 linear_fit = slope * np.array(resistance_values) + intercept
 noise = 'noise'
 equation_text = f'Linear Fit: $V_{{{noise}}}^2 = {slope:.2e} \\cdot R + {intercept:.2e}$'
 
-# Plot the linear regression line
-plt.plot(resistance_values, linear_fit, color='blue', label = equation_text)
+# Average noise squared with error bars and the fitted line
+show_figure({'template': {'kind': 'errorbar', 'title': "Single-Ended Average Noise Squared Vs Resistance",
+                          'xlabel': "Resistance ($\\Omega$)", 'ylabel': "Noise Squared ($V^2$/${\\mathrm{Hz}}$)"},
+             'series': [{'x': resistance_values, 'y': avg_noise_squared_values, 'xerr': resistance_uncertainties,
+                         'yerr': avg_noise_squared_uncertainties, 'style': 'errorbar', 'color': 'black',
+                         'ecolor': 'red', 'label': 'Average Noise Squared'},
+                        {'x': resistance_values, 'y': linear_fit, 'color': 'blue', 'label': equation_text}]})
 
-plt.legend()
-plt.title("Single-Ended Average Noise Squared Vs Resistance", y = 1.05)
-plt.xlabel("Resistance ($\Omega$)")
-plt.ylabel("Noise Squared ($V^2$/${\mathrm{Hz}}$)")
-plt.tight_layout()
-plt.show()
-
-actual_boltzmann_constant = 1.38e-23  # Actual Boltzmann's constant value
+actual_boltzmann_constant = Boltzmann  # CODATA value
 calculated_slope = slope/(4 * T)  # Your calculated slope
 
 # The error in the slope from the linear regression is std_err
@@ -232,18 +169,28 @@ calculated_slope_error = boltzmann_constant_error
 percent_error = np.abs((calculated_slope - actual_boltzmann_constant) / actual_boltzmann_constant) * 100
 percent_error_in_slope = (calculated_slope_error / calculated_slope) * 100
 
-#%%
-average_noise_bandwidth = {}
-average_noise_bandwidth_uncertainty = {}
+# Boltzmann's constant from the fit weighted by the noise squared uncertainties
+weighted_k, weighted_k_error, weighted_percent_error = boltzmann_from_slope(weighted_fit['slope'], weighted_fit['slope_err'], T)
+print(f"Weighted fit Boltzmann's constant: {weighted_k:.2e} J/K ± {weighted_k_error:.2e} J/K ({weighted_percent_error:.2f}% error)")
 
-for resistor_value in resistance_values:
-    noise_data = combined_dataframe[str(resistor_value) + ' Ohms'][(combined_dataframe['Frequency'] >= min_freq) & (combined_dataframe['Frequency'] <= max_freq)]
-    average_noise = np.mean(noise_data)
-    std_dev_noise = np.std(noise_data, ddof=1)
-    N = len(noise_data)
-    sem_noise = std_dev_noise / np.sqrt(N)
-    average_noise_bandwidth[str(resistor_value)] = average_noise
-    average_noise_bandwidth_uncertainty[str(resistor_value)] = sem_noise
+# Same fit on the spectra corrected for the amplifier noise floor and the input roll-off
+corrected_frequency, corrected_noise = corrected_matrix(store, list(columns))
+corrected_band = band_statistics(corrected_frequency, corrected_noise, (190, 1500))
+corrected_fit = fit_lines(resistance_values, corrected_band['mean_squared'])
+corrected_k, corrected_k_error, corrected_percent_error = boltzmann_from_slope(corrected_fit['slope'], corrected_fit['slope_err'], T)
+print(f"Corrected spectra Boltzmann's constant: {corrected_k:.2e} J/K ± {corrected_k_error:.2e} J/K ({corrected_percent_error:.2f}% error)")
+
+# Distribution of k with the 1% resistor tolerance, the V^2 uncertainties and Delta_T propagated
+k_distribution = boltzmann_distribution(resistance_values, avg_noise_squared_values, avg_noise_squared_uncertainties, T,
+                                        delta_T=Delta_T, tolerance=0.01, n_draws=100000, seed=0)['k']
+print(f"Monte Carlo Boltzmann's constant: {k_distribution['mean']:.2e} J/K ± {k_distribution['std']:.2e} J/K "
+      f"(95% interval {k_distribution['ci'][0]:.2e} to {k_distribution['ci'][1]:.2e} J/K)")
+
+#%%
+# Average noise over the limited bandwidth for every resistor
+band = band_statistics(combined_dataframe['Frequency'].values, noise_matrix, (min_freq, max_freq))
+average_noise_bandwidth = dict(zip(map(str, resistance_values), band['mean']))
+average_noise_bandwidth_uncertainty = dict(zip(map(str, resistance_values), band['sem']))
 
 # Print the average noise reading over the limited bandwidth with the uncertainty
 for resistor_value in sorted(resistance_values):
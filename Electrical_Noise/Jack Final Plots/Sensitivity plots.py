@@ -1,63 +1,27 @@
 import os
-import pandas as pd
+import sys
 import matplotlib.pyplot as plt
 from matplotlib.ticker import ScalarFormatter
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 from matplotlib.colors import hsv_to_rgb
 
-plt.style.use('seaborn-whitegrid')  # A clean and professional style
-plt.rcParams.update({'font.size': 12, 'figure.dpi': 1000}) 
-
 # Get the parent directory of the current directory
 parent_directory = os.path.abspath(os.path.join(os.getcwd(), os.pardir))
 
-# Define the directory containing CSV files
-csv_files_directory = os.path.join(parent_directory, 'Jan_25_Sensitivity_Sweep')
-
-# List all CSV files in the directory
-csv_files = [f for f in os.listdir(csv_files_directory) if f.endswith('.csv')]
-
-# Initialize an empty DataFrame to store the combined data
-combined_dataframe = pd.DataFrame()
+sys.path.append(parent_directory)
+from noise_store import load_sweeps
+from plot_rendering import apply_style
 
-# Loop through each CSV file and append the data to the combined DataFrame
-for i, file in enumerate(csv_files):
-    # Extract sensitivity from file name
-    sensitivity_str = file.split('_')[-1].split('.')[0]
-    # Remove the unit from sensitivity_str
-    sensitivity_value = float(sensitivity_str[:-2])  # Remove the last two characters (the unit)
-    # Check the unit and convert sensitivity to volts accordingly
-    if sensitivity_str.endswith('nV'):
-        sensitivity = sensitivity_value * 1e-9  # Convert nV to V
-    elif sensitivity_str.endswith('uV'):
-        sensitivity = sensitivity_value * 1e-6  # Convert µV to V
-    else:
-        raise ValueError("Invalid sensitivity unit. Sensitivity must be in nV or µV.")
-    
-    # Read CSV file into a DataFrame
-    file_path = os.path.join(csv_files_directory, file)
-    data = pd.read_csv(file_path, sep=',', names=['Frequency', 'Noise'])
-    
-    # Set sensitivity as the column header
-    data.columns = ['Frequency', sensitivity]
-    
-    # Append data to the combined DataFrame
-    combined_dataframe = pd.concat([combined_dataframe, data.iloc[1:]], axis=1)
-
-# Reset the index
-combined_dataframe.reset_index(drop=True, inplace=True)
-combined_dataframe = combined_dataframe.apply(pd.to_numeric, errors='coerce')
-# Drop additional frequency columns except for the first one
-combined_dataframe = combined_dataframe.loc[:, ~combined_dataframe.columns.duplicated()]
-
-# Extract and sort the column headers excluding 'Frequency'
-sorted_columns = sorted(combined_dataframe.columns[1:])
+apply_style(publication_dpi=1000)
 
-# Concatenate 'Frequency' with the sorted column headers
-new_columns = ['Frequency'] + sorted_columns
+# Define the directory containing CSV files
+csv_files_directory = os.path.join(parent_directory, 'Jan_25_Sensitivity_Sweep')
+store = load_sweeps(csv_files_directory)
 
-# Update the DataFrame columns
-combined_dataframe.columns = new_columns
+# Sort the files by the sensitivity parsed from each file name and combine the spectra with sensitivity as the column headers
+columns = {file: store.metadata[file]['sensitivity'] for file in store.files}
+columns = dict(sorted(columns.items(), key=lambda item: item[1]))
+combined_dataframe = store.combined_dataframe(columns)
 
 # Plotting the main figure
 fig, ax = plt.subplots(figsize=(10, 6))
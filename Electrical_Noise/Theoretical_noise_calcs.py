@@ -1,13 +1,15 @@
 import matplotlib.pyplot as plt
 import numpy as np
 from scipy.optimize import curve_fit
+from scipy.constants import Boltzmann
+from noise_models import johnson_noise
+from plot_rendering import apply_style
 
 # Enhance plot aesthetics
-plt.style.use('seaborn-whitegrid')  # A clean and professional style
-plt.rcParams.update({'font.size': 12, 'figure.dpi': 2000})  # Adjust font size and figure resolution
+apply_style(publication_dpi=2000)
 
 # Constants
-k = 1.38e-23  # Boltzmann's constant in J/K
+k = Boltzmann  # Boltzmann's constant in J/K
 T = 22.5 + 273.15  # Convert temperature from Celsius to Kelvin
 
 # Resistance values for specific comparison points
@@ -16,7 +18,7 @@ resistance_values = np.linspace(0, 2.5e6, 500)  # Smoothly varying resistance va
 
 # Calculate thermal noise PSD
 def thermal_noise_psd(R):
-    return np.sqrt(4 * k * T * R)
+    return johnson_noise(R, T)
 
 # Format resistance labels for readability
 def format_resistance_label(R):
@@ -28,9 +30,8 @@ def format_resistance_label(R):
 
 # Plot thermal noise PSD across frequencies for specific resistances
 plt.figure(figsize=(8, 5))
-for R in special_resistances:
-    noise_psd = thermal_noise_psd(R)
-    plt.plot(resistance_values, [noise_psd] * len(resistance_values), label=format_resistance_label(R), linewidth=2)
+for R, noise_psd in zip(special_resistances, thermal_noise_psd(special_resistances)):
+    plt.plot(resistance_values, np.full_like(resistance_values, noise_psd), label=format_resistance_label(R), linewidth=2)
 
 plt.xlabel("Frequency (Hz)")
 plt.ylabel("Thermal Noise PSD (V/$\sqrt{\mathrm{Hz}}$)")
@@ -42,7 +43,7 @@ plt.show()
 #%%
 # Plot thermal noise PSD vs. resistance
 plt.figure(figsize=(8, 5))
-noise_psd_values = [thermal_noise_psd(R) for R in resistance_values]
+noise_psd_values = thermal_noise_psd(resistance_values)
 plt.plot(resistance_values, noise_psd_values, color='black', linewidth=2.5)
 
 # Highlight special resistance values
@@ -0,0 +1,145 @@
+"""
+Vectorized band statistics and straight-line fits for the noise analysis.
+
+The sweep scripts used to loop over resistor columns, rebuilding the
+190-1500 Hz mask for each one and calling linregress on four points. Here a
+whole (sweeps x frequencies) matrix is reduced for any number of bands in one
+pass, and V^2 vs R slopes are fitted for any number of resistor sets at once,
+optionally weighted by the per-point uncertainties.
+"""
+
+import numpy as np
+from scipy.constants import Boltzmann
+
+
+def band_masks(frequency, bands):
+    """
+    Boolean (bands x frequencies) matrix, one row per (f_min, f_max) band.
+    The band limits are inclusive, as in the original scripts.
+    """
+    bands = np.atleast_2d(np.asarray(bands, dtype=np.float64))
+    frequency = np.asarray(frequency, dtype=np.float64)
+    return (frequency >= bands[:, :1]) & (frequency <= bands[:, 1:2])
+
+
+def band_statistics(frequency, noise, bands=(190, 1500)):
+    """
+    Band averages of every spectrum in `noise` for every band in `bands`.
+
+    `noise` is a (..., frequencies) array sharing the `frequency` grid, NaNs
+    are ignored. `bands` is a single (f_min, f_max) pair or a sequence of them.
+    Returns a dict of arrays with shape noise.shape[:-1] (single band) or
+    noise.shape[:-1] + (bands,):
+
+        n                   number of points in the band
+        mean, std           band average and sample standard deviation (ddof=1)
+        sem                 standard error of the mean, std / sqrt(n)
+        mean_squared        mean**2, the V^2/Hz value used in the Boltzmann fits
+        mean_squared_error  2 * mean * sem, propagated error of mean_squared
+    """
+    single_band = np.ndim(bands) == 1
+    masks = band_masks(frequency, bands).astype(np.float64)
+    noise = np.asarray(noise, dtype=np.float64)
+
+    valid = np.isfinite(noise)
+    # Shift by a per-spectrum reference before summing squares so the variance
+    # does not lose precision to cancellation
+    reference = np.nanmedian(np.where(valid, noise, np.nan), axis=-1, keepdims=True)
+    reference = np.where(np.isfinite(reference), reference, 0.0)
+    shifted = np.where(valid, noise - reference, 0.0)
+
+    n = valid.astype(np.float64) @ masks.T
+    total = shifted @ masks.T
+    total_squared = (shifted * shifted) @ masks.T
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shifted_mean = total / n
+        variance = (total_squared - n * shifted_mean ** 2) / (n - 1)
+        std = np.sqrt(np.maximum(variance, 0.0))
+        sem = std / np.sqrt(n)
+    mean = shifted_mean + reference
+
+    stats = {
+        'n': n.astype(np.int64),
+        'mean': mean,
+        'std': std,
+        'sem': sem,
+        'mean_squared': mean ** 2,
+        'mean_squared_error': 2 * mean * sem,
+    }
+    if single_band:
+        stats = {key: value[..., 0] for key, value in stats.items()}
+    return stats
+
+
+def fit_lines(x, y, sigma=None, absolute_sigma=True):
+    """
+    Least-squares straight lines y = slope * x + intercept for many data sets.
+
+    `x` and `y` are (..., points) arrays (broadcast against each other), each
+    leading index is an independent fit and NaNs in `y` drop that point. With
+    `sigma` the fit is weighted by 1/sigma**2; if `absolute_sigma` is False the
+    parameter errors are rescaled by the reduced chi squared, as in curve_fit.
+    Without `sigma` the errors match scipy.stats.linregress.
+
+    Returns a dict of arrays with keys slope, intercept, slope_err,
+    intercept_err, r_value, chi2 and n.
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64))
+    if sigma is None:
+        w = np.ones_like(y)
+    else:
+        w = 1.0 / np.broadcast_to(np.asarray(sigma, dtype=np.float64), y.shape) ** 2
+    valid = np.isfinite(y) & np.isfinite(x) & np.isfinite(w)
+    w = np.where(valid, w, 0.0)
+    x0 = np.where(valid, x, 0.0)
+    y0 = np.where(valid, y, 0.0)
+
+    n = valid.sum(axis=-1)
+    S = w.sum(axis=-1)
+    # Centre on the weighted means to keep the normal equations well conditioned
+    x_mean = (w * x0).sum(axis=-1) / S
+    y_mean = (w * y0).sum(axis=-1) / S
+    dx = np.where(valid, x0 - x_mean[..., None], 0.0)
+    dy = np.where(valid, y0 - y_mean[..., None], 0.0)
+    Sxx = (w * dx * dx).sum(axis=-1)
+    Syy = (w * dy * dy).sum(axis=-1)
+    Sxy = (w * dx * dy).sum(axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = Sxy / Sxx
+        intercept = y_mean - slope * x_mean
+        residuals = np.where(valid, y0 - (slope[..., None] * x0 + intercept[..., None]), 0.0)
+        chi2 = (w * residuals ** 2).sum(axis=-1)
+        r_value = Sxy / np.sqrt(Sxx * Syy)
+
+        slope_var = 1.0 / Sxx
+        intercept_var = 1.0 / S + x_mean ** 2 / Sxx
+        if sigma is None or not absolute_sigma:
+            scale = chi2 / (n - 2)
+            slope_var = slope_var * scale
+            intercept_var = intercept_var * scale
+
+    return {
+        'slope': slope,
+        'intercept': intercept,
+        'slope_err': np.sqrt(slope_var),
+        'intercept_err': np.sqrt(intercept_var),
+        'r_value': r_value,
+        'chi2': chi2,
+        'n': n,
+    }
+
+
+def boltzmann_from_slope(slope, slope_err, T, T_err=0.0):
+    """
+    Boltzmann's constant from the slope of V^2 = 4 k T R, with the slope and
+    temperature uncertainties propagated in quadrature.
+    Returns (k, k_err, percent_error) where percent_error is relative to the
+    CODATA value.
+    """
+    slope = np.asarray(slope, dtype=np.float64)
+    k = slope / (4 * T)
+    k_err = np.abs(k) * np.sqrt((np.asarray(slope_err) / slope) ** 2 + (T_err / T) ** 2)
+    percent_error = np.abs((k - Boltzmann) / Boltzmann) * 100
+    return k, k_err, percent_error
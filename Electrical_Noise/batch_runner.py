@@ -0,0 +1,237 @@
+"""
+Headless batch runner for the Electrical_Noise analyses.
+
+Each analysis from Jack Final Plots is available here as a plain function of a
+data directory that returns its numbers (band means, SEMs, fitted k_B and
+percent error) instead of showing figures. run_batch() spreads any list of
+(analysis, directory) jobs over a process pool, so every archived run can be
+reprocessed at once. Results are kept in the shared result cache (see
+result_cache.py at the top of the repository), so folders whose CSVs have not
+changed since the last run are not recomputed:
+
+    python batch_runner.py Jan_30_Clean_Data Differential Good_cryo_data --output results.json
+    python batch_runner.py --analysis clean_sweep /archive/*/Clean_Data
+"""
+
+import os
+import sys
+import json
+import argparse
+import traceback
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from noise_store import load_sweeps, list_csv_files
+from band_stats import band_statistics, fit_lines, boltzmann_from_slope
+from noise_fit import fit_sweep
+from instrument_response import corrected_matrix, load_response, response_files
+from cryo_analysis import CRYO_RESISTANCE, run_table, joint_fit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from result_cache import default_cache, function_id
+
+ROOM_TEMPERATURE = 22.5 + 273.15  # K, lab temperature for the room temperature sweeps
+ROOM_TEMPERATURE_ERROR = 0.1  # K
+
+# Analysis used for each of the lab's sweep folders when none is given
+DEFAULT_ANALYSES = {
+    'Jan_30_Clean_Data': 'clean_sweep',
+    'Differential': 'differential',
+    'Good_cryo_data': 'cryo',
+    'Cryo and Tests': 'cryo',
+    'Terminator_Sweep': 'terminator',
+    'Jan_25_Sensitivity_Sweep': 'sensitivity',
+    'TimeConstant_Sweep': 'time_constant',
+}
+
+
+def _band_table(store, files, band, response=None):
+    # Band statistics per file, using one matrix reduction when the grids agree.
+    # With an instrument response the spectra are corrected first
+    if response is not None:
+        frequency, matrix = corrected_matrix(store, files, response)
+        stats = band_statistics(frequency, matrix, band)
+    elif store.has_common_grid(files):
+        frequency, matrix = store.matrix(files)
+        stats = band_statistics(frequency, matrix, band)
+    else:
+        per_file = [band_statistics(*store.spectrum(f), band) for f in files]
+        stats = {key: np.array([s[key] for s in per_file]) for key in per_file[0]}
+    return [
+        {'file': file, 'metadata': store.metadata[file],
+         **{key: float(value[i]) for key, value in stats.items()}}
+        for i, file in enumerate(files)
+    ]
+
+
+def resistor_sweep(directory, band=(190, 1500), T=ROOM_TEMPERATURE, T_err=ROOM_TEMPERATURE_ERROR,
+                   min_resistance=1e3, weighted=False, correct=False):
+    """
+    Band averages of every resistor in a sweep folder and the V^2 vs R fit
+    for Boltzmann's constant (Jan_30_Clean_Sweep_Results.py, Differential_Plots.py).
+    Resistors below `min_resistance` (the 50 Ohm terminator run) are left out.
+    correct=True removes the amplifier floor and input roll-off first
+    (instrument_response.py).
+    """
+    store = load_sweeps(directory)
+    files = [f for f in store.files
+             if store.metadata[f]['resistance'] is not None and store.metadata[f]['resistance'] >= min_resistance]
+    if len(files) < 3:
+        raise ValueError(f"Need at least three resistors for a Boltzmann fit, found {len(files)} in {directory}.")
+    table = _band_table(store, files, band, load_response() if correct else None)
+    R = np.array([row['metadata']['resistance'] for row in table])
+    V2 = np.array([row['mean_squared'] for row in table])
+    V2_err = np.array([row['mean_squared_error'] for row in table])
+    fit = fit_lines(R, V2, sigma=V2_err if weighted else None)
+    k, k_err, percent_error = boltzmann_from_slope(fit['slope'], fit['slope_err'], T, T_err)
+    return {
+        'band': list(band),
+        'temperature': T,
+        'spectra': table,
+        'slope': float(fit['slope']),
+        'intercept': float(fit['intercept']),
+        'slope_err': float(fit['slope_err']),
+        'r_value': float(fit['r_value']),
+        'k': float(k),
+        'k_err': float(k_err),
+        'percent_error': float(percent_error),
+        'corrected': correct,
+    }
+
+
+def clean_sweep(directory, **options):
+    """Single-ended resistor sweep (Jan_30_Clean_Sweep_Results.py)."""
+    return resistor_sweep(directory, **options)
+
+
+def differential(directory, **options):
+    """Differential resistor sweep (Differential_Plots.py)."""
+    return resistor_sweep(directory, **options)
+
+
+def cryo(directory, band=(190, 2000), resistance=CRYO_RESISTANCE, correct=False):
+    """
+    Band average of each cryostat spectrum compared with the Johnson noise at
+    its own temperature (Cryo_Plots.py), and the V^2 vs T * R fit when the
+    folder covers more than one T * R (see cryo_analysis.py).
+    """
+    result = run_table(directory, band, resistance, correct)
+    try:
+        result['fit'] = joint_fit(result['spectra'])
+    except ValueError:
+        result['fit'] = None
+    return result
+
+
+def _parameter_sweep(directory, band):
+    store = load_sweeps(directory)
+    return {'band': list(band), 'spectra': _band_table(store, store.files, band)}
+
+
+def terminator(directory, band=(190, 1500)):
+    """Band averages of the terminator comparison (Terminator_plots.py)."""
+    return _parameter_sweep(directory, band)
+
+
+def sensitivity(directory, band=(250, 10000)):
+    """Band averages over the linear region of the sensitivity sweep (Sensitivity plots.py)."""
+    return _parameter_sweep(directory, band)
+
+
+def time_constant(directory, band=(190, 1500)):
+    """Band averages of the lock-in time constant sweep (Time_constant_plots.py)."""
+    return _parameter_sweep(directory, band)
+
+
+def noise_model(directory, f_range=None, rolloff='fit'):
+    """1/f plus white noise fits (corner frequency and white level) of every spectrum (noise_fit.py)."""
+    return fit_sweep(directory, f_range, rolloff)
+
+
+ANALYSES = {
+    'clean_sweep': clean_sweep,
+    'differential': differential,
+    'cryo': cryo,
+    'terminator': terminator,
+    'sensitivity': sensitivity,
+    'time_constant': time_constant,
+    'noise_model': noise_model,
+}
+
+
+def run_job(analysis, directory, options=None, use_cache=True):
+    """
+    Run one analysis on one directory. Failures are returned as an 'error'
+    entry rather than raised, so one bad run does not stop a batch.
+    """
+    result = {'analysis': analysis, 'directory': os.path.abspath(directory)}
+    func = ANALYSES[analysis]
+    options = options or {}
+    try:
+        if use_cache:
+            files = [os.path.join(directory, f) for f in list_csv_files(directory)]
+            if options.get('correct'):
+                # Corrected results also depend on the sweeps the instrument response is built from
+                files += response_files()
+            params = {'directory': result['directory'], 'options': options}
+            result.update(default_cache().get_or_compute(function_id(func), files, params,
+                                                         lambda: func(directory, **options)))
+        else:
+            result.update(func(directory, **options))
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+        result['traceback'] = traceback.format_exc()
+    return result
+
+
+def default_analysis(directory):
+    """The analysis for a sweep folder, from its name (see DEFAULT_ANALYSES)."""
+    name = os.path.basename(os.path.normpath(directory))
+    if name not in DEFAULT_ANALYSES:
+        raise ValueError(f"No default analysis for '{name}', pass one explicitly.")
+    return DEFAULT_ANALYSES[name]
+
+
+def run_batch(jobs, max_workers=None, use_cache=True):
+    """
+    Run (analysis, directory) or (analysis, directory, options) jobs across a
+    process pool. Results are returned in the order of `jobs`.
+    """
+    jobs = [tuple(job) + (None,) * (3 - len(job)) + (use_cache,) for job in jobs]
+    if max_workers == 1 or len(jobs) <= 1:
+        return [run_job(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(run_job, *zip(*jobs)))
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the noise analyses headlessly over many data directories.")
+    parser.add_argument('directories', nargs='+', help="sweep folders to analyse")
+    parser.add_argument('--analysis', choices=sorted(ANALYSES), help="analysis for every folder (default: from the folder name)")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--output', help="write the results as JSON to this file instead of stdout")
+    parser.add_argument('--no-cache', action='store_true', help="recompute every job instead of using cached results")
+    parser.add_argument('--correct', action='store_true', help="correct the resistor sweeps for the instrument floor and roll-off")
+    args = parser.parse_args()
+
+    jobs = [(args.analysis or default_analysis(d), d) for d in args.directories]
+    if args.correct:
+        jobs = [(analysis, d, {'correct': True} if analysis in ('clean_sweep', 'differential') else None)
+                for analysis, d in jobs]
+    results = run_batch(jobs, max_workers=args.workers, use_cache=not args.no_cache)
+    for result in results:
+        if 'error' in result:
+            print(f"{result['directory']}: {result['error']}", file=sys.stderr)
+
+    text = json.dumps(results, indent=1, default=_to_json)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
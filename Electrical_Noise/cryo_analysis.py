@@ -0,0 +1,211 @@
+"""
+Cryostat noise runs analysed with the temperature of every spectrum.
+
+Cryo_Plots.py compares the one Good_cryo_data spectrum with the Johnson noise
+of 998 kOhm at a hard-coded T = 170 K. Here every spectrum of one or more cryo
+folders (Good_cryo_data, Cryo and Tests, or a whole cooldown) is paired with
+its own temperature, taken from the first of
+
+    1. the folder's temperature log, temperatures.txt, with the columns
+       file,temperature,temperature_err (K; the error column is optional),
+    2. a temperature in the file name (Feb_08_410_0998MOhm_Cryo_77p5K.csv),
+    3. the Cold / Room tag of the file name; a Cold tag only gives a
+       temperature for the runs in COLD_TEMPERATURES, whose cryostat reading
+       is known,
+    4. room temperature for spectra taken outside the cryostat.
+
+Spectra with none of these (e.g. the Feb 1 Cold runs) are listed as skipped.
+The folders are processed in parallel, and V^2 is fitted against T * R across
+all of them at once, so Boltzmann's constant comes from the slope 4 k shared
+by every temperature. Single-ended and differential spectra have different
+amplifier floors, so each mode gets its own intercept:
+
+    python cryo_analysis.py Good_cryo_data "Cryo and Tests"
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from noise_store import load_sweeps
+from band_stats import band_statistics, boltzmann_from_slope
+from noise_models import johnson_noise
+from instrument_response import load_response
+
+TEMPERATURE_LOG = 'temperatures.txt'
+ROOM_TEMPERATURE = 22.5 + 273.15  # K
+ROOM_TEMPERATURE_ERROR = 0.1  # K
+# (T, T_err) in K of the Cold runs by date, read off the cryostat display
+COLD_TEMPERATURES = {'Feb_06': (170, 5)}
+CRYO_RESISTANCE = 998e3  # Ohms, resistor mounted in the cryostat
+RESISTANCE_TOLERANCE = 0.01
+BAND = (190, 2000)
+
+
+def read_temperature_log(directory):
+    """{file name: (T, T_err)} from the temperatures.txt log of a folder (empty if there is none)."""
+    path = os.path.join(directory, TEMPERATURE_LOG)
+    if not os.path.exists(path):
+        return {}
+    log = pd.read_csv(path, skipinitialspace=True)
+    log.columns = [c.strip().lower() for c in log.columns]
+    errors = log['temperature_err'] if 'temperature_err' in log else pd.Series(np.nan, index=log.index)
+    temperatures = {}
+    for file, T, T_err in zip(log['file'], log['temperature'], errors):
+        file = str(file).strip()
+        file = file if file.endswith('.csv') else file + '.csv'
+        temperatures[file] = (float(T), float(T_err) if np.isfinite(T_err) else 0.0)
+    return temperatures
+
+
+def spectrum_temperature(file, metadata, log=None):
+    """(T, T_err, source) of one spectrum; T is None if nothing gives it."""
+    if log and file in log:
+        return (*log[file], 'log')
+    if metadata.get('temperature') is not None:
+        return metadata['temperature'], 0.0, 'file name'
+    if metadata.get('temperature_tag') == 'Cold':
+        if metadata.get('date') in COLD_TEMPERATURES:
+            return (*COLD_TEMPERATURES[metadata['date']], 'tag')
+        return None, None, None
+    if metadata.get('temperature_tag') == 'Room' or not metadata.get('cryostat'):
+        return ROOM_TEMPERATURE, ROOM_TEMPERATURE_ERROR, 'room'
+    return None, None, None
+
+
+def run_table(directory, band=BAND, resistance=CRYO_RESISTANCE, correct=False):
+    """
+    One row per spectrum of a folder: its temperature, resistance (from the
+    file name, `resistance` otherwise), band statistics and the Johnson noise
+    expected at that temperature. Spectra without points in the band or
+    without a temperature are returned separately as skipped.
+    """
+    store = load_sweeps(directory)
+    log = read_temperature_log(directory)
+    response = load_response() if correct else None
+    rows, skipped = [], []
+    for file in store.files:
+        metadata = store.metadata[file]
+        frequency, noise = store.spectrum(file)
+        if response is not None:
+            noise = response.correct(frequency, noise, [metadata])[0]
+        stats = band_statistics(frequency, noise, band)
+        T, T_err, source = spectrum_temperature(file, metadata, log)
+        if T is None or stats['n'] < 2:
+            skipped.append({'file': file, 'reason': 'no temperature' if T is None else 'no points in the band'})
+            continue
+        R = metadata['resistance'] or resistance
+        theoretical = float(johnson_noise(R, T))
+        rows.append({'directory': os.path.abspath(directory), 'file': file, 'metadata': metadata,
+                     'temperature': T, 'temperature_err': T_err, 'temperature_source': source, 'resistance': R,
+                     **{key: float(value) for key, value in stats.items()},
+                     'theoretical': theoretical,
+                     'percent_error': (float(stats['mean']) - theoretical) / theoretical * 100})
+    return {'directory': os.path.abspath(directory), 'band': list(band), 'spectra': rows, 'skipped': skipped}
+
+
+def _fit_shared_slope(x, y, sigma, groups):
+    """
+    Weighted least squares of y = slope * x + intercept[group]: one slope and
+    an intercept per group. The errors are scaled by the reduced chi squared
+    when there are degrees of freedom left, as fit_lines does with
+    absolute_sigma=False.
+    """
+    names = sorted(set(groups))
+    design = np.column_stack([x] + [[g == name for g in groups] for name in names]).astype(np.float64)
+    weights = 1.0 / sigma
+    params, *_ = np.linalg.lstsq(design * weights[:, None], y * weights, rcond=None)
+    covariance = np.linalg.inv((design * weights[:, None] ** 2).T @ design)
+    chi2 = float((((y - design @ params) * weights) ** 2).sum())
+    dof = len(y) - len(params)
+    if dof > 0:
+        covariance = covariance * chi2 / dof
+    errors = np.sqrt(np.diag(covariance))
+    return {'slope': params[0], 'slope_err': errors[0],
+            'intercepts': dict(zip(names, params[1:].tolist())),
+            'intercept_errs': dict(zip(names, errors[1:].tolist())),
+            'chi2': chi2, 'n': len(y)}
+
+
+def joint_fit(rows):
+    """
+    Fit V^2 = 4 k T R + c_mode to the spectra of all runs, with one intercept
+    per measurement mode, weighting each point by its V^2 error and (through
+    the slope) the uncertainty of T * R from the temperature error and the
+    resistor tolerance. Only modes with spectra at two or more values of T * R
+    constrain the slope.
+    """
+    T = np.array([r['temperature'] for r in rows])
+    T_err = np.array([r['temperature_err'] for r in rows])
+    R = np.array([r['resistance'] for r in rows])
+    V2 = np.array([r['mean_squared'] for r in rows])
+    V2_err = np.array([r['mean_squared_error'] for r in rows])
+    modes = [r['metadata']['mode'] for r in rows]
+    x = T * R
+    if not any(len(np.unique(x[[m == mode for m in modes]])) >= 2 for mode in set(modes)):
+        raise ValueError("A joint fit needs spectra of one mode at two or more values of T * R.")
+    x_err = x * np.hypot(T_err / T, RESISTANCE_TOLERANCE)
+    # First pass for the slope, second with the effective variances
+    slope = _fit_shared_slope(x, V2, V2_err, modes)['slope']
+    fit = _fit_shared_slope(x, V2, np.hypot(V2_err, slope * x_err), modes)
+    k, k_err, percent_error = boltzmann_from_slope(fit['slope'], fit['slope_err'], 1.0)
+    return {'slope': float(fit['slope']), 'slope_err': float(fit['slope_err']),
+            'intercepts': fit['intercepts'], 'intercept_errs': fit['intercept_errs'],
+            'chi2': fit['chi2'], 'n': fit['n'],
+            'k': float(k), 'k_err': float(k_err), 'percent_error': float(percent_error)}
+
+
+def _run_table(args):
+    return run_table(*args)
+
+
+def cryo_sweep(directories, band=BAND, resistance=CRYO_RESISTANCE, correct=False, max_workers=None):
+    """
+    run_table of every folder, processed in parallel, and the joint V^2 vs
+    T * R fit over all their spectra (None if they cover fewer than two
+    values of T * R).
+    """
+    directories = [directories] if isinstance(directories, str) else list(directories)
+    jobs = [(d, band, resistance, correct) for d in directories]
+    if max_workers == 1 or len(jobs) <= 1:
+        runs = [_run_table(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            runs = list(pool.map(_run_table, jobs))
+    rows = [row for run in runs for row in run['spectra']]
+    try:
+        fit = joint_fit(rows)
+    except ValueError:
+        fit = None
+    return {'band': list(band), 'runs': runs, 'spectra': rows, 'fit': fit}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Noise of cryostat runs against their logged temperatures.")
+    parser.add_argument('directories', nargs='+', help="cryo sweep folders")
+    parser.add_argument('--f-min', type=float, default=BAND[0], help="lower edge of the averaging band in Hz")
+    parser.add_argument('--f-max', type=float, default=BAND[1], help="upper edge of the averaging band in Hz")
+    parser.add_argument('--correct', action='store_true', help="correct the spectra for the instrument floor and roll-off")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    result = cryo_sweep(args.directories, (args.f_min, args.f_max), correct=args.correct, max_workers=args.workers)
+    for row in result['spectra']:
+        print(f"{row['file']:48s} T = {row['temperature']:6.1f} K ({row['temperature_source']:9s}) "
+              f"V = {row['mean']:.3e} ± {row['sem']:.1e}  Johnson {row['theoretical']:.3e} ({row['percent_error']:+.1f}%)")
+    for run in result['runs']:
+        for skip in run['skipped']:
+            print(f"{skip['file']:48s} skipped: {skip['reason']}")
+    fit = result['fit']
+    if fit is not None:
+        print(f"Joint fit over {fit['n']} spectra: k = {fit['k']:.3e} ± {fit['k_err']:.1e} J/K "
+              f"({fit['percent_error']:.1f}% from CODATA), chi2 = {fit['chi2']:.1f}")
+    else:
+        print("No joint fit: no mode has spectra at two or more values of T * R")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=1)
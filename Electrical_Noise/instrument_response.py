@@ -0,0 +1,187 @@
+"""
+Instrument response of the lock-in noise measurement, applied to every spectrum.
+
+Sensitivity plots.py and Time_constant_plots.py only overlay the 50 Ohm
+terminator spectra taken at each sensitivity (20 nV - 100 uV) and time
+constant (1 - 100 ms). Here those sweeps are turned into a table of
+amplifier noise floors, one per setting, with the Johnson noise of the 50 Ohm
+terminator removed, plus the intrinsic floor (the lowest the instrument
+reaches at each frequency) for spectra taken at settings that were not swept.
+
+The terminators are too small to show the high frequency roll-off of the
+resistor spectra, which comes from the source resistance working into the
+input capacitance. Its time constant is fitted on every spectrum of a
+resistor sweep (noise_fit.py) and tau = R * C + tau_0 is fitted across the
+resistors, so the roll-off of any resistor can be compensated.
+
+A measured PSD is S = S_R |H(f)|^2 + S_floor with
+|H(f)|^2 = 1 / (1 + (2 pi f (R C + tau_0))^2), so the corrected spectrum is
+S_R = (S - S_floor) / |H(f)|^2. Points at or below the floor are NaN. The
+table is built once and cached on the content of the sweeps:
+
+    response = load_response()
+    frequency, matrix = corrected_matrix(load_sweeps('Jan_30_Clean_Data'), response=response)
+"""
+
+import os
+import sys
+import numpy as np
+from scipy.constants import Boltzmann
+
+from noise_store import load_sweeps, list_csv_files
+from band_stats import fit_lines
+from noise_fit import fit_store
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from result_cache import cached_call
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+SENSITIVITY_SWEEP = os.path.join(_HERE, 'Jan_25_Sensitivity_Sweep')
+TIME_CONSTANT_SWEEP = os.path.join(_HERE, 'TimeConstant_Sweep')
+RESISTOR_SWEEP = os.path.join(_HERE, 'Jan_30_Clean_Data')
+TERMINATOR_RESISTANCE = 50  # Ohms
+TEMPERATURE = 22.5 + 273.15  # K, lab temperature of the sweeps
+MIN_RESISTANCE = 1e3  # Ohms, smaller resistors show no roll-off to fit
+
+
+def _terminator_floors(directory, setting, T):
+    # Floor PSD of every terminator spectrum in a sweep, keyed by its parsed setting
+    store = load_sweeps(directory)
+    frequency, matrix = store.matrix()
+    floors = np.maximum(matrix ** 2 - 4 * Boltzmann * T * TERMINATOR_RESISTANCE, 0)
+    values = [store.metadata[f][setting] for f in store.files]
+    order = np.argsort(values)
+    return frequency, np.array(values, dtype=float)[order], floors[order]
+
+
+def _input_capacitance(directory):
+    # tau = R C + tau_0 from the roll-off fitted on every resistor of a sweep
+    store = load_sweeps(directory)
+    files = [f for f in store.files if (store.metadata[f]['resistance'] or 0) >= MIN_RESISTANCE]
+    if len(files) < 3:
+        return 0.0, 0.0, 0.0, 0.0
+    # Fits that end on a bound have no usable roll-off
+    fits = [row for row in fit_store(store, files, rolloff='fit') if row['converged']]
+    if len(fits) < 3:
+        return 0.0, 0.0, 0.0, 0.0
+    R = np.array([row['metadata']['resistance'] for row in fits])
+    tau = np.array([row['tau'] for row in fits])
+    tau_err = np.array([row['tau_err'] for row in fits])
+    line = fit_lines(R, tau, sigma=tau_err, absolute_sigma=False)
+    return float(line['slope']), float(line['slope_err']), float(line['intercept']), float(line['intercept_err'])
+
+
+def _build(*files, sensitivity_dir, time_constant_dir, resistor_dir, T):
+    # `files` only key the cache on the content of the sweeps
+    frequency, sensitivities, sensitivity_floors = _terminator_floors(sensitivity_dir, 'sensitivity', T)
+    tc_frequency, time_constants, time_constant_floors = _terminator_floors(time_constant_dir, 'time_constant', T)
+    if not np.array_equal(frequency, tc_frequency):
+        time_constant_floors = _interp_log(frequency, tc_frequency, time_constant_floors)
+    floor = np.min(np.vstack([sensitivity_floors, time_constant_floors]), axis=0)
+    capacitance, capacitance_err, tau_0, tau_0_err = (_input_capacitance(resistor_dir) if resistor_dir
+                                                      else (0.0, 0.0, 0.0, 0.0))
+    return {
+        'frequency': frequency, 'floor': floor,
+        'sensitivity': sensitivities, 'sensitivity_floors': sensitivity_floors,
+        'time_constant': time_constants, 'time_constant_floors': time_constant_floors,
+        'capacitance': capacitance, 'capacitance_err': capacitance_err, 'tau_0': tau_0, 'tau_0_err': tau_0_err,
+        'temperature': T,
+        'sources': [d for d in (sensitivity_dir, time_constant_dir, resistor_dir) if d],
+    }
+
+
+def _interp_log(frequency, table_frequency, values):
+    # Interpolate rows of `values` in log frequency onto a new grid (ends held constant)
+    values = np.atleast_2d(values)
+    log_f = np.log(frequency)
+    return np.vstack([np.interp(log_f, np.log(table_frequency), row) for row in values])
+
+
+class InstrumentResponse:
+    """
+    Noise floors (V^2/Hz on the table frequency grid) for each swept
+    sensitivity and time constant, the intrinsic floor, and the input
+    capacitance and time constant of the roll-off.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.frequency = np.asarray(table['frequency'])
+        self.capacitance = table['capacitance']
+        self.tau_0 = max(table['tau_0'], 0.0)
+
+    def _match(self, setting, value):
+        if value is None:
+            return None
+        match = np.flatnonzero(np.isclose(self.table[setting], value, rtol=1e-6))
+        return self.table[setting + '_floors'][match[0]] if len(match) else None
+
+    def floor(self, metadata=None):
+        """
+        Floor PSD for a spectrum with the parsed `metadata`: the terminator
+        taken at its time constant or sensitivity if that was swept, the
+        intrinsic floor otherwise.
+        """
+        metadata = metadata or {}
+        for setting in ('time_constant', 'sensitivity'):
+            floor = self._match(setting, metadata.get(setting))
+            if floor is not None:
+                return floor
+        return self.table['floor']
+
+    def rolloff(self, frequency, resistance):
+        """|H(f)|^2 of the input RC for each resistance (broadcast against `frequency`)."""
+        resistance = np.nan_to_num(np.asarray(resistance, dtype=float))
+        tau = resistance * self.capacitance + self.tau_0
+        return 1 / (1 + (2 * np.pi * np.asarray(frequency) * tau) ** 2)
+
+    def correct(self, frequency, noise, metadata):
+        """
+        Corrected noise (V/sqrt(Hz)) of a (spectra x frequencies) array on the
+        `frequency` grid, one metadata dict per spectrum (for its setting and
+        resistance).
+        """
+        noise = np.atleast_2d(np.asarray(noise, dtype=float))
+        floors = np.vstack([self.floor(m) for m in metadata])
+        if not np.array_equal(frequency, self.frequency):
+            floors = _interp_log(frequency, self.frequency, floors)
+        resistance = np.array([m.get('resistance') or 0.0 for m in metadata], dtype=float)
+        signal = noise ** 2 - floors
+        with np.errstate(invalid='ignore'):
+            signal = np.where(signal > 0, signal, np.nan) / self.rolloff(frequency, resistance[:, None])
+        return np.sqrt(signal)
+
+    def __repr__(self):
+        return (f"InstrumentResponse({len(self.table['sensitivity'])} sensitivities, "
+                f"{len(self.table['time_constant'])} time constants, C = {self.capacitance * 1e12:.3g} pF, "
+                f"tau_0 = {self.tau_0 * 1e6:.3g} us)")
+
+
+def response_files(sensitivity_dir=SENSITIVITY_SWEEP, time_constant_dir=TIME_CONSTANT_SWEEP,
+                   resistor_dir=RESISTOR_SWEEP):
+    """Paths of the CSVs the instrument response is built from (for cache keys of corrected results)."""
+    directories = [d for d in (sensitivity_dir, time_constant_dir, resistor_dir) if d]
+    return [os.path.join(d, f) for d in directories for f in list_csv_files(d)]
+
+
+def load_response(sensitivity_dir=SENSITIVITY_SWEEP, time_constant_dir=TIME_CONSTANT_SWEEP,
+                  resistor_dir=RESISTOR_SWEEP, T=TEMPERATURE):
+    """
+    The instrument response from the sensitivity and time constant sweeps
+    (and the resistor sweep for the roll-off, None to leave it out), cached on
+    the content of their CSVs.
+    """
+    files = response_files(sensitivity_dir, time_constant_dir, resistor_dir)
+    return InstrumentResponse(cached_call(_build, files, sensitivity_dir=sensitivity_dir,
+                                          time_constant_dir=time_constant_dir, resistor_dir=resistor_dir, T=T))
+
+
+def corrected_matrix(store, files=None, response=None):
+    """
+    Like SweepStore.matrix, with every spectrum corrected for the floor and
+    roll-off of the instrument (the default response unless one is given).
+    """
+    files = list(files if files is not None else store.files)
+    response = response or load_response()
+    frequency, matrix = store.matrix(files)
+    return frequency, response.correct(frequency, matrix, [store.metadata[f] for f in files])
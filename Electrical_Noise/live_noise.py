@@ -0,0 +1,235 @@
+"""
+Live analysis of the LabVIEW noise exports while a sweep is still running.
+
+The sweep folders are polled for CSVs, and only the rows appended since the
+last poll are parsed. Each file keeps running (Welford) band statistics, so
+the band averages, their uncertainties and the V^2 vs R Boltzmann fit of
+Jan_30_Clean_Sweep_Results.py are updated in constant time per new row
+instead of being recomputed from the full files.
+
+    python live_noise.py Jan_30_Clean_Data --temperature 295.65
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+
+from band_stats import fit_lines, boltzmann_from_slope
+from sweep_metadata import parse_sweep_file
+
+
+class CsvTail:
+    """Follows one noise CSV and returns the complete rows appended since the last read."""
+
+    def __init__(self, path):
+        self.path = path
+        self.restarted = False
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.partial = b''
+        self.header_skipped = False
+
+    def read_new_rows(self, final=False):
+        """
+        (frequency, noise) arrays of the rows completed since the last call.
+        A file that shrank has been rewritten, so it is read again from the start
+        and `restarted` is set to True for the caller. With final=True a last
+        line without a newline is taken as complete (the acquisition finished).
+        """
+        self.restarted = False
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return np.empty(0), np.empty(0)
+        if size < self.offset:
+            self.reset()
+            self.restarted = True
+        chunk = b''
+        if size > self.offset:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                chunk = f.read(size - self.offset)
+            self.offset += len(chunk)
+        if not chunk and not (final and self.partial):
+            return np.empty(0), np.empty(0)
+
+        # Keep an unfinished last line until LabVIEW writes its newline
+        lines = (self.partial + chunk).split(b'\n')
+        self.partial = b'' if final else lines.pop()
+        if not self.header_skipped and lines:
+            lines = lines[1:]
+            self.header_skipped = True
+
+        frequency = []
+        noise = []
+        for line in lines:
+            fields = line.strip().split(b',')
+            if len(fields) != 2:
+                continue
+            try:
+                frequency.append(float(fields[0]))
+                noise.append(float(fields[1]))
+            except ValueError:
+                continue
+        return np.asarray(frequency, dtype=np.float64), np.asarray(noise, dtype=np.float64)
+
+
+class RunningBandStats:
+    """Welford mean/variance of the noise values that fall inside one frequency band."""
+
+    def __init__(self, f_min=190, f_max=1500):
+        self.f_min = f_min
+        self.f_max = f_max
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.mean = 0.0
+        self.M2 = 0.0
+
+    def update(self, frequency, noise):
+        """Add a batch of rows, merging its statistics with the running ones (Chan et al.)."""
+        in_band = (frequency >= self.f_min) & (frequency <= self.f_max) & np.isfinite(noise)
+        values = noise[in_band]
+        n_new = len(values)
+        if n_new == 0:
+            return
+        mean_new = values.mean()
+        M2_new = ((values - mean_new) ** 2).sum()
+        n = self.n + n_new
+        delta = mean_new - self.mean
+        self.mean += delta * n_new / n
+        self.M2 += M2_new + delta ** 2 * self.n * n_new / n
+        self.n = n
+
+    @property
+    def std(self):
+        return np.sqrt(self.M2 / (self.n - 1)) if self.n > 1 else np.nan
+
+    @property
+    def sem(self):
+        return self.std / np.sqrt(self.n) if self.n > 1 else np.nan
+
+    @property
+    def mean_squared(self):
+        return self.mean ** 2 if self.n else np.nan
+
+    @property
+    def mean_squared_error(self):
+        return 2 * self.mean * self.sem
+
+
+class LiveNoiseMonitor:
+    """
+    Incremental band statistics and Boltzmann fits for every CSV in a set of
+    sweep folders. Call poll() repeatedly; each call only reads new rows.
+    """
+
+    def __init__(self, directories, f_min=190, f_max=1500, min_resistance=1e3):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.f_min = f_min
+        self.f_max = f_max
+        # The 50 Ohm terminator runs sit in the same folders but are not part of the fit
+        self.min_resistance = min_resistance
+        self.tails = {}
+        self.stats = {}
+        self.resistance = {}
+
+    def _discover(self):
+        for directory in self.directories:
+            try:
+                files = sorted(f for f in os.listdir(directory) if f.endswith('.csv'))
+            except OSError:
+                continue
+            for file in files:
+                path = os.path.join(directory, file)
+                if path not in self.tails:
+                    self.tails[path] = CsvTail(path)
+                    self.stats[path] = RunningBandStats(self.f_min, self.f_max)
+                    self.resistance[path] = parse_sweep_file(directory, file)['resistance']
+
+    def poll(self, final=False):
+        """
+        Read newly appended rows from every file. Returns the paths that changed.
+        Pass final=True once the acquisition is over to include unterminated last lines.
+        """
+        self._discover()
+        changed = []
+        for path, tail in self.tails.items():
+            frequency, noise = tail.read_new_rows(final=final)
+            if tail.restarted:
+                self.stats[path].reset()
+            if len(frequency):
+                self.stats[path].update(frequency, noise)
+                changed.append(path)
+        return changed
+
+    def band_table(self):
+        """Current band statistics per file, as a dict of dicts."""
+        return {
+            path: {
+                'resistance': self.resistance[path],
+                'n': stats.n,
+                'mean': stats.mean,
+                'sem': stats.sem,
+                'mean_squared': stats.mean_squared,
+                'mean_squared_error': stats.mean_squared_error,
+            }
+            for path, stats in self.stats.items()
+        }
+
+    def boltzmann_fits(self, T, T_err=0.0, weighted=False):
+        """
+        V^2 vs R fit and Boltzmann's constant for each folder with at least
+        three resistors that have band data. Returns {directory: result dict}.
+        """
+        results = {}
+        for directory in self.directories:
+            paths = [p for p in self.stats
+                     if os.path.dirname(p) == directory
+                     and self.resistance[p] is not None
+                     and self.resistance[p] >= self.min_resistance
+                     and self.stats[p].n > 1]
+            if len(paths) < 3:
+                continue
+            R = np.array([self.resistance[p] for p in paths])
+            V2 = np.array([self.stats[p].mean_squared for p in paths])
+            V2_err = np.array([self.stats[p].mean_squared_error for p in paths])
+            fit = fit_lines(R, V2, sigma=V2_err if weighted else None)
+            k, k_err, percent_error = boltzmann_from_slope(fit['slope'], fit['slope_err'], T, T_err)
+            results[directory] = {'fit': fit, 'k': float(k), 'k_err': float(k_err),
+                                  'percent_error': float(percent_error), 'files': paths}
+        return results
+
+
+def watch(directories, T, T_err=0.0, interval=0.5, weighted=False, callback=None):
+    """Poll the folders every `interval` seconds and report each updated fit until interrupted."""
+    monitor = LiveNoiseMonitor(directories)
+    try:
+        while True:
+            if monitor.poll():
+                results = monitor.boltzmann_fits(T, T_err, weighted=weighted)
+                if callback is not None:
+                    callback(monitor, results)
+                else:
+                    for directory, result in results.items():
+                        print(f"{os.path.basename(directory)}: k = {result['k']:.3e} ± {result['k_err']:.1e} J/K "
+                              f"({result['percent_error']:.2f}% error, {len(result['files'])} resistors)")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return monitor
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Live Boltzmann fits from noise sweeps being written by LabVIEW.")
+    parser.add_argument('directories', nargs='+', help="sweep folders to watch")
+    parser.add_argument('--temperature', type=float, default=22.5 + 273.15, help="resistor temperature in K")
+    parser.add_argument('--temperature-error', type=float, default=0.1, help="temperature uncertainty in K")
+    parser.add_argument('--interval', type=float, default=0.5, help="polling interval in seconds")
+    parser.add_argument('--weighted', action='store_true', help="weight the fit by the V^2 uncertainties")
+    args = parser.parse_args()
+    watch(args.directories, args.temperature, args.temperature_error, args.interval, args.weighted)
@@ -0,0 +1,309 @@
+"""
+Flicker (1/f) plus white noise fits of every spectrum in a sweep.
+
+The plots only average the noise over a flat band (190-1500 Hz) and never say
+where the 1/f noise stops mattering. Here every spectrum is fitted with
+
+    S(f) = (A / f^alpha + S_white) * H(f),    H(f) = (1 + (2 pi f tau)^2)^-order
+
+where S = noise^2 is the PSD in V^2/Hz and H is an optional single-pole
+roll-off: either with tau fixed to the lock-in time constant parsed from the
+file name (TC_30ms, as in TimeConstant_Sweep) or with tau fitted, which also
+describes the high frequency roll-off of the high resistance spectra. The fit
+is least squares on ln S, so the decades of the spectrum count equally, with
+parameters (ln A, alpha, ln S_white[, ln tau]).
+
+All spectra are fitted together by one batched Levenberg-Marquardt: the
+residuals and Jacobians of the whole (spectra x frequencies) matrix are
+computed with array operations, the damped normal equations of all spectra
+are solved with one np.linalg.solve on a (spectra x p x p) stack, and each
+spectrum keeps its own damping and drops out once it has converged. The
+corner frequency f_c = (A / S_white)^(1/alpha), where the 1/f and white
+noise are equal, is returned with the white level and their uncertainties.
+
+alpha, ln S_white and ln tau are kept within bounds set by the data (see
+_bounds). A fit that ends on a bound, or stops because no step lowers its
+cost any more, is degenerate (the model does not describe the spectrum, or
+the roll-off is outside the band) and is returned with converged=False and
+NaN for its white level and corner frequency.
+
+    python noise_fit.py Jan_30_Clean_Data
+"""
+
+import argparse
+import warnings
+import numpy as np
+from scipy.special import expit
+
+from noise_store import load_sweeps
+
+ROLLOFF_ORDER = 1
+MAX_ITER = 200
+TOLERANCE = 1e-10
+LAMBDA_START = 1e-3
+LAMBDA_MAX = 1e12
+ALPHA_START = 1.0
+ALPHA_BOUNDS = (0.0, 6.0)  # steeper slopes are not flicker noise but a model failure
+# S_white is kept between the lowest fitted PSD / WHITE_MARGIN and the highest,
+# and the roll-off corner 1 / (2 pi tau) within TAU_MARGIN of the fitted band
+WHITE_MARGIN = 100.0
+TAU_MARGIN = 10.0
+BOUND_TOLERANCE = 1e-6  # parameters this close to a bound (in ln or alpha) are at it
+
+
+def model_psd(frequency, A, alpha, white, tau=None, order=ROLLOFF_ORDER):
+    """S(f) in V^2/Hz for the fitted parameters (broadcast against `frequency`)."""
+    frequency = np.asarray(frequency, dtype=np.float64)
+    psd = A / frequency ** alpha + white
+    if tau is not None:
+        psd = psd * (1 + (2 * np.pi * frequency * tau) ** 2) ** -order
+    return psd
+
+
+def _evaluate(p, log_f, log_s, weight, log_tau, order, jacobian=True):
+    # ln S residuals of every spectrum and, optionally, their Jacobian (spectra, points, parameters)
+    log_a = p[:, :1] - p[:, 1:2] * log_f
+    log_model = np.logaddexp(log_a, p[:, 2:3])
+    fit_tau = p.shape[1] == 4
+    log_tau = p[:, 3:4] if fit_tau else log_tau
+    x = None
+    if log_tau is not None:
+        x = np.exp(2 * (np.log(2 * np.pi) + log_f + log_tau))
+        log_model = log_model - order * np.log1p(x)
+    residual = np.where(weight > 0, log_model - log_s, 0.0)
+    if not jacobian:
+        return residual, None
+    flicker = expit(log_a - p[:, 2:3])
+    columns = [flicker, -log_f * flicker, 1 - flicker]
+    if fit_tau:
+        columns.append(-2 * order * x / (1 + x))
+    return residual, np.stack(columns, axis=-1) * weight[..., None]
+
+
+def _bounds(log_f, log_s, valid, fit_tau):
+    # (spectra x parameters) lower and upper bounds of (ln A, alpha, ln S_white[, ln tau])
+    n_spectra = log_s.shape[0]
+    lower = np.full((n_spectra, 4 if fit_tau else 3), -np.inf)
+    upper = np.full_like(lower, np.inf)
+    lower[:, 1], upper[:, 1] = ALPHA_BOUNDS
+    lower[:, 2] = np.min(np.where(valid, log_s, np.inf), axis=1) - np.log(WHITE_MARGIN)
+    upper[:, 2] = np.max(np.where(valid, log_s, -np.inf), axis=1)
+    if fit_tau:
+        f_min = np.min(np.where(valid, log_f, np.inf), axis=1)
+        f_max = np.max(np.where(valid, log_f, -np.inf), axis=1)
+        lower[:, 3] = -np.log(2 * np.pi * TAU_MARGIN) - f_max
+        upper[:, 3] = -np.log(2 * np.pi / TAU_MARGIN) - f_min
+    return lower, upper
+
+
+def _start(frequency, psd, weight, log_tau, order, fit_tau):
+    # Starting parameters from the data: white level from the median of the
+    # roll-off corrected PSD, A from the excess at the lowest fitted frequency
+    n_spectra = psd.shape[0]
+    frequency = np.broadcast_to(frequency, psd.shape)
+    corrected = psd if log_tau is None else psd * (1 + (2 * np.pi * frequency * np.exp(log_tau)) ** 2) ** order
+    used = np.where(weight > 0, corrected, np.nan)
+    white = np.nanmedian(used, axis=1)
+    first = np.argmax(weight > 0, axis=1)
+    rows = np.arange(n_spectra)
+    excess = corrected[rows, first] - white
+    A = np.where(excess > 0, excess, 0.01 * white) * frequency[rows, first] ** ALPHA_START
+    p = [np.log(A), np.full(n_spectra, ALPHA_START), np.log(white)]
+    if fit_tau:
+        # Corner of the roll-off: the last frequency still above half the white level
+        above = (used >= 0.5 * white[:, None]) & (weight > 0)
+        last = above.shape[1] - 1 - np.argmax(above[:, ::-1], axis=1)
+        p.append(-np.log(2 * np.pi * frequency[rows, last]))
+    return np.column_stack(p)
+
+
+def fit_spectra(frequency, noise, f_range=None, tau=None, fit_tau=False, order=ROLLOFF_ORDER, max_iter=MAX_ITER,
+                tol=TOLERANCE):
+    """
+    Fit A / f^alpha + S_white (times the roll-off) to every spectrum.
+
+    `noise` is a (spectra x frequencies) array in V/sqrt(Hz), `frequency` is
+    the shared grid or an array of the same shape (NaN padding is ignored).
+    `f_range` = (f_min, f_max) limits the fitted points. `tau` (s, scalar or
+    one per spectrum, NaN for none) fixes the roll-off; fit_tau=True fits it
+    (starting from `tau` if given). alpha is kept within ALPHA_BOUNDS and
+    S_white and tau within the bounds of _bounds.
+
+    Returns a dict of arrays: A, alpha, white (V^2/Hz), white_noise
+    (V/sqrt(Hz)), corner (Hz), tau (s) and their *_err, plus chi2 (of the
+    ln S residuals), n, n_iter and converged. Fits that end on a bound or
+    stall are not converged and have NaN white and corner values; spectra
+    with no more usable points than parameters are not fitted at all (NaN
+    parameters, not converged).
+    """
+    noise = np.atleast_2d(np.asarray(noise, dtype=np.float64))
+    frequency = np.asarray(frequency, dtype=np.float64)
+    frequency = np.broadcast_to(frequency if frequency.ndim > 1 else frequency[None, :], noise.shape)
+    psd = noise ** 2
+    valid = np.isfinite(frequency) & np.isfinite(psd) & (frequency > 0) & (psd > 0)
+    if f_range is not None:
+        valid &= (frequency >= f_range[0]) & (frequency <= f_range[1])
+    weight = valid.astype(np.float64)
+    log_f = np.log(np.where(valid, frequency, 1.0))
+    log_s = np.log(np.where(valid, psd, 1.0))
+    n = valid.sum(axis=1)
+
+    log_tau = None
+    if tau is not None and not fit_tau:
+        tau = np.broadcast_to(np.asarray(tau, dtype=np.float64), (noise.shape[0],))
+        # Spectra without a time constant get no roll-off (x = 0)
+        log_tau = np.where(np.isfinite(tau) & (tau > 0), np.log(np.where(tau > 0, tau, 1.0)), -np.inf)[:, None]
+    n_params = 4 if fit_tau else 3
+    short = n <= n_params
+
+    with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore'):
+        # Spectra too short to fit start (and stay) at NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        p = _start(frequency, psd, weight, None if fit_tau else log_tau, order, fit_tau)
+        if fit_tau and tau is not None:
+            p[:, 3] = np.log(np.broadcast_to(tau, (noise.shape[0],)))
+        lower, upper = _bounds(log_f, log_s, valid, fit_tau)
+        p = np.clip(p, lower, upper)
+    p[short] = np.nan
+    damping = np.full(len(p), LAMBDA_START)
+    n_iter = np.zeros(len(p), dtype=int)
+    converged = np.zeros(len(p), dtype=bool)
+    with np.errstate(invalid='ignore'):
+        residual, J = _evaluate(p, log_f, log_s, weight, log_tau, order)
+    cost = np.sum(residual ** 2, axis=1)
+
+    active = np.flatnonzero(np.isfinite(cost) & ~short)
+    for _ in range(max_iter):
+        if not len(active):
+            break
+        Ja, ra = J[active], residual[active]
+        H = np.einsum('sni,snj->sij', Ja, Ja)
+        g = np.einsum('sni,sn->si', Ja, ra)
+        diagonal = np.diagonal(H, axis1=1, axis2=2)
+        damped = H + (damping[active, None] * (diagonal + 1e-12))[:, :, None] * np.eye(n_params)
+        step = -np.linalg.solve(damped, g[..., None])[..., 0]
+        trial = p[active] + step
+        trial = np.clip(trial, lower[active], upper[active])
+        lt = None if log_tau is None else log_tau[active]
+        trial_residual, _ = _evaluate(trial, log_f[active], log_s[active], weight[active], lt, order, False)
+        trial_cost = np.sum(trial_residual ** 2, axis=1)
+        n_iter[active] += 1
+
+        better = np.isfinite(trial_cost) & (trial_cost <= cost[active])
+        accepted = active[better]
+        small = (cost[accepted] - trial_cost[better]) <= tol * (1 + cost[accepted])
+        p[accepted] = trial[better]
+        cost[accepted] = trial_cost[better]
+        damping[accepted] = np.maximum(damping[accepted] / 10, 1e-12)
+        damping[active[~better]] *= 10
+        if len(accepted):
+            lt = None if log_tau is None else log_tau[accepted]
+            residual[accepted], J[accepted] = _evaluate(p[accepted], log_f[accepted], log_s[accepted],
+                                                        weight[accepted], lt, order)
+        converged[accepted[small]] = True
+        # Once the damping has grown this far no step lowers the cost: the fit
+        # has stalled (usually against a bound) and is left unconverged
+        stalled = damping[active] > LAMBDA_MAX
+        active = active[~converged[active] & ~stalled]
+
+    finite = np.isfinite(lower) | np.isfinite(upper)
+    at_bound = finite & ((p - lower <= BOUND_TOLERANCE) | (upper - p <= BOUND_TOLERANCE))
+    converged &= ~at_bound.any(axis=1)
+
+    # Covariance of the parameters, scaled by the scatter of the ln S residuals
+    H = np.einsum('sni,snj->sij', J, J)
+    dof = np.maximum(n - n_params, 1)
+    covariance = np.full_like(H, np.nan)
+    fitted = np.isfinite(H).all(axis=(1, 2))
+    covariance[fitted] = np.linalg.pinv(H[fitted]) * (cost[fitted] / dof[fitted])[:, None, None]
+    sigma = np.sqrt(np.maximum(np.diagonal(covariance, axis1=1, axis2=2), 0))
+
+    log_A, alpha, log_W = p[:, 0], p[:, 1], p[:, 2]
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        log_corner = (log_A - log_W) / alpha
+        gradient = np.zeros_like(p)
+        gradient[:, 0], gradient[:, 1], gradient[:, 2] = 1 / alpha, -log_corner / alpha, -1 / alpha
+        corner_var = np.einsum('si,sij,sj->s', gradient, covariance, gradient)
+        corner = np.exp(log_corner)
+    A = np.exp(log_A)
+    # The white level and corner of a degenerate fit mean nothing
+    white = np.where(converged, np.exp(log_W), np.nan)
+    corner = np.where(converged, corner, np.nan)
+    result = {
+        'A': A, 'A_err': A * sigma[:, 0],
+        'alpha': alpha, 'alpha_err': sigma[:, 1],
+        'white': white, 'white_err': white * sigma[:, 2],
+        'white_noise': np.sqrt(white), 'white_noise_err': np.sqrt(white) * sigma[:, 2] / 2,
+        'corner': corner, 'corner_err': corner * np.sqrt(np.maximum(corner_var, 0)),
+        'chi2': cost, 'n': n, 'n_iter': n_iter, 'converged': converged,
+    }
+    if fit_tau:
+        result['tau'], result['tau_err'] = np.exp(p[:, 3]), np.exp(p[:, 3]) * sigma[:, 3]
+    elif log_tau is not None:
+        result['tau'], result['tau_err'] = np.exp(log_tau[:, 0]), np.zeros(len(p))
+    return result
+
+
+def _padded(store, files):
+    # NaN-padded (files x longest spectrum) frequency and noise arrays for mixed grids
+    spectra = [store.spectrum(f) for f in files]
+    width = max(len(f) for f, _ in spectra)
+    frequency = np.full((len(files), width), np.nan)
+    noise = np.full((len(files), width), np.nan)
+    for i, (f, v) in enumerate(spectra):
+        frequency[i, :len(f)], noise[i, :len(v)] = f, v
+    return frequency, noise
+
+
+def fit_store(store, files=None, f_range=None, rolloff='fit', order=ROLLOFF_ORDER):
+    """
+    Fit the spectra of a SweepStore (all files by default). rolloff is 'fit'
+    (the default), 'time_constant' (tau from each file's parsed time constant)
+    or None; without a roll-off the fall-off above the lock-in bandwidth is
+    fitted as 1/f noise and the white level comes out far too low.
+    Returns one dict per file with its metadata and fitted values.
+    """
+    files = list(files if files is not None else store.files)
+    if store.has_common_grid(files):
+        frequency, noise = store.matrix(files)
+    else:
+        frequency, noise = _padded(store, files)
+    tau = None
+    if rolloff == 'time_constant':
+        tau = np.array([store.metadata[f].get('time_constant') or np.nan for f in files], dtype=np.float64)
+    elif rolloff not in (None, 'fit'):
+        raise ValueError(f"Unknown roll-off '{rolloff}', use None, 'time_constant' or 'fit'.")
+    fits = fit_spectra(frequency, noise, f_range, tau=tau, fit_tau=rolloff == 'fit', order=order)
+    return [
+        {'file': file, 'metadata': store.metadata[file],
+         **{key: value[i].item() for key, value in fits.items()}}
+        for i, file in enumerate(files)
+    ]
+
+
+def fit_sweep(directory, f_range=None, rolloff='fit', order=ROLLOFF_ORDER):
+    """Noise model fits of every spectrum in a sweep folder."""
+    return {'f_range': None if f_range is None else list(f_range), 'rolloff': rolloff,
+            'spectra': fit_store(load_sweeps(directory), f_range=f_range, rolloff=rolloff, order=order)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fit 1/f plus white noise to every spectrum of sweep folders.")
+    parser.add_argument('directories', nargs='+', help="sweep folders")
+    parser.add_argument('--f-min', type=float, help="lowest fitted frequency in Hz")
+    parser.add_argument('--f-max', type=float, help="highest fitted frequency in Hz")
+    parser.add_argument('--rolloff', choices=['fit', 'time_constant', 'none'], default='fit',
+                        help="single-pole roll-off: fitted (default), from the time constant, or none")
+    parser.add_argument('--order', type=int, default=ROLLOFF_ORDER, help="order of the roll-off")
+    args = parser.parse_args()
+
+    f_range = None
+    if args.f_min is not None or args.f_max is not None:
+        f_range = (args.f_min or 0, args.f_max or np.inf)
+    for directory in args.directories:
+        print(directory)
+        for row in fit_sweep(directory, f_range, None if args.rolloff == 'none' else args.rolloff, args.order)['spectra']:
+            tau = f"  tau {row['tau'] * 1e6:8.3g} us" if 'tau' in row else ''
+            print(f"  {row['file']:40s} white {row['white_noise']:.3e} V/rtHz  alpha {row['alpha']:5.2f} "
+                  f"± {row['alpha_err']:.2f}  f_c {row['corner']:9.3g} ± {row['corner_err']:.2g} Hz{tau}"
+                  f"{'' if row['converged'] else '  (not converged)'}")
@@ -0,0 +1,130 @@
+"""
+Theoretical noise of the resistor measurements on broadcast grids.
+
+The scripts each define thermal_noise_psd(R) = sqrt(4 k T R) with their own
+k = 1.38e-23 and T, and evaluate it one resistor at a time. Here Johnson,
+shot and amplifier input noise are written with scipy.constants as array
+functions that broadcast over any combination of resistance, temperature and
+frequency, and noise_grid() evaluates them all on an (R x T x f) grid in one
+call. Grids already computed are memoized (the arrays returned are read-only
+so the cached copies cannot be changed by a caller), and lookup_table()
+gives the theoretical spectra in the layout of SweepStore.combined_dataframe
+for the comparison overlays:
+
+    table = lookup_table([250e3, 510e3, 998e3, 1.4981e6], T=295.65, frequency=frequency)
+
+All PSDs are in V^2/Hz and noise densities in V/sqrt(Hz).
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from scipy.constants import Boltzmann, elementary_charge
+
+# Input noise of the SR830 lock-in (A input, 1 kHz) from its specifications
+AMPLIFIER_VOLTAGE_NOISE = 6e-9  # V/sqrt(Hz)
+AMPLIFIER_CURRENT_NOISE = 0.0  # A/sqrt(Hz), negligible in voltage mode
+AMPLIFIER_CORNER = 0.0  # Hz, 1/f corner of the voltage noise
+GRID_CACHE_SIZE = 32
+# Frequency grid of the LabVIEW exports (41 log-spaced points)
+EXPORT_FREQUENCY = np.geomspace(10, 1e5, 41)
+
+
+def johnson_psd(R, T):
+    """Johnson-Nyquist noise 4 k T R of a resistance R (Ohm) at T (K)."""
+    return 4 * Boltzmann * np.asarray(T, dtype=float) * np.asarray(R, dtype=float)
+
+
+def johnson_noise(R, T):
+    """Johnson noise density sqrt(4 k T R)."""
+    return np.sqrt(johnson_psd(R, T))
+
+
+def shot_psd(current, R=1.0):
+    """Shot noise 2 q I of a DC current (A) as a voltage across R (with R = 1, the current PSD in A^2/Hz)."""
+    return 2 * elementary_charge * np.abs(np.asarray(current, dtype=float)) * np.asarray(R, dtype=float) ** 2
+
+
+def amplifier_psd(frequency, R=0.0, voltage_noise=AMPLIFIER_VOLTAGE_NOISE, current_noise=AMPLIFIER_CURRENT_NOISE,
+                  corner=AMPLIFIER_CORNER):
+    """
+    Input-referred amplifier noise e_n^2 (1 + f_c / f) + (i_n R)^2 for a
+    source resistance R.
+    """
+    frequency = np.asarray(frequency, dtype=float)
+    voltage = voltage_noise ** 2 * (1 + corner / frequency)
+    return voltage + (current_noise * np.asarray(R, dtype=float)) ** 2
+
+
+def total_psd(R, T, frequency, current=0.0, **amplifier):
+    """Johnson, shot and amplifier noise added in power, broadcast over all arguments."""
+    return johnson_psd(R, T) + shot_psd(current, R) + amplifier_psd(frequency, R, **amplifier)
+
+
+def _readonly(array):
+    array.setflags(write=False)
+    return array
+
+
+@lru_cache(maxsize=GRID_CACHE_SIZE)
+def _grid(R, T, frequency, current, amplifier):
+    R = np.array(R)[:, None, None]
+    T = np.array(T)[None, :, None]
+    frequency = np.array(frequency)[None, None, :]
+    amplifier = dict(amplifier)
+    johnson = np.broadcast_to(johnson_psd(R, T), (R.shape[0], T.shape[1], 1))
+    shot = shot_psd(current, R)
+    amp = amplifier_psd(frequency, R, **amplifier)
+    total = johnson + shot + amp
+    return {
+        'johnson': _readonly(johnson.copy()),
+        'shot': _readonly(np.array(shot)),
+        'amplifier': _readonly(np.array(amp)),
+        'total': _readonly(total),
+        'noise': _readonly(np.sqrt(total)),
+    }
+
+
+def noise_grid(R, T, frequency, current=0.0, **amplifier):
+    """
+    Noise components on the (R x T x f) grid of the 1-d arrays (or scalars)
+    R, T and frequency. Returns a dict with the 'johnson', 'shot',
+    'amplifier' and 'total' PSDs and the total 'noise' density. total and
+    noise are (len(R), len(T), len(frequency)); the components keep length
+    1 on the axes they do not depend on. Repeated grids come from a cache.
+    """
+    key = [tuple(np.atleast_1d(np.asarray(a, dtype=float)).tolist()) for a in (R, T, frequency)]
+    return _grid(*key, float(current), tuple(sorted(amplifier.items())))
+
+
+def lookup_table(resistances, T, frequency=EXPORT_FREQUENCY, components=('johnson',), **amplifier):
+    """
+    Theoretical noise density (V/sqrt(Hz)) of each resistance at T, as a
+    DataFrame with a 'Frequency' column and one column per resistance named
+    like the sweep scripts ('998000.0 Ohms'). `components` picks the noise
+    sources included ('johnson', 'shot', 'amplifier').
+    """
+    grid = noise_grid(resistances, T, frequency, **amplifier)
+    shape = (len(np.atleast_1d(resistances)), 1, len(np.atleast_1d(frequency)))
+    psd = sum(np.broadcast_to(grid[c], shape) for c in components)
+    table = pd.DataFrame({'Frequency': np.atleast_1d(frequency)})
+    for R, noise in zip(np.atleast_1d(resistances), np.sqrt(psd[:, 0])):
+        table[f"{float(R)} Ohms"] = noise
+    return table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write theoretical noise lookup tables for the comparison overlays.")
+    parser.add_argument('resistances', nargs='+', type=float, help="resistances in Ohms")
+    parser.add_argument('--temperature', type=float, action='append', help="temperature in K (repeatable, default 295.65)")
+    parser.add_argument('--amplifier', action='store_true', help="include the amplifier input noise")
+    parser.add_argument('--out', default='.', help="directory for the theoretical_<T>K.csv tables")
+    args = parser.parse_args()
+
+    components = ('johnson', 'amplifier') if args.amplifier else ('johnson',)
+    for T in args.temperature or [22.5 + 273.15]:
+        path = os.path.join(args.out, f"theoretical_{T:g}K.csv")
+        lookup_table(args.resistances, T, components=components).to_csv(path, index=False)
+        print(f"Wrote {path}")
@@ -0,0 +1,186 @@
+"""
+Columnar binary store for the LabVIEW noise-spectrum exports.
+
+Every sweep folder (Jan_30_Clean_Data, Differential, ...) is parsed once into a
+hidden ``.noise_store`` directory next to the CSVs. It holds the frequency and
+noise columns of every file as flat float64 ``.npy`` arrays, an ``offsets``
+array marking where each file starts, and a ``manifest.json`` with the source
+file names, sizes, modification times and the parameters parsed from each name. Later loads memory-map the arrays
+instead of re-parsing the text, and the store is rebuilt automatically when a
+CSV in the folder is added, removed or modified.
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+from sweep_metadata import parse_sweep_file
+
+STORE_DIRNAME = '.noise_store'
+STORE_VERSION = 4
+
+
+def read_noise_csv(file_path):
+    """Parse one LabVIEW export into float64 (frequency, noise) arrays."""
+    # The first line is the LabVIEW header ('Frequency (Hz) - Plot 0,X noise ...'),
+    # some exports use a tab in it, so skip it instead of parsing it
+    data = pd.read_csv(file_path, sep=',', skiprows=1, names=['Frequency', 'Noise'])
+    data = data.apply(pd.to_numeric, errors='coerce')
+    return data['Frequency'].to_numpy(np.float64), data['Noise'].to_numpy(np.float64)
+
+
+def list_csv_files(directory):
+    """Sorted CSV file names in a sweep folder."""
+    return sorted(f for f in os.listdir(directory) if f.endswith('.csv'))
+
+
+def _fingerprint(directory, files):
+    # Size and mtime are enough to notice a re-exported or appended file
+    sources = []
+    for file in files:
+        stat = os.stat(os.path.join(directory, file))
+        sources.append({'file': file, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+    return sources
+
+
+def _store_path(directory):
+    return os.path.join(directory, STORE_DIRNAME)
+
+
+def _read_manifest(directory):
+    manifest_path = os.path.join(_store_path(directory), 'manifest.json')
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_array(store_dir, name, array):
+    # Write to a temporary name first so a crash never leaves a half-written array
+    tmp_path = os.path.join(store_dir, name + '.tmp.npy')
+    np.save(tmp_path, array)
+    os.replace(tmp_path, os.path.join(store_dir, name + '.npy'))
+
+
+def build_store(directory):
+    """
+    Parse every CSV in `directory` and write the binary store.
+
+    The parameters parsed from each file name (see sweep_metadata) are kept in
+    the manifest alongside the source information.
+    Returns the manifest that was written.
+    """
+    files = list_csv_files(directory)
+    frequencies = []
+    noises = []
+    offsets = [0]
+    for file in files:
+        frequency, noise = read_noise_csv(os.path.join(directory, file))
+        frequencies.append(frequency)
+        noises.append(noise)
+        offsets.append(offsets[-1] + len(frequency))
+
+    store_dir = _store_path(directory)
+    os.makedirs(store_dir, exist_ok=True)
+    empty = np.empty(0, dtype=np.float64)
+    _write_array(store_dir, 'frequency', np.concatenate(frequencies) if files else empty)
+    _write_array(store_dir, 'noise', np.concatenate(noises) if files else empty)
+    _write_array(store_dir, 'offsets', np.asarray(offsets, dtype=np.int64))
+
+    manifest = {
+        'version': STORE_VERSION,
+        'files': files,
+        'sources': _fingerprint(directory, files),
+        'metadata': {file: parse_sweep_file(directory, file) for file in files},
+    }
+    tmp_path = os.path.join(store_dir, 'manifest.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, os.path.join(store_dir, 'manifest.json'))
+    return manifest
+
+
+def store_is_current(directory, manifest=None):
+    """True if the binary store exists and matches the CSVs on disk."""
+    if manifest is None:
+        manifest = _read_manifest(directory)
+    if manifest is None or manifest.get('version') != STORE_VERSION:
+        return False
+    files = list_csv_files(directory)
+    return manifest['files'] == files and manifest['sources'] == _fingerprint(directory, files)
+
+
+class SweepStore:
+    """Memory-mapped view of every spectrum in one sweep folder."""
+
+    def __init__(self, directory, manifest):
+        store_dir = _store_path(directory)
+        self.directory = directory
+        self.files = list(manifest['files'])
+        self.metadata = manifest['metadata']
+        self.frequency = np.load(os.path.join(store_dir, 'frequency.npy'), mmap_mode='r')
+        self.noise = np.load(os.path.join(store_dir, 'noise.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(store_dir, 'offsets.npy'))
+
+    def __len__(self):
+        return len(self.files)
+
+    def _index(self, key):
+        return self.files.index(key) if isinstance(key, str) else key
+
+    def spectrum(self, key):
+        """(frequency, noise) arrays for one file, by file name or position."""
+        i = self._index(key)
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return self.frequency[start:stop], self.noise[start:stop]
+
+    def select(self, **criteria):
+        """File names whose parsed metadata matches all `criteria`, e.g. select(mode='differential')."""
+        return [file for file in self.files
+                if all(self.metadata[file].get(field) == value for field, value in criteria.items())]
+
+    def has_common_grid(self, files=None):
+        """True if the selected files were all recorded on the same frequency grid."""
+        indices = [self._index(f) for f in (files if files is not None else self.files)]
+        reference = self.spectrum(indices[0])[0]
+        return all(np.array_equal(self.spectrum(i)[0], reference) for i in indices[1:])
+
+    def matrix(self, files=None):
+        """
+        Stack the selected spectra into a (files x frequencies) noise matrix.
+
+        Returns the shared frequency array and the matrix. Raises ValueError if
+        the files were not recorded on the same frequency grid.
+        """
+        files = list(files if files is not None else self.files)
+        if not files:
+            return np.empty(0), np.empty((0, 0))
+        if not self.has_common_grid(files):
+            raise ValueError("The selected sweeps do not share a frequency grid.")
+        frequency = np.array(self.spectrum(files[0])[0])
+        return frequency, np.vstack([self.spectrum(f)[1] for f in files])
+
+    def combined_dataframe(self, columns=None):
+        """
+        DataFrame with a 'Frequency' column followed by one noise column per file.
+
+        `columns` maps file names to column labels (in the wanted order); by
+        default every file is included under its own name.
+        """
+        if columns is None:
+            columns = {file: file for file in self.files}
+        frequency, matrix = self.matrix(list(columns))
+        # Built in one step, inserting the columns one by one fragments the frame
+        return pd.DataFrame({'Frequency': frequency, **dict(zip(columns.values(), matrix))})
+
+
+def load_sweeps(directory, rebuild=False):
+    """
+    Open the binary store for a sweep folder, (re)building it only when the
+    CSVs have changed since it was last written.
+    """
+    manifest = _read_manifest(directory)
+    if rebuild or not store_is_current(directory, manifest):
+        manifest = build_store(directory)
+    return SweepStore(directory, manifest)
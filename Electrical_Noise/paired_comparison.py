@@ -0,0 +1,212 @@
+"""
+Single-ended against differential noise, resistor by resistor.
+
+Jan_30_Clean_Sweep_Results.py and Differential_Plots.py analyse the two
+modes separately and print two unrelated values of k. Here the spectra of
+the two sweeps are paired by resistance (250, 510, 998 kOhm and ~1.5 MOhm,
+within a tolerance),
+put on a shared frequency index (the single-ended grid where the two
+overlap, with the differential spectra interpolated in log-log if their grid
+differs), and compared frequency by frequency:
+
+    ratio          V_diff / V_single
+    rejection_db   10 log10(S_single / S_diff), the noise power the
+                   differential input rejects (common-mode pickup), in dB
+    common_mode    sqrt(S_single - S_diff), the rejected noise density (NaN
+                   where the differential spectrum is the larger)
+
+Both V^2 vs R fits are made on the same band of the shared index, and the two
+values of k are reported side by side with their inverse-variance weighted
+mean and the significance of their difference. Both fits use the same room
+temperature, so its error is left out of the difference and added once to
+the mean; when the two values disagree (chi^2 > 1) the error of the mean is
+scaled by the Birge ratio sqrt(chi^2 / dof).
+
+    python paired_comparison.py Jan_30_Clean_Data Differential
+"""
+
+import json
+import argparse
+import numpy as np
+
+from noise_store import load_sweeps
+from band_stats import band_statistics, fit_lines, boltzmann_from_slope
+from instrument_response import corrected_matrix, load_response
+
+ROOM_TEMPERATURE = 22.5 + 273.15  # K
+ROOM_TEMPERATURE_ERROR = 0.1  # K
+PAIR_TOLERANCE = 0.02  # relative difference of two resistances taken as the same resistor
+MIN_RESISTANCE = 1e3  # Ohms, leaves out the 50 Ohm terminator runs
+BAND = (190, 1500)
+
+
+def pair_resistors(resistances_a, resistances_b, tolerance=PAIR_TOLERANCE):
+    """
+    Index pairs (i, j) matching resistances_a[i] to the closest
+    resistances_b[j] within the relative `tolerance`, each used at most once.
+    """
+    a = np.asarray(resistances_a, dtype=float)
+    b = np.asarray(resistances_b, dtype=float)
+    distance = np.abs(a[:, None] - b[None, :]) / np.minimum(a[:, None], b[None, :])
+    pairs = []
+    # Closest pairs first, so a near match is never taken by a worse one
+    for flat in np.argsort(distance, axis=None):
+        i, j = np.unravel_index(flat, distance.shape)
+        if distance[i, j] > tolerance:
+            break
+        if all(i != p and j != q for p, q in pairs):
+            pairs.append((int(i), int(j)))
+    return sorted(pairs)
+
+
+def align(frequency_a, noise_a, frequency_b, noise_b):
+    """
+    Put the (spectra x frequencies) arrays noise_a and noise_b on one
+    frequency index: the points of frequency_a inside the range of
+    frequency_b, with noise_b interpolated in log frequency and log noise if
+    the grids differ. Returns (frequency, noise_a, noise_b).
+    """
+    frequency_a, frequency_b = np.asarray(frequency_a), np.asarray(frequency_b)
+    noise_a, noise_b = np.atleast_2d(noise_a), np.atleast_2d(noise_b)
+    if np.array_equal(frequency_a, frequency_b):
+        return frequency_a, noise_a, noise_b
+    inside = (frequency_a >= frequency_b.min()) & (frequency_a <= frequency_b.max())
+    frequency = frequency_a[inside]
+    log_f, log_fb = np.log(frequency), np.log(frequency_b)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_b = np.log(noise_b)
+    aligned = np.exp(np.vstack([np.interp(log_f, log_fb, row) for row in log_b]))
+    return frequency, noise_a[:, inside], aligned
+
+
+def compare_spectra(single, differential):
+    """Per-frequency ratio, rejection (dB) and common-mode noise of aligned spectra."""
+    S_single, S_diff = single ** 2, differential ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = differential / single
+        rejection_db = 10 * np.log10(S_single / S_diff)
+        common_mode = np.sqrt(np.where(S_single > S_diff, S_single - S_diff, np.nan))
+    return {'ratio': ratio, 'rejection_db': rejection_db, 'common_mode': common_mode}
+
+
+def _boltzmann(R, stats, T, T_err):
+    fit = fit_lines(R, stats['mean_squared'])
+    k, k_err, percent_error = boltzmann_from_slope(fit['slope'], fit['slope_err'], T, T_err)
+    k_stat_err = boltzmann_from_slope(fit['slope'], fit['slope_err'], T)[1]
+    return {'slope': float(fit['slope']), 'slope_err': float(fit['slope_err']),
+            'intercept': float(fit['intercept']), 'r_value': float(fit['r_value']),
+            'k': float(k), 'k_err': float(k_err), 'k_stat_err': float(k_stat_err),
+            'percent_error': float(percent_error)}
+
+
+def combine(k, k_stat_err, T, T_err):
+    """
+    Inverse-variance mean and difference of the two values of k, given their
+    slope-only errors. The temperature error is common to both: it cancels in
+    the difference (up to the difference itself) and is added once to the
+    mean. If chi^2 of the mean is above its one degree of freedom, the values
+    are inconsistent and the error of the mean is scaled by the Birge ratio.
+    """
+    k, k_stat_err = np.asarray(k, dtype=float), np.asarray(k_stat_err, dtype=float)
+    weights = 1 / k_stat_err ** 2
+    mean = np.sum(weights * k) / np.sum(weights)
+    chi2 = float(np.sum(weights * (k - mean) ** 2))
+    birge_ratio = np.sqrt(chi2 / (len(k) - 1))
+    mean_err = max(birge_ratio, 1.0) / np.sqrt(np.sum(weights))
+    difference = k[0] - k[1]
+    difference_err = np.hypot(np.hypot(*k_stat_err), difference * T_err / T)
+    return {'k': float(mean), 'k_err': float(np.hypot(mean_err, mean * T_err / T)),
+            'chi2': chi2, 'birge_ratio': float(birge_ratio),
+            'difference': float(difference), 'difference_err': float(difference_err),
+            'z': float(difference / difference_err)}
+
+
+def _resistor_files(store):
+    files = [f for f in store.files if (store.metadata[f]['resistance'] or 0) >= MIN_RESISTANCE]
+    return files, np.array([store.metadata[f]['resistance'] for f in files])
+
+
+def compare_sweeps(single_dir, differential_dir, band=BAND, T=ROOM_TEMPERATURE, T_err=ROOM_TEMPERATURE_ERROR,
+                   tolerance=PAIR_TOLERANCE, correct=False):
+    """
+    Pair the resistors of a single-ended and a differential sweep folder and
+    compare them. Returns a dict with the pairs, the shared frequency index,
+    the per-frequency comparison matrices (pairs x frequencies), the band
+    statistics of both modes, both k fits and their combination.
+    """
+    single_store, diff_store = load_sweeps(single_dir), load_sweeps(differential_dir)
+    single_files, single_R = _resistor_files(single_store)
+    diff_files, diff_R = _resistor_files(diff_store)
+    pairs = pair_resistors(single_R, diff_R, tolerance)
+    if len(pairs) < 3:
+        raise ValueError(f"Need at least three paired resistors for the k fits, found {len(pairs)}.")
+    single_files = [single_files[i] for i, _ in pairs]
+    diff_files = [diff_files[j] for _, j in pairs]
+    single_R = single_R[[i for i, _ in pairs]]
+    diff_R = diff_R[[j for _, j in pairs]]
+
+    if correct:
+        response = load_response()
+        single_frequency, single = corrected_matrix(single_store, single_files, response)
+        diff_frequency, differential = corrected_matrix(diff_store, diff_files, response)
+    else:
+        single_frequency, single = single_store.matrix(single_files)
+        diff_frequency, differential = diff_store.matrix(diff_files)
+    frequency, single, differential = align(single_frequency, single, diff_frequency, differential)
+
+    single_stats = band_statistics(frequency, single, band)
+    diff_stats = band_statistics(frequency, differential, band)
+    single_fit = _boltzmann(single_R, single_stats, T, T_err)
+    diff_fit = _boltzmann(diff_R, diff_stats, T, T_err)
+
+    return {
+        'band': list(band),
+        'temperature': T,
+        'pairs': [{'single_ended': s, 'differential': d, 'resistance_single_ended': float(rs),
+                   'resistance_differential': float(rd)}
+                  for s, d, rs, rd in zip(single_files, diff_files, single_R, diff_R)],
+        'frequency': frequency,
+        'single_ended': single,
+        'differential': differential,
+        **compare_spectra(single, differential),
+        'single_ended_band': single_stats,
+        'differential_band': diff_stats,
+        'single_ended_fit': single_fit,
+        'differential_fit': diff_fit,
+        'joint': combine([single_fit['k'], diff_fit['k']], [single_fit['k_stat_err'], diff_fit['k_stat_err']],
+                         T, T_err),
+    }
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare single-ended and differential resistor sweeps.")
+    parser.add_argument('single_ended', help="single-ended sweep folder")
+    parser.add_argument('differential', help="differential sweep folder")
+    parser.add_argument('--f-min', type=float, default=BAND[0], help="lower edge of the averaging band in Hz")
+    parser.add_argument('--f-max', type=float, default=BAND[1], help="upper edge of the averaging band in Hz")
+    parser.add_argument('--correct', action='store_true', help="correct the spectra for the instrument floor and roll-off")
+    parser.add_argument('--output', help="write the full comparison as JSON to this file")
+    args = parser.parse_args()
+
+    result = compare_sweeps(args.single_ended, args.differential, (args.f_min, args.f_max), correct=args.correct)
+    in_band = (result['frequency'] >= args.f_min) & (result['frequency'] <= args.f_max)
+    for pair, ratio, rejection in zip(result['pairs'], result['ratio'], result['rejection_db']):
+        print(f"{pair['resistance_single_ended'] / 1e3:7.1f} kOhm  V_diff / V_single = {np.nanmean(ratio[in_band]):.3f}"
+              f"  rejection {np.nanmean(rejection[in_band]):+.2f} dB in band")
+    for mode in ('single_ended', 'differential'):
+        fit = result[mode + '_fit']
+        print(f"{mode:13s} k = {fit['k']:.3e} ± {fit['k_err']:.1e} J/K ({fit['percent_error']:.1f}% from CODATA)")
+    joint = result['joint']
+    print(f"{'combined':13s} k = {joint['k']:.3e} ± {joint['k_err']:.1e} J/K (Birge ratio {joint['birge_ratio']:.1f}), "
+          f"difference {joint['difference']:.2e} ± {joint['difference_err']:.1e} J/K ({joint['z']:+.1f} sigma)")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=1, default=_to_json)
@@ -0,0 +1,226 @@
+"""
+Off-screen figure rendering for the noise analysis.
+
+The plot scripts set 'figure.dpi' to 500-2000 globally, which turns every
+interactive figure into a huge raster. This module keeps previews and
+publication output apart:
+
+  * previews are drawn on the Agg canvas at screen resolution, with long
+    series decimated to the points that can actually be seen;
+  * publication figures are written as PDF/SVG, or PNG at a high dpi, and can
+    be rendered in worker processes with render_many().
+
+Figures are built from reusable templates (log-log noise spectrum with band
+markers, linear error-bar plot). A template keeps its axes, labels and band
+markers between renders and only swaps the data series. The plot scripts
+draw their spectrum and error-bar figures with show_figure(), which draws the
+template in a pyplot window (and writes the publication figure if the spec
+has a 'path'); the style itself comes from plot_style.py at the top of the
+repository.
+"""
+
+import os
+import sys
+import numpy as np
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from plot_style import PREVIEW_DPI, PUBLICATION_DPI
+# Re-exported so the plot scripts can set the style from the module they draw with
+from plot_style import apply_style  # noqa: F401
+
+PREVIEW_MAX_POINTS = 2000
+NOISE_LABEL = "Noise (V/$\\sqrt{\\mathrm{Hz}}$)"
+
+
+def decimate(x, y, max_points=PREVIEW_MAX_POINTS):
+    """
+    Reduce a series to at most about `max_points` points for display, keeping
+    the minimum and maximum of each bucket so spikes stay visible.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(y) <= max_points:
+        return x, y
+    # NaNs are not drawn anyway and would upset the ordering below
+    finite = np.isfinite(y)
+    x, y = x[finite], y[finite]
+    n = len(y)
+    if n <= max_points:
+        return x, y
+    buckets = max(max_points // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.intp)
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    # Sorting by (bucket, y) puts each bucket's minimum first and maximum last
+    order = np.lexsort((y, bucket))
+    keep = np.zeros(n, dtype=bool)
+    keep[order[edges[:-1]]] = True
+    keep[order[edges[1:] - 1]] = True
+    keep[[0, -1]] = True
+    return x[keep], y[keep]
+
+
+class FigureTemplate:
+    """
+    A figure whose fixed parts (axes, scales, labels, band markers) are built
+    once. render() draws a set of series, writes or returns the result and
+    then removes the series so the template can be reused.
+    """
+
+    def __init__(self, kind='spectrum', title=None, xlabel=None, ylabel=None, band=None,
+                 figsize=(10, 6), legend_title=None, legend_loc='best', legend_columns=1, legend_outside=False,
+                 figure=None):
+        self.kind = kind
+        self.legend_title = legend_title
+        self.legend_kwargs = ({'loc': 'upper left', 'bbox_to_anchor': (1.02, 1)} if legend_outside
+                              else {'loc': legend_loc})
+        self.legend_kwargs['ncol'] = legend_columns
+        # An existing (pyplot) figure can be drawn into instead of an off-screen one
+        if figure is None:
+            figure = Figure(figsize=figsize)
+            FigureCanvasAgg(figure)
+        self.figure = figure
+        self.ax = self.figure.add_subplot()
+        if kind == 'spectrum':
+            self.ax.set_xscale('log')
+            self.ax.set_yscale('log')
+            self.ax.set_xlabel(xlabel or "Frequency (Hz)")
+            self.ax.set_ylabel(ylabel or NOISE_LABEL)
+        elif kind == 'errorbar':
+            self.ax.set_xlabel(xlabel or "")
+            self.ax.set_ylabel(ylabel or "")
+        else:
+            raise ValueError(f"Unknown figure template '{kind}'.")
+        if title:
+            self.ax.set_title(title)
+        self.ax.grid(True)
+        if band is not None:
+            for f in band:
+                self.ax.axvline(x=f, color='gray', linestyle='--', linewidth=1)
+                self.ax.text(f, 0.02, f'{f} Hz', rotation=90, verticalalignment='bottom',
+                             transform=self.ax.get_xaxis_transform())
+        self._fixed = set(self.ax.get_children())
+
+    def _draw(self, series, max_points):
+        for s in series:
+            style = s.get('style', 'line')
+            kwargs = dict(s.get('kwargs', {}))
+            if 'label' in s:
+                kwargs['label'] = s['label']
+            if 'color' in s:
+                kwargs['color'] = s['color']
+            if style == 'reference':
+                # Horizontal theoretical level across the plotted range
+                self.ax.axhline(s['y'], linestyle='--', linewidth=2, **kwargs)
+            elif style == 'errorbar':
+                self.ax.errorbar(s['x'], s['y'], xerr=s.get('xerr'), yerr=s.get('yerr'), fmt=s.get('fmt', 'o'),
+                                 ecolor=s.get('ecolor', 'lightgray'), elinewidth=3, capsize=0, **kwargs)
+            else:
+                x, y = s['x'], s['y']
+                if max_points:
+                    x, y = decimate(x, y, max_points)
+                self.ax.plot(x, y, s.get('fmt', '-'), **kwargs)
+        if any('label' in s for s in series):
+            self.ax.legend(title=self.legend_title, **self.legend_kwargs)
+
+    def _clear(self):
+        legend = self.ax.get_legend()
+        if legend is not None:
+            legend.remove()
+        for artist in list(self.ax.get_children()):
+            if artist not in self._fixed:
+                try:
+                    artist.remove()
+                except (NotImplementedError, ValueError):
+                    pass
+        # Containers (error bars) keep references to their removed artists
+        self.ax.containers.clear()
+        self.ax.relim()
+        self.ax.autoscale_view()
+
+    def render(self, series, path=None, preview=True, dpi=None, fmt=None):
+        """
+        Draw `series` (a list of dicts, see render_figure) and either save the
+        figure to `path` or return it as an RGBA array.
+        Previews are decimated and use PREVIEW_DPI; otherwise every point is
+        drawn and rasters use PUBLICATION_DPI.
+        """
+        try:
+            self._draw(series, PREVIEW_MAX_POINTS if preview else None)
+            self.figure.tight_layout()
+            if dpi is None:
+                dpi = PREVIEW_DPI if preview else PUBLICATION_DPI
+            if path is not None:
+                self.figure.savefig(path, dpi=dpi, format=fmt)
+                return path
+            self.figure.set_dpi(dpi)
+            self.figure.canvas.draw()
+            return np.asarray(self.figure.canvas.buffer_rgba()).copy()
+        finally:
+            self._clear()
+
+
+_templates = {}
+
+
+def get_template(**template):
+    """Cached FigureTemplate for these settings (one cache per process)."""
+    key = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in template.items()))
+    if key not in _templates:
+        _templates[key] = FigureTemplate(**template)
+    return _templates[key]
+
+
+def render_figure(spec):
+    """
+    Render one figure described by a dict:
+
+        {'template': {'kind': 'spectrum', 'title': ..., 'band': (190, 1500)},
+         'series': [{'x': f, 'y': noise, 'label': '998 kOhm'},
+                    {'y': 1.28e-7, 'style': 'reference', 'color': 'C0'},
+                    {'x': R, 'y': V2, 'yerr': err, 'style': 'errorbar'}],
+         'path': 'spectrum.pdf', 'preview': False}
+
+    Returns the saved path, or the RGBA array when no path is given.
+    """
+    template = get_template(**spec.get('template', {}))
+    return template.render(spec['series'], path=spec.get('path'), preview=spec.get('preview', True),
+                           dpi=spec.get('dpi'), fmt=spec.get('format'))
+
+
+def _render_in_worker(spec):
+    matplotlib.use('Agg')
+    return render_figure(spec)
+
+
+def render_many(specs, max_workers=None):
+    """
+    Render many publication figures in worker processes. Every spec must have
+    a 'path'; the saved paths are returned in order.
+    """
+    specs = [dict(spec, preview=spec.get('preview', False)) for spec in specs]
+    if any('path' not in spec for spec in specs):
+        raise ValueError("Every figure rendered in a worker needs an output 'path'.")
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_render_in_worker, specs))
+
+
+def show_figure(spec):
+    """
+    Draw a figure spec from its template in a pyplot window, for the
+    interactive plot scripts (saving from the window uses 'savefig.dpi'). If
+    the spec has a 'path' the publication figure is written there as well.
+    Returns the pyplot figure.
+    """
+    import matplotlib.pyplot as plt
+    if spec.get('path'):
+        render_figure(dict(spec, preview=False))
+    template = dict(spec.get('template', {}))
+    figure = plt.figure(figsize=template.get('figsize', (10, 6)))
+    FigureTemplate(**template, figure=figure)._draw(spec['series'], PREVIEW_MAX_POINTS)
+    figure.tight_layout()
+    plt.show()
+    return figure
@@ -0,0 +1,235 @@
+"""
+Experimental parameters parsed from the noise-sweep file names, and an on-disk
+index of every CSV under Electrical_Noise.
+
+The file names written during the lab follow a loose grammar of underscore
+separated tokens, e.g.
+
+    Jan_30_338_14925KOhm_Metal.csv        date, run, resistance, terminator
+    Feb_01_344_0998MOhm_Cryo_Cold.csv     date, run, resistance, cryostat, temperature
+    Feb_08_410_0998MOhm_Cryo_77p5K.csv    date, run, resistance, cryostat, temperature (K)
+    Feb_02_01_998KOhm.csv                 date, run, resistance (Differential folder)
+    Jan_23_Sens_100nV.csv                 date, lock-in sensitivity
+    Jan_25_249_TC_30ms.csv                date, run, lock-in time constant
+    Jan_25_343_50_Rubber.csv              date, run, terminator impedance and material
+    250k_ohms.csv                         resistance only
+
+File names cannot contain '.', so decimals are implied: a leading zero puts the
+point after the first digit (0998MOhm = 0.998 MOhm) and a five digit kOhm value
+has one decimal place (14925KOhm = 1492.5 kOhm). A temperature in kelvin writes
+the point as 'p' (77p5K = 77.5 K). Where the multimeter reading of a resistor
+differs from the value written in its file name, MEASURED_RESISTANCES gives
+the measured value.
+"""
+
+import os
+import re
+import json
+
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+TERMINATOR_MATERIALS = ('Metal', 'Rubber', 'Bare')
+TEMPERATURE_TAGS = ('Cold', 'Room')
+
+INDEX_FILENAME = '.sweep_index.json'
+INDEX_VERSION = 3
+
+# Ohms, multimeter readings that replace the resistance in the file name
+MEASURED_RESISTANCES = {
+    'Feb_02_01_1498KOhm.csv': 1492.5e3,  # the 1.5 MOhm resistor of the Jan 30 sweep
+}
+
+# Folders whose name alone fixes the measurement mode
+FOLDER_MODES = {'Differential': 'differential'}
+
+_DATE = re.compile(r'^(?P<month>%s)_(?P<day>\d{1,2})(?=_|$)' % '|'.join(MONTHS))
+_RUN = re.compile(r'^_(?P<run>\d{2,3})(?=_)')
+_RESISTANCE = re.compile(r'(?:^|_)(?P<digits>\d+)(?P<prefix>[kKM]?)_?ohms?(?=_|$)', re.IGNORECASE)
+_SENSITIVITY = re.compile(r'(?:^|_)Sens_(?P<value>\d+)(?P<unit>[nu]V)(?=_|$)')
+_TIME_CONSTANT = re.compile(r'(?:^|_)TC_(?P<value>\d+)ms(?=_|$)')
+_TERMINATOR = re.compile(r'(?:^|_)(?:(?P<ohms>\d+)_)?(?P<material>%s)(?=_|$)' % '|'.join(TERMINATOR_MATERIALS))
+_MODE = re.compile(r'(?:^|_)(?P<mode>Diff|Differential)(?=_|$)')
+_TEMPERATURE = re.compile(r'(?:^|_)(?P<tag>%s)(?=_|$)' % '|'.join(TEMPERATURE_TAGS))
+_CRYO = re.compile(r'(?:^|_)Cryo(?=_|$)')
+_KELVIN = re.compile(r'(?:^|_)(?P<value>\d+(?:p\d+)?)K(?=_|$)')
+
+_PREFIXES = {'': 1.0, 'k': 1e3, 'K': 1e3, 'M': 1e6}
+_VOLT_UNITS = {'nV': 1e9, 'uV': 1e6}
+
+
+def _decode_resistance(digits, prefix):
+    # Undo the implied decimal points described in the module docstring
+    if len(digits) > 1 and digits.startswith('0'):
+        mantissa = float(digits[0] + '.' + digits[1:])
+    elif prefix in 'kK' and prefix and len(digits) == 5:
+        mantissa = float(digits[:-1] + '.' + digits[-1])
+    else:
+        mantissa = float(digits)
+    return mantissa * _PREFIXES[prefix]
+
+
+def parse_filename(file, folder=None):
+    """
+    Parse the experimental parameters out of one sweep file name.
+
+    Returns a dict with the keys date, run, resistance (Ohms), sensitivity (V),
+    time_constant (s), terminator, mode, temperature_tag, temperature (K) and
+    cryostat; the resistance is the measured one for the files in
+    MEASURED_RESISTANCES. Fields that the name does not specify are None. `folder` is the
+    name of the sweep folder and is used for parameters implied by the folder
+    (e.g. Differential).
+    """
+    stem = os.path.splitext(os.path.basename(file))[0]
+    metadata = {
+        'date': None,
+        'run': None,
+        'resistance': None,
+        'sensitivity': None,
+        'time_constant': None,
+        'terminator': None,
+        'mode': FOLDER_MODES.get(folder, 'single-ended'),
+        'temperature_tag': None,
+        'temperature': None,
+        'cryostat': bool(_CRYO.search(stem)),
+    }
+
+    rest = stem
+    match = _DATE.match(rest)
+    if match:
+        metadata['date'] = f"{match['month']}_{int(match['day']):02d}"
+        rest = rest[match.end():]
+        match = _RUN.match(rest)
+        if match:
+            metadata['run'] = match['run']
+
+    match = _RESISTANCE.search(stem)
+    if match:
+        metadata['resistance'] = _decode_resistance(match['digits'], match['prefix'])
+    metadata['resistance'] = MEASURED_RESISTANCES.get(os.path.basename(file), metadata['resistance'])
+
+    match = _SENSITIVITY.search(stem)
+    if match:
+        metadata['sensitivity'] = float(match['value']) / _VOLT_UNITS[match['unit']]
+
+    match = _TIME_CONSTANT.search(stem)
+    if match:
+        metadata['time_constant'] = float(match['value']) / 1e3
+
+    match = _TERMINATOR.search(stem)
+    if match:
+        metadata['terminator'] = match['material']
+        # A bare impedance next to the material is the terminator itself (Terminator_Sweep)
+        if match['ohms'] is not None and metadata['resistance'] is None and match['ohms'] != metadata['run']:
+            metadata['resistance'] = float(match['ohms'])
+
+    match = _MODE.search(stem)
+    if match:
+        metadata['mode'] = 'differential'
+
+    match = _TEMPERATURE.search(stem)
+    if match:
+        metadata['temperature_tag'] = match['tag']
+
+    match = _KELVIN.search(stem)
+    if match:
+        metadata['temperature'] = float(match['value'].replace('p', '.'))
+
+    return metadata
+
+
+def parse_sweep_file(directory, file):
+    """parse_filename for a file inside a sweep folder."""
+    return parse_filename(file, folder=os.path.basename(os.path.normpath(directory)))
+
+
+#%% On-disk index
+
+def _index_key(value):
+    # JSON object keys are strings, so numbers are stored in a canonical form
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return repr(float(value))
+    return json.dumps(value)
+
+
+def _scan(root):
+    # Relative path -> (size, mtime_ns) for every CSV under root
+    sources = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for file in sorted(filenames):
+            if file.endswith('.csv'):
+                path = os.path.join(dirpath, file)
+                stat = os.stat(path)
+                sources[os.path.relpath(path, root)] = [stat.st_size, stat.st_mtime_ns]
+    return sources
+
+
+def build_index(root, previous=None):
+    """
+    Parse every CSV under `root` into an index.
+
+    Entries from a `previous` index whose files are unchanged are reused. The
+    index holds the metadata of every file ('files') and, for each field, the
+    files grouped by value ('by') so that queries never touch the directories.
+    """
+    sources = _scan(root)
+    old_files = (previous or {}).get('files', {})
+    old_sources = (previous or {}).get('sources', {})
+    files = {}
+    for relpath, source in sources.items():
+        if relpath in old_files and old_sources.get(relpath) == source:
+            files[relpath] = old_files[relpath]
+        else:
+            folder, file = os.path.split(relpath)
+            files[relpath] = parse_filename(file, folder=os.path.basename(folder))
+
+    by = {}
+    for relpath, metadata in files.items():
+        for field, value in metadata.items():
+            if value is not None:
+                by.setdefault(field, {}).setdefault(_index_key(value), []).append(relpath)
+
+    return {'version': INDEX_VERSION, 'sources': sources, 'files': files, 'by': by}
+
+
+def save_index(root, index):
+    path = os.path.join(root, INDEX_FILENAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def load_index(root, refresh=False):
+    """
+    Load the index stored in `root`, building it if it does not exist yet.
+
+    With refresh=True the folders are rescanned and only new or modified files
+    are re-parsed.
+    """
+    path = os.path.join(root, INDEX_FILENAME)
+    index = None
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        pass
+    if index is not None and index.get('version') == INDEX_VERSION and not refresh:
+        return index
+    index = build_index(root, previous=index if index and index.get('version') == INDEX_VERSION else None)
+    save_index(root, index)
+    return index
+
+
+def query(index, **criteria):
+    """
+    Relative paths of every indexed file matching all `criteria`, e.g.
+    query(index, resistance=998e3, mode='differential').
+    """
+    matches = None
+    for field, value in criteria.items():
+        paths = set(index['by'].get(field, {}).get(_index_key(value), []))
+        matches = paths if matches is None else matches & paths
+    if matches is None:
+        return sorted(index['files'])
+    return sorted(matches)
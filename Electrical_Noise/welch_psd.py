@@ -0,0 +1,223 @@
+"""
+Noise spectra from raw sampled voltage records (Welch's method).
+
+The analyses read the spectra LabVIEW exports, about 40 log-spaced points of
+'X noise (V per root Hz)' per file. This computes the same quantity from a
+raw record of the lock-in (or ADC) output: the record is cut into windowed,
+overlapping segments, every segment is Fourier transformed and the one-sided
+power spectral densities are averaged, exactly as scipy.signal.welch does.
+
+The record is streamed from disk in blocks (a memory-mapped binary or .npy
+file, or a CSV read in chunks), and every block's complete segments go
+through one batched rfft, so memory is set by the block size and not by the
+length of the capture. The result is written in the LabVIEW layout, so a
+spectrum computed here can be dropped into a sweep folder and read by
+noise_store and the Jack Final Plots scripts like any export:
+
+    python welch_psd.py capture.bin --fs 102400 --dtype float32 --nperseg 65536 \\
+        --out Jan_30/Jan_30_338_250KOhm_Metal.csv
+"""
+
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from scipy import fft, signal
+
+NPERSEG = 4096
+OVERLAP = 0.5
+WINDOW = 'hann'
+BLOCK_SAMPLES = 1 << 21
+CSV_CHUNK_ROWS = 1 << 20
+# Header of the LabVIEW exports, which noise_store.read_noise_csv skips
+CSV_HEADER = 'Frequency (Hz) - Plot 0,X noise (V per root Hz) - Plot 0'
+
+
+def _csv_layout(path):
+    # Delimiter of a CSV record and whether its first line is a header
+    with open(path) as f:
+        first = f.readline()
+    sep = '\t' if '\t' in first else ','
+    try:
+        [float(v) for v in first.split(sep) if v.strip()]
+        return sep, 0
+    except ValueError:
+        return sep, 1
+
+
+def _csv_blocks(path, column, chunk_rows):
+    # Voltage column (the last one by default) of a CSV, chunk by chunk
+    sep, skip = _csv_layout(path)
+    for chunk in pd.read_csv(path, header=None, skiprows=skip, chunksize=chunk_rows, sep=sep):
+        values = chunk.iloc[:, column if column is not None else -1]
+        yield pd.to_numeric(values, errors='coerce').to_numpy(np.float64)
+
+
+def _csv_sample_rate(path):
+    # Sample rate from a (time, voltage) CSV: the median time step of the first rows
+    sep, skip = _csv_layout(path)
+    head = pd.read_csv(path, header=None, skiprows=skip, nrows=1000, sep=sep)
+    time = pd.to_numeric(head.iloc[:, 0], errors='coerce').dropna().to_numpy()
+    if head.shape[1] < 2 or len(time) < 2:
+        raise ValueError(f"{path} has no time column; give the sample rate.")
+    return 1.0 / np.median(np.diff(time))
+
+
+def open_record(path, dtype=None, offset=0):
+    """
+    Memory-mapped samples of a binary record: a .npy file, or raw samples of
+    `dtype` (e.g. 'float32', '<i2') starting `offset` bytes into the file.
+    """
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r').ravel()
+    if dtype is None:
+        raise ValueError("A raw binary record needs its sample dtype.")
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset)
+
+
+def iter_blocks(path, dtype=None, offset=0, scale=1.0, column=None, block_samples=BLOCK_SAMPLES):
+    """
+    float64 blocks of the voltage record in `path`, at most `block_samples`
+    long (CSV chunks are of CSV_CHUNK_ROWS rows). `scale` converts raw ADC
+    counts to volts.
+    """
+    if path.lower().endswith(('.csv', '.txt')):
+        blocks = _csv_blocks(path, column, CSV_CHUNK_ROWS)
+    else:
+        record = open_record(path, dtype, offset)
+        blocks = (record[start:start + block_samples] for start in range(0, len(record), block_samples))
+    for block in blocks:
+        block = np.asarray(block, dtype=np.float64)
+        yield block * scale if scale != 1.0 else block
+
+
+class WelchAccumulator:
+    """
+    Running Welch average of one-sided PSDs. Push samples in blocks of any
+    size; segments that straddle two blocks are completed from the kept tail.
+    """
+
+    def __init__(self, fs, nperseg=NPERSEG, overlap=OVERLAP, window=WINDOW, detrend='constant'):
+        self.fs = float(fs)
+        self.nperseg = int(nperseg)
+        self.step = self.nperseg - int(round(overlap * self.nperseg))
+        if self.step <= 0:
+            raise ValueError("The overlap must be less than one segment.")
+        self.window = signal.get_window(window, self.nperseg)
+        self.detrend = detrend
+        # Density scaling, doubled for the one-sided spectrum except at DC and Nyquist
+        self.scale = np.full(self.nperseg // 2 + 1, 2.0 / (self.fs * np.sum(self.window ** 2)))
+        self.scale[0] /= 2
+        if self.nperseg % 2 == 0:
+            self.scale[-1] /= 2
+        self.frequency = fft.rfftfreq(self.nperseg, 1 / self.fs)
+        self.reset()
+
+    def reset(self):
+        self.total = np.zeros(self.nperseg // 2 + 1)
+        self.n_segments = 0
+        self.n_samples = 0
+        self._tail = np.empty(0)
+
+    def push(self, samples):
+        """Add a block of samples; returns the number of segments completed."""
+        samples = np.asarray(samples, dtype=np.float64)
+        self.n_samples += len(samples)
+        data = np.concatenate([self._tail, samples]) if len(self._tail) else samples
+        if len(data) < self.nperseg:
+            self._tail = data.copy()
+            return 0
+        n = (len(data) - self.nperseg) // self.step + 1
+        segments = np.lib.stride_tricks.sliding_window_view(data, self.nperseg)[::self.step][:n]
+        if self.detrend == 'constant':
+            segments = segments - segments.mean(axis=1, keepdims=True)
+        elif self.detrend == 'linear':
+            segments = signal.detrend(segments, axis=1, type='linear')
+        spectra = fft.rfft(segments * self.window, axis=1, workers=-1)
+        self.total += np.sum(spectra.real ** 2 + spectra.imag ** 2, axis=0)
+        self.n_segments += n
+        # Keep what the next segment needs
+        self._tail = data[n * self.step:].copy()
+        return n
+
+    def psd(self):
+        """Frequency (Hz) and one-sided PSD (V^2/Hz) averaged over the segments so far."""
+        if self.n_segments == 0:
+            raise ValueError(f"Fewer than {self.nperseg} samples; no complete segment.")
+        return self.frequency, self.total * self.scale / self.n_segments
+
+    def noise(self):
+        """Frequency (Hz) and noise density (V/sqrt(Hz)), the quantity LabVIEW exports."""
+        frequency, psd = self.psd()
+        return frequency, np.sqrt(psd)
+
+
+def log_bins(frequency, noise, n_bins=None, f_min=None, f_max=None):
+    """
+    Average a fine spectrum into log-spaced frequency bins, in power (the
+    noise is averaged as V^2/Hz and the root taken afterwards). Empty bins
+    are dropped. Returns the geometric bin centres and the binned noise.
+    """
+    f_min = f_min or frequency[frequency > 0][0]
+    f_max = f_max or frequency[-1]
+    n_bins = n_bins or 40
+    edges = np.geomspace(f_min, f_max, n_bins + 1)
+    index = np.searchsorted(edges, frequency, side='right') - 1
+    index[frequency == edges[-1]] = n_bins - 1
+    inside = (index >= 0) & (index < n_bins) & (frequency > 0)
+    counts = np.bincount(index[inside], minlength=n_bins)
+    power = np.bincount(index[inside], weights=noise[inside] ** 2, minlength=n_bins)
+    used = counts > 0
+    centres = np.sqrt(edges[:-1] * edges[1:])
+    return centres[used], np.sqrt(power[used] / counts[used])
+
+
+def welch_noise(path, fs=None, nperseg=NPERSEG, overlap=OVERLAP, window=WINDOW, detrend='constant', dtype=None,
+                offset=0, scale=1.0, column=None, block_samples=BLOCK_SAMPLES):
+    """
+    Frequency (Hz) and noise density (V/sqrt(Hz)) of the record in `path`.
+    fs is the sample rate in Hz; for a (time, voltage) CSV it can be left out
+    and is taken from the time column.
+    """
+    if fs is None:
+        if not path.lower().endswith(('.csv', '.txt')):
+            raise ValueError("A binary record needs its sample rate.")
+        fs = _csv_sample_rate(path)
+    accumulator = WelchAccumulator(fs, nperseg, overlap, window, detrend)
+    for block in iter_blocks(path, dtype, offset, scale, column, block_samples):
+        # Unparseable CSV rows come through as NaN and are left out
+        finite = np.isfinite(block)
+        accumulator.push(block if finite.all() else block[finite])
+    return accumulator.noise()
+
+
+def write_noise_csv(path, frequency, noise):
+    """Write a spectrum in the LabVIEW export layout (header line, then frequency,noise rows)."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        f.write(CSV_HEADER + '\n')
+        np.savetxt(f, np.column_stack([frequency, noise]), delimiter=',', fmt=['%.10g', '%.6E'])
+    os.replace(tmp_path, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Welch noise spectrum of a raw voltage record.")
+    parser.add_argument('record', help="raw binary, .npy or CSV (voltage, or time,voltage) record")
+    parser.add_argument('--fs', type=float, help="sample rate in Hz (taken from the time column of a CSV if left out)")
+    parser.add_argument('--dtype', help="sample type of a raw binary record, e.g. float32 or '<i2'")
+    parser.add_argument('--offset', type=int, default=0, help="bytes to skip at the start of a binary record")
+    parser.add_argument('--scale', type=float, default=1.0, help="volts per raw sample unit")
+    parser.add_argument('--nperseg', type=int, default=NPERSEG, help="samples per segment")
+    parser.add_argument('--overlap', type=float, default=OVERLAP, help="segment overlap as a fraction")
+    parser.add_argument('--window', default=WINDOW, help="window name understood by scipy.signal.get_window")
+    parser.add_argument('--log-bins', type=int, help="average into this many log-spaced bins, like the LabVIEW export")
+    parser.add_argument('--out', help="CSV to write (default: the record name with _psd.csv)")
+    args = parser.parse_args()
+
+    frequency, noise = welch_noise(args.record, args.fs, args.nperseg, args.overlap, args.window, dtype=args.dtype,
+                                   offset=args.offset, scale=args.scale)
+    if args.log_bins:
+        frequency, noise = log_bins(frequency, noise, args.log_bins)
+    out = args.out or os.path.splitext(args.record)[0] + '_psd.csv'
+    write_noise_csv(out, frequency, noise)
+    print(f"{len(frequency)} frequencies from {frequency[0]:g} to {frequency[-1]:g} Hz written to {out}")
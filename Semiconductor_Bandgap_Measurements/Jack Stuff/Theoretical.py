@@ -5,11 +5,17 @@ Created on Sun Mar 10 19:39:09 2024
 @author: jackm
 """
 
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.constants import Boltzmann
-plt.style.use('seaborn-whitegrid')  # A clean and professional style
-plt.rcParams.update({'font.size': 12, 'figure.dpi': 500}) 
+
+# Shared plot style at the top of the repository
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir)))
+from plot_style import apply_style
+
+apply_style(publication_dpi=500)
 
 # Constants
 Eg = 1.1  # Band gap energy of silicon in eV
@@ -1,44 +1,51 @@
-import pandas as pd
+import os
+import sys
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from trial_aggregator import load_trials, aggregate
+from plot_style import apply_style
+
 # Define a style for the plot
-plt.style.use('seaborn-whitegrid')
-plt.rcParams.update({'font.size': 12, 'figure.dpi': 500})
+apply_style(publication_dpi=500)
 std_dev = 3098.1443788354463
-# Function to process and plot data from a CSV file
-def process_and_plot(csv_path, label):
-    try:
-        # Initial read of the CSV file
-        data_csv = pd.read_csv(csv_path, skiprows=1)        
-        mean_resistance = data_csv['Resistance'].mean()
-        # Plot the data
-        plt.scatter(data_csv['Temperature'], data_csv['Resistance'], label=label, alpha=0.75)
-        
-        
-    except Exception as e:
-        print(f"Error processing file {csv_path}: {e}")
-
-
-# List of CSV file paths, their labels, and whether they require splitting and cleaning
+
+# Trials to compare, relative to this folder, and their labels
+data_directory = os.path.dirname(os.path.abspath(__file__))
 csv_files = [
-    ("C:/Users/jackm/OneDrive - Queen's University/Queen's Engineering/Fourth Year/ENPH 453/Advanced-Engineering-Physics-Lab/Semiconductor_Bandgap_Measurements/Feb13_Testing/Temp_Sweep.csv", "Feb 13"),
-    ("C:/Users/jackm/OneDrive - Queen's University/Queen's Engineering/Fourth Year/ENPH 453/Advanced-Engineering-Physics-Lab/Semiconductor_Bandgap_Measurements/Feb15_Testing/Temp_Sweep.csv", "Feb 15 - 1"),
-    ("C:/Users/jackm/OneDrive - Queen's University/Queen's Engineering/Fourth Year/ENPH 453/Advanced-Engineering-Physics-Lab/Semiconductor_Bandgap_Measurements/Feb15_Testing/Temp_Sweep_2.csv", "Feb 15 - 2"),
-    ("C:/Users/jackm/OneDrive - Queen's University/Queen's Engineering/Fourth Year/ENPH 453/Advanced-Engineering-Physics-Lab/Semiconductor_Bandgap_Measurements/Feb27_Testing/Temp_Sweep.csv", "Feb 27 - 1"),
-    ("C:/Users/jackm/OneDrive - Queen's University/Queen's Engineering/Fourth Year/ENPH 453/Advanced-Engineering-Physics-Lab/Semiconductor_Bandgap_Measurements/Feb27_Testing/Temp_Sweep_2.csv", "Feb 27 - 2"),    
-    ("C:/Users/jackm/OneDrive - Queen's University/Queen's Engineering/Fourth Year/ENPH 453/Advanced-Engineering-Physics-Lab/Semiconductor_Bandgap_Measurements/Feb29_Testing/Temp_Sweep_2.csv", "Feb 29 - 1"),
-    ("C:/Users/jackm/OneDrive - Queen's University/Queen's Engineering/Fourth Year/ENPH 453/Advanced-Engineering-Physics-Lab/Semiconductor_Bandgap_Measurements/Feb29_Testing/Temp_Sweep_2.csv", "Feb 29 - 2")
+    ("Feb13_Testing/Temp_Sweep.csv", "Feb 13"),
+    ("Feb15_Testing/Temp_Sweep.csv", "Feb 15 - 1"),
+    ("Feb15_Testing/Temp_Sweep_2.csv", "Feb 15 - 2"),
+    ("Feb27_Testing/Temp_Sweep.csv", "Feb 27 - 1"),
+    ("Feb27_Testing/Temp_Sweep_2.csv", "Feb 27 - 2"),
+    ("Feb29_Testing/Temp_Sweep_2.csv", "Feb 29 - 1"),
+    ("Feb29_Testing/Temp_Sweep_2.csv", "Feb 29 - 2")
 ]
 
+# Files are read concurrently; a file listed twice is only plotted once
+sweeps = load_trials([(os.path.join(data_directory, path), label) for path, label in csv_files])
+for label, original in sweeps.duplicates.items():
+    print(f"Skipping {label}: same data as {original}")
+for path, reason in sweeps.skipped.items():
+    print(f"Error processing file {path}: {reason}")
+
+# Mean and standard deviation across trials on a common 1 K grid
+trials = aggregate(sweeps)
+
 # Marker styles for differentiation
 markers = ['o', 'v', '^', '<', '>', 's', 'p', '*', '+', 'x']
 
 # Plot settings
 plt.figure(figsize=(10, 6))
 
-# Process each file
-for path, label in csv_files:
-    process_and_plot(path, label)
+for i, label in enumerate(sweeps.labels):
+    temperature, resistance = sweeps.sweep(i)
+    plt.scatter(temperature, resistance, label=label, alpha=0.75)
+
+plt.plot(trials['temperature'], trials['mean'], color='black', label='Mean of trials')
+plt.fill_between(trials['temperature'], trials['mean'] - trials['std'], trials['mean'] + trials['std'],
+                 color='gray', alpha=0.3, label='±1σ across trials')
 
 # Finalize plot
 plt.title('Resistance vs. Temperature Multiple Trials')
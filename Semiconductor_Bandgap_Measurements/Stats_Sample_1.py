@@ -5,12 +5,17 @@ Created on Thu Feb 29 16:40:44 2024
 @author: jackm
 """
 
+import os
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 
-plt.style.use('seaborn-whitegrid')  # A clean and professional style
-plt.rcParams.update({'font.size': 12, 'figure.dpi': 300}) 
+# Shared plot style at the top of the repository
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from plot_style import apply_style
+
+apply_style(publication_dpi=300)
 
 # Path to the CSV file
 file_path = 'Semiconductor_Bandgap_Measurements\Mar05_Testing\Temp_Sweep_1_Sample_2.csv'
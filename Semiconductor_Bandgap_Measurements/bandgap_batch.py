@@ -0,0 +1,246 @@
+"""
+Band gap estimation for many temperature sweeps in one call.
+
+This is the linearization.py pipeline (subtract the minimum resistance,
+Savitzky-Golay smoothing, 500-630 K window, ln(R T^3/2) vs 1/T regression,
+Eg = 2 k slope / e) applied to every sweep at once. The sweeps are kept as one
+ragged set: all temperatures and resistances concatenated into contiguous
+arrays, with an `offsets` array marking where each sweep starts. Every step
+works on the whole set with array operations instead of per-file DataFrames.
+
+    python bandgap_batch.py            # every Temp_Sweep*.csv in the *Testing folders
+    python bandgap_batch.py --auto     # with the fit window found per sweep
+"""
+
+import os
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from scipy.constants import Boltzmann, eV
+from scipy.signal import savgol_coeffs
+
+from bandgap_reader import read_sweep
+from intrinsic_window import find_windows
+from streaming_savgol import interp_projection
+from outlier_rejection import hampel_segments
+
+BANDGAP_WINDOW = (500, 630)  # K, intrinsic region used in linearization.py
+WINDOW_SIZE = 99
+POLY_ORDER = 3
+SWEEP_PATTERN = os.path.join('*Testing', 'Temp_Sweep*.csv')
+
+
+def read_sweep_csv(csv_path):
+    """Temperature, resistance and run metadata of one bandgap CSV (see bandgap_reader.py)."""
+    return read_sweep(csv_path)
+
+
+class SweepSet:
+    """Ragged collection of temperature sweeps stored contiguously with offsets."""
+
+    def __init__(self, names, temperature, resistance, offsets, metadata=None):
+        self.names = list(names)
+        self.metadata = list(metadata) if metadata is not None else [{} for _ in self.names]
+        self.temperature = np.asarray(temperature, dtype=np.float64)
+        self.resistance = np.asarray(resistance, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.intp)
+
+    @classmethod
+    def from_arrays(cls, names, temperatures, resistances, metadata=None):
+        lengths = [len(t) for t in temperatures]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.intp)
+        empty = np.empty(0)
+        return cls(names, np.concatenate(temperatures) if lengths else empty,
+                   np.concatenate(resistances) if lengths else empty, offsets, metadata)
+
+    @classmethod
+    def from_files(cls, paths, reader=read_sweep_csv, max_workers=None):
+        """
+        Load every readable sweep in `paths`, reading the files concurrently in
+        a thread pool. `reader` returns (temperature, resistance) or
+        (temperature, resistance, metadata). Files that cannot be read are
+        listed in the `skipped` attribute with the reason.
+        """
+        def read(path):
+            try:
+                return reader(path)
+            except (OSError, ValueError) as e:
+                return e
+
+        paths = list(paths)
+        if max_workers == 1 or len(paths) <= 1:
+            loaded = [read(path) for path in paths]
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                loaded = list(pool.map(read, paths))
+
+        names, temperatures, resistances, metadata, skipped = [], [], [], [], {}
+        for path, result in zip(paths, loaded):
+            if isinstance(result, Exception):
+                skipped[path] = str(result)
+                continue
+            names.append(path)
+            temperatures.append(result[0])
+            resistances.append(result[1])
+            metadata.append(result[2] if len(result) > 2 else {})
+        sweeps = cls.from_arrays(names, temperatures, resistances, metadata)
+        sweeps.skipped = skipped
+        return sweeps
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def segment(self):
+        """Sweep number of every sample."""
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def sweep(self, i):
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return self.temperature[start:stop], self.resistance[start:stop]
+
+
+def segment_min(values, offsets):
+    """Minimum of each non-empty segment (NaN for empty ones)."""
+    lengths = np.diff(offsets)
+    out = np.full(len(lengths), np.nan)
+    nonempty = lengths > 0
+    if nonempty.any():
+        out[nonempty] = np.minimum.reduceat(values, offsets[:-1][nonempty])
+    return out
+
+
+def savgol_segments(values, offsets, window_size=WINDOW_SIZE, poly_order=POLY_ORDER):
+    """
+    scipy.signal.savgol_filter(mode='interp') applied to every segment of a
+    ragged array at once. Segments shorter than the window are returned as NaN.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full_like(values, np.nan)
+    starts, stops = offsets[:-1], offsets[1:]
+    usable = (stops - starts) >= window_size
+    if not usable.any():
+        return out
+    half = window_size // 2
+
+    # Interior points: one convolution over the concatenated array, keeping only
+    # the points whose window lies inside a single segment
+    smoothed = np.convolve(values, savgol_coeffs(window_size, poly_order), mode='same')
+    segment = np.repeat(np.arange(len(starts)), stops - starts)
+    position = np.arange(len(values)) - starts[segment]
+    length = (stops - starts)[segment]
+    interior = usable[segment] & (position >= half) & (position < length - half)
+    out[interior] = smoothed[interior]
+
+    # Edges: savgol 'interp' fits one polynomial to the first and last window of
+    # each segment. The fit is a fixed projection matrix applied to all of them.
+    projection = interp_projection(window_size, poly_order)
+    window = np.arange(window_size)
+    first = starts[usable][:, None] + window
+    last = stops[usable][:, None] - window_size + window
+    out[first[:, :half]] = (values[first] @ projection.T)[:, :half]
+    out[last[:, -half:]] = (values[last] @ projection.T)[:, -half:]
+    return out
+
+
+def segment_linregress(x, y, segment, n_segments, mask=None):
+    """
+    linregress of y on x separately for every segment, using only the points in
+    `mask`. Returns a dict of arrays (n, slope, intercept, r_value, stderr).
+    """
+    valid = np.isfinite(x) & np.isfinite(y)
+    if mask is not None:
+        valid &= mask
+    seg = segment[valid]
+    x = x[valid]
+    y = y[valid]
+
+    def total(weights):
+        return np.bincount(seg, weights=weights, minlength=n_segments)
+
+    n = total(None)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Centre each segment before forming the sums (1/T is small and nearly constant)
+        x_mean = total(x) / n
+        y_mean = total(y) / n
+        dx = x - x_mean[seg]
+        dy = y - y_mean[seg]
+        Sxx = total(dx * dx)
+        Syy = total(dy * dy)
+        Sxy = total(dx * dy)
+        slope = Sxy / Sxx
+        intercept = y_mean - slope * x_mean
+        r_value = Sxy / np.sqrt(Sxx * Syy)
+        stderr = np.sqrt((1 - r_value ** 2) * Syy / Sxx / (n - 2))
+    return {'n': n.astype(np.int64), 'slope': slope, 'intercept': intercept, 'r_value': r_value, 'stderr': stderr}
+
+
+def estimate_bandgaps(sweeps, window=BANDGAP_WINDOW, window_size=WINDOW_SIZE, poly_order=POLY_ORDER,
+                      reject_outliers=True):
+    """
+    Band gap of every sweep in a SweepSet. `window` is either one (T_min, T_max)
+    pair for all sweeps, an array of pairs, one per sweep, or 'auto' to pick
+    each sweep's intrinsic region with intrinsic_window.find_windows().
+    Spikes are replaced by the rolling median first (outlier_rejection.py)
+    unless reject_outliers is False.
+    Returns a DataFrame with one row per sweep.
+    """
+    segment = sweeps.segment
+    resistance = sweeps.resistance
+    rejected = np.zeros(len(resistance), dtype=bool)
+    if reject_outliers:
+        resistance, rejected = hampel_segments(resistance, sweeps.offsets)
+    adjusted = resistance - segment_min(resistance, sweeps.offsets)[segment]
+    smoothed = savgol_segments(adjusted, sweeps.offsets, window_size, poly_order)
+
+    if isinstance(window, str) and window == 'auto':
+        window = find_windows(sweeps.temperature, smoothed, sweeps.offsets)
+    bounds = np.broadcast_to(np.asarray(window, dtype=np.float64), (len(sweeps), 2))
+    T = sweeps.temperature
+    in_window = (T >= bounds[segment, 0]) & (T <= bounds[segment, 1]) & (smoothed > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x = 1 / T
+        y = np.log(smoothed * T ** 1.5)
+    fit = segment_linregress(x, y, segment, len(sweeps), in_window)
+
+    return pd.DataFrame({
+        'file': sweeps.names,
+        'started': [m.get('started') for m in sweeps.metadata],
+        'T_min': bounds[:, 0],
+        'T_max': bounds[:, 1],
+        'n_points': fit['n'],
+        'n_masked': np.bincount(segment[rejected], minlength=len(sweeps)),
+        'slope': fit['slope'],
+        'intercept': fit['intercept'],
+        'r_value': fit['r_value'],
+        'Eg': 2 * fit['slope'] * Boltzmann / eV,
+        'Eg_err': 2 * fit['stderr'] * Boltzmann / eV,
+    })
+
+
+def discover_sweeps(root=None, pattern=SWEEP_PATTERN):
+    """Sorted paths of every sweep CSV under `root` (this folder by default)."""
+    root = root or os.path.dirname(os.path.abspath(__file__))
+    return sorted(glob.glob(os.path.join(root, pattern)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Band gap of every temperature sweep.")
+    parser.add_argument('--auto', action='store_true', help="find each sweep's intrinsic window instead of 500-630 K")
+    parser.add_argument('--keep-outliers', action='store_true', help="skip the Hampel outlier rejection")
+    args = parser.parse_args()
+
+    sweeps = SweepSet.from_files(discover_sweeps())
+    for path, reason in sweeps.skipped.items():
+        print(f"Skipped {path}: {reason}")
+    results = estimate_bandgaps(sweeps, window='auto' if args.auto else BANDGAP_WINDOW,
+                                reject_outliers=not args.keep_outliers)
+    results['file'] = [os.path.relpath(f, os.path.dirname(os.path.abspath(__file__))) for f in results['file']]
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(results[['file', 'started', 'T_min', 'T_max', 'n_points', 'n_masked', 'Eg', 'Eg_err', 'r_value']])
@@ -0,0 +1,221 @@
+"""
+Fast reader for the LabVIEW bandgap CSVs.
+
+Every sweep file starts with a date line and a column header
+
+    Semiconductor Band Gap Date: 2024-03-05,3:07 PM
+    Temperature,Resistance
+    580.969,-72758.600
+    ...
+
+(the header is sometimes tab separated, the date line sometimes has a
+trailing comma, and line endings are a mix of LF and CRLF). The scripts read
+them with pd.read_csv(skiprows=1), which throws the date away and parses the
+whole file even when only the 500-630 K window is used.
+
+read_sweep() memory-maps the file, turns the date line into run metadata and
+decodes the two number columns into a preallocated (rows, 2) float64 buffer.
+It can read only a byte range of the data, or only the rows of a temperature
+window, which is found by bisection on the byte offsets since the sweeps are
+temperature ramps.
+"""
+
+import os
+import re
+import mmap
+import warnings
+import numpy as np
+from datetime import datetime
+
+_DATE_LINE = re.compile(rb'^(?P<title>[^:]*?)\s*Date:\s*(?P<date>\d{4}-\d{2}-\d{2})\s*,\s*(?P<time>\d{1,2}:\d{2}\s*[AP]M)',
+                        re.IGNORECASE)
+# Rows a temperature window is widened by on each side before the exact cut,
+# to absorb the small temperature reversals in a ramp
+WINDOW_MARGIN = 64
+# Lines sampled to check that a file is a rising ramp before bisecting, and
+# the temperature drop between samples that is still taken as noise
+RAMP_SAMPLES = 16
+RAMP_TOLERANCE = 5.0  # K
+_TO_COMMAS = bytes.maketrans(b'\r\n\t', b' , ')
+
+
+def parse_date_line(line):
+    """Title and start time of a run from its first line ({} if it is not a date line)."""
+    if isinstance(line, str):
+        line = line.encode()
+    match = _DATE_LINE.match(line.strip())
+    if match is None:
+        return {}
+    time = re.sub(rb'\s+', b' ', match.group('time')).decode().upper()
+    started = datetime.strptime(f"{match.group('date').decode()} {time}", '%Y-%m-%d %I:%M %p')
+    return {'title': match.group('title').decode().strip(), 'started': started}
+
+
+def _open(path):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{path} is empty.")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:2] == b'PK':
+        mm.close()
+        # A few files in Mar05_Testing are Excel workbooks saved with a .csv name
+        raise ValueError(f"{path} is an Excel workbook, not a CSV export.")
+    return mm
+
+
+def _header(mm, path):
+    # Metadata from the date line and the column header, and where the data starts
+    first_end = mm.find(b'\n')
+    if first_end < 0:
+        raise ValueError(f"{path} has no data rows.")
+    metadata = {'path': path, 'size': len(mm), **parse_date_line(mm[:first_end])}
+    start = first_end + 1
+    if not metadata.get('started'):
+        # No date line: the column header is the first line
+        start = 0
+    header_end = mm.find(b'\n', start)
+    header_end = len(mm) if header_end < 0 else header_end
+    header = mm[start:header_end].strip().decode('utf-8', 'replace')
+    delimiter = '\t' if '\t' in header else ','
+    metadata['columns'] = [c.strip() for c in header.split(delimiter)]
+    metadata['data_offset'] = min(header_end + 1, len(mm))
+    return metadata
+
+
+def read_header(path):
+    """Run metadata of a sweep file: title, start time, columns and data offset."""
+    mm = _open(path)
+    try:
+        return _header(mm, path)
+    finally:
+        mm.close()
+
+
+def _line_start(mm, offset, lower):
+    # First line start at or after `offset` (never before `lower`)
+    if offset <= lower:
+        return lower
+    if offset >= len(mm):
+        return len(mm)
+    newline = mm.rfind(b'\n', lower, offset)
+    if newline == offset - 1:
+        return offset
+    newline = mm.find(b'\n', offset)
+    return len(mm) if newline < 0 else newline + 1
+
+
+def _first_temperature(mm, offset):
+    # Temperature on the line starting at `offset` (None if unreadable)
+    end = mm.find(b'\n', offset)
+    field = mm[offset:len(mm) if end < 0 else end].split(b',')[0]
+    try:
+        return float(field)
+    except ValueError:
+        return None
+
+
+def _bisect(mm, lower, upper, T):
+    # Offset of the first line whose temperature is >= T in a (mostly) rising ramp
+    lo, hi = lower, upper
+    while lo < hi:
+        mid = _line_start(mm, (lo + hi) // 2, lower)
+        if mid >= hi:
+            break
+        value = _first_temperature(mm, mid)
+        if value is not None and value < T:
+            lo = _line_start(mm, mid + 1, lower)
+        else:
+            hi = mid
+    return lo
+
+
+def _is_ramp(mm, lower, upper):
+    # Whether evenly spaced lines of the data have (nearly) rising temperatures
+    offsets = np.linspace(lower, upper, RAMP_SAMPLES, endpoint=False).astype(int)
+    temperatures = [_first_temperature(mm, _line_start(mm, int(o), lower)) for o in offsets]
+    temperatures = np.array([t for t in temperatures if t is not None])
+    return len(temperatures) < 2 or bool(np.all(np.diff(temperatures) >= -RAMP_TOLERANCE))
+
+
+def _step_lines(mm, offset, lines, lower, upper):
+    # Move `offset` by a number of whole lines, staying inside [lower, upper]
+    for _ in range(abs(lines)):
+        if lines < 0:
+            if offset <= lower:
+                break
+            newline = mm.rfind(b'\n', lower, offset - 1)
+            offset = lower if newline < 0 else newline + 1
+        else:
+            if offset >= upper:
+                break
+            newline = mm.find(b'\n', offset, upper)
+            offset = upper if newline < 0 else newline + 1
+    return offset
+
+
+def _decode(block, out=None):
+    """Two comma separated float columns of `block` into an (rows, 2) buffer."""
+    rows = block.count(b'\n') + 1
+    if out is None:
+        out = np.empty((rows, 2))
+    elif out.shape[0] < rows or out.shape[1:] != (2,):
+        raise ValueError(f"Output buffer needs shape ({rows}, 2) or more rows.")
+    text = block.translate(_TO_COMMAS).strip(b' ,')
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            values = np.fromstring(text, sep=',')
+        except (ValueError, DeprecationWarning):
+            values = None
+    if values is None or len(values) % 2 or len(values) // 2 > rows:
+        # A malformed row somewhere: fall back to parsing line by line
+        n = 0
+        for line in block.splitlines():
+            fields = line.split(b',')
+            if len(fields) < 2:
+                continue
+            try:
+                out[n] = float(fields[0]), float(fields[1])
+            except ValueError:
+                continue
+            n += 1
+        return out[:n]
+    n = len(values) // 2
+    out[:n] = values.reshape(n, 2)
+    return out[:n]
+
+
+def read_sweep(path, byte_range=None, temperature_window=None, out=None):
+    """
+    (temperature, resistance, metadata) of one sweep file.
+
+    byte_range: (start, stop) byte offsets into the file; only the complete
+        rows starting inside the range are read.
+    temperature_window: (T_min, T_max); only rows in the window are returned.
+        In a rising temperature ramp the rows are located by bisection and
+        only they are decoded; other files (cool downs, heat then cool) are
+        decoded in full and masked.
+    out: optional preallocated (rows, 2) float64 buffer to decode into.
+    """
+    mm = _open(path)
+    try:
+        metadata = _header(mm, path)
+        lower, upper = metadata['data_offset'], len(mm)
+        start, stop = lower, upper
+        if byte_range is not None:
+            start = _line_start(mm, max(byte_range[0], lower), lower)
+            stop = _line_start(mm, min(byte_range[1], upper), lower)
+        if temperature_window is not None and _is_ramp(mm, start, stop):
+            T_min, T_max = temperature_window
+            start = _step_lines(mm, _bisect(mm, start, stop, T_min), -WINDOW_MARGIN, lower, upper)
+            stop = _step_lines(mm, _bisect(mm, start, stop, np.nextafter(T_max, np.inf)), WINDOW_MARGIN, lower, upper)
+        metadata['byte_range'] = (start, stop)
+        data = _decode(mm[start:stop], out)
+    finally:
+        mm.close()
+    temperature, resistance = data[:, 0], data[:, 1]
+    if temperature_window is not None:
+        inside = (temperature >= temperature_window[0]) & (temperature <= temperature_window[1])
+        temperature, resistance = temperature[inside], resistance[inside]
+    metadata['rows'] = len(temperature)
+    return temperature, resistance, metadata
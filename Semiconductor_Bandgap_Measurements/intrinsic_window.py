@@ -0,0 +1,117 @@
+"""
+Automatic selection of the intrinsic region used for the band gap fit.
+
+linearization.py used to pick the fit window by eye (a hard-coded index into
+the dR/dT minima and the 500-630 K bounds). Here every candidate window of a
+sweep is scored instead. Points above the resistance maximum of the upper
+half of the sweep (the onset of intrinsic conduction; the global maximum is
+often the freeze-out rise at the cold end) are sorted by temperature, and prefix sums of
+x = 1/T, y = ln(R T^3/2) and their products are built once. The regression
+statistics of any contiguous window then take O(1) to evaluate, so scanning
+all candidates costs O(n) for the sums plus one array operation over the
+candidate grid, with no refits.
+
+The chosen window is the one with the best score
+    R^2 + length_weight * (window span / searched span)
+among windows with a positive slope, at least `min_points` points, a span of
+at least `min_span` K and an rms residual below `max_residual` (in units of
+ln(R T^3/2)). The length term stops the search from settling on the shortest
+window that happens to be straight: with a weight of 0.05 the Feb sweeps
+settled on 50 K windows, some of them at 288-340 K.
+"""
+
+import numpy as np
+
+MIN_POINTS = 30
+MIN_SPAN = 50  # K
+MAX_RESIDUAL = 0.05
+LENGTH_WEIGHT = 0.2
+MAX_CANDIDATES = 200  # window edges per sweep; beyond this the edges are strided
+
+
+def _prefix(values):
+    return np.concatenate([[0.0], np.cumsum(values)])
+
+
+def scan_windows(temperature, resistance, min_points=MIN_POINTS, min_span=MIN_SPAN,
+                 max_residual=MAX_RESIDUAL, length_weight=LENGTH_WEIGHT, max_candidates=MAX_CANDIDATES):
+    """
+    Score every candidate window of one sweep (resistance already smoothed and
+    shifted as in linearization.py). Returns a dict of arrays with one entry
+    per candidate: T_min, T_max, n, slope, intercept, r_squared, residual
+    (rms) and score (-inf for rejected windows).
+    """
+    T = np.asarray(temperature, dtype=np.float64)
+    R = np.asarray(resistance, dtype=np.float64)
+    usable = np.isfinite(T) & np.isfinite(R) & (R > 0) & (T > 0)
+    T, R = T[usable], R[usable]
+    order = np.argsort(T, kind='stable')
+    T, R = T[order], R[order]
+    if len(T):
+        # Intrinsic conduction starts where the resistance stops rising with T,
+        # past the freeze-out region at the cold end
+        upper = np.searchsorted(T, (T[0] + T[-1]) / 2)
+        start = upper + np.argmax(R[upper:])
+        T, R = T[start:], R[start:]
+    n = len(T)
+    if n < max(min_points, 3):
+        empty = np.empty(0)
+        return {key: empty for key in ('T_min', 'T_max', 'n', 'slope', 'intercept', 'r_squared', 'residual', 'score')}
+
+    x = 1 / T
+    y = np.log(R * T ** 1.5)
+    # Centre once for the whole sweep so the sums stay well conditioned
+    x_mean, y_mean = x.mean(), y.mean()
+    x, y = x - x_mean, y - y_mean
+    P_x, P_y, P_xx, P_xy, P_yy = (_prefix(v) for v in (x, y, x * x, x * y, y * y))
+
+    stride = max(1, n // max_candidates)
+    edges = np.arange(0, n + 1, stride)
+    if edges[-1] != n:
+        edges = np.append(edges, n)
+    i, j = np.meshgrid(edges, edges, indexing='ij')
+    keep = (j - i) >= max(min_points, 3)
+    i, j = i[keep], j[keep]
+
+    count = (j - i).astype(np.float64)
+    Sx = P_x[j] - P_x[i]
+    Sy = P_y[j] - P_y[i]
+    Sxx = P_xx[j] - P_xx[i] - Sx ** 2 / count
+    Sxy = P_xy[j] - P_xy[i] - Sx * Sy / count
+    Syy = P_yy[j] - P_yy[i] - Sy ** 2 / count
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = Sxy / Sxx
+        r_squared = Sxy ** 2 / (Sxx * Syy)
+        residual = np.sqrt(np.maximum(Syy - slope * Sxy, 0) / (count - 2))
+    intercept = (Sy / count + y_mean) - slope * (Sx / count + x_mean)
+
+    T_min, T_max = T[i], T[j - 1]
+    span = T_max - T_min
+    valid = (slope > 0) & (span >= min_span) & np.isfinite(r_squared) & (residual <= max_residual)
+    searched = max(T[-1] - T[0], 1e-12)
+    score = np.where(valid, r_squared + length_weight * span / searched, -np.inf)
+    return {'T_min': T_min, 'T_max': T_max, 'n': j - i, 'slope': slope, 'intercept': intercept,
+            'r_squared': r_squared, 'residual': residual, 'score': score}
+
+
+def find_window(temperature, resistance, **options):
+    """
+    Best (T_min, T_max) intrinsic window of one sweep, or (nan, nan) when no
+    candidate passes the checks.
+    """
+    candidates = scan_windows(temperature, resistance, **options)
+    if not len(candidates['score']) or not np.isfinite(candidates['score']).any():
+        return np.nan, np.nan
+    best = np.argmax(candidates['score'])
+    return float(candidates['T_min'][best]), float(candidates['T_max'][best])
+
+
+def find_windows(temperature, resistance, offsets, **options):
+    """
+    Intrinsic window of every sweep in ragged arrays (see bandgap_batch.SweepSet).
+    Returns an (n_sweeps, 2) array of bounds, NaN where no window was found.
+    """
+    bounds = np.full((len(offsets) - 1, 2), np.nan)
+    for k, (start, stop) in enumerate(zip(offsets[:-1], offsets[1:])):
+        bounds[k] = find_window(temperature[start:stop], resistance[start:stop], **options)
+    return bounds
@@ -5,19 +5,34 @@ Created on Thu Mar  7 14:54:01 2024
 @author: jackm
 """
 
+import os
+import sys
 import numpy as np
 import pandas as pd
 from scipy.constants import Boltzmann, eV
 import matplotlib.pyplot as plt
 from scipy.stats import linregress
 from scipy.signal import savgol_filter
-from scipy.signal import argrelextrema
+
+# Shared result cache at the top of the repository
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from result_cache import cached_call
+from plot_style import apply_style
+from intrinsic_window import find_window
+from outlier_rejection import hampel_filter
+from monte_carlo import bandgap_distribution
+from bandgap_reader import read_sweep
+
 csv_path = "C:/Users/jackm/OneDrive - Queen's University/Queen's Engineering/Fourth Year/ENPH 453/Advanced-Engineering-Physics-Lab/Semiconductor_Bandgap_Measurements/Feb27_Testing/Temp_Sweep.csv"
-plt.style.use('seaborn-whitegrid')  # A clean and professional style
-plt.rcParams.update({'font.size': 12, 'figure.dpi': 500}) 
+apply_style(publication_dpi=500)
 #%%
 # Assuming 'data' is a DataFrame with 'Temperature' (in K) and 'Resistance' (in Ohms)
-data = pd.read_csv(csv_path, skiprows=1) 
+temperature, resistance, run = read_sweep(csv_path)
+data = pd.DataFrame({'Temperature': temperature, 'Resistance': resistance})
+print(f"Run started {run.get('started')}")
+# Replace single-reading spikes before the minimum resistance is taken
+data['Resistance'], rejected = hampel_filter(data['Resistance'])
+print(f"Rejected {rejected.sum()} outlier readings")
 # Calculate the reciprocal temperature (1/T)
 
 
@@ -46,7 +61,13 @@ plt.show()
 window_size = 99  # Choose an odd number
 poly_order = 3
 
-data['Smoothed Resistance'] = savgol_filter(data['Adjusted Resistance'], window_size, poly_order)
+def smooth_resistance(csv_path, window_size, poly_order):
+    # Adjusted resistance of a sweep smoothed with the Savitzky-Golay filter
+    resistance, _ = hampel_filter(read_sweep(csv_path)[1])
+    return savgol_filter(resistance - resistance.min(), window_size, poly_order)
+
+# Only recomputed when the CSV or the filter settings change
+data['Smoothed Resistance'] = cached_call(smooth_resistance, csv_path, window_size, poly_order)
 
 # Plotting raw vs. smoothed data for comparison
 plt.figure(figsize=(12, 6))
@@ -63,16 +84,11 @@ plt.show()
 # Calculate the first derivative of resistance with respect to temperature
 data['dR/dT'] = np.gradient(data['Smoothed Resistance'], data['Temperature'])
 
-filtered_data = data
-minima_indices = argrelextrema(filtered_data['dR/dT'].values, np.less)[0]
+# Intrinsic region picked automatically from the linearity of ln(RT^3/2) vs 1/T
+T_min, T_max = find_window(data['Temperature'], data['Smoothed Resistance'])
 
-# Extract corresponding temperatures and dR/dT values
-minima_temperatures = filtered_data.iloc[minima_indices]['Temperature']
-minima_values = filtered_data.iloc[minima_indices]['dR/dT']
-
-plt.scatter(filtered_data['Temperature'], filtered_data['dR/dT'], label='dR/dT', color='black', s=5)
-plt.scatter(minima_temperatures.iloc[34], minima_values.iloc[34], color='red', label='Local Minima')
-plt.axvline(minima_temperatures.iloc[34])
+plt.scatter(data['Temperature'], data['dR/dT'], label='dR/dT', color='black', s=5)
+plt.axvspan(T_min, T_max, color='red', alpha=0.2, label='Intrinsic window')
 plt.xlabel('Temperature (K)')
 plt.ylabel('dR/dT')
 plt.title('First Derivative of Resistance')
@@ -81,12 +97,12 @@ plt.grid(True)
 
 plt.tight_layout()
 plt.show()
-print(minima_temperatures.iloc[34])
+print(f"Intrinsic window: {T_min:.1f} K to {T_max:.1f} K")
 
 #%% First step of lineraization
 # Linearize the resistance data by taking the natural log of the resistance
 # Filter out rows in `data` where 'Temperature' is below the threshold
-data = data[(data['Temperature'] >= 500) & (data['Temperature'] <= 630)]
+data = data[(data['Temperature'] >= T_min) & (data['Temperature'] <= T_max)]
 
 plt.plot(data['Temperature'], data['Smoothed Resistance'])
 plt.show()
@@ -122,6 +138,12 @@ Eg = 2 * slope * Boltzmann / eV
 uncertainty_Eg = 2 * std_err * Boltzmann / eV
 print(f"Estimated Band Gap Energy: {Eg:.4f} eV, with uncertainty: {uncertainty_Eg:.4f} eV")
 
+# Bootstrap of the window points with delta_T and delta_R propagated
+Eg_distribution = bandgap_distribution(data['Temperature'], data['Smoothed Resistance'], delta_T, delta_R,
+                                       n_draws=100000, seed=0)['Eg']
+print(f"Monte Carlo Band Gap Energy: {Eg_distribution['mean']:.4f} ± {Eg_distribution['std']:.4f} eV "
+      f"(95% interval {Eg_distribution['ci'][0]:.4f} to {Eg_distribution['ci'][1]:.4f} eV)")
+
 # Plotting for visualization with error bars
 plt.figure(figsize=(10, 6))
 # Adding error bars for both ln(RT^3/2) and 1/T using their uncertainties
@@ -0,0 +1,152 @@
+"""
+Hampel filter (rolling median / MAD) for the bandgap resistance logs.
+
+Some sweeps contain single garbage readings, e.g. -3586.7 Ohm at 661.2 K in
+Feb27 Temp_Sweep_2, where the readings around it lie between -2090 and -2914
+Ohm (it is replaced by their median, -2255.0 Ohm). linearization.py subtracts
+the minimum resistance, so one such spike (here the minimum of the sweep)
+shifts the whole curve.
+This stage runs before the smoothing: a point is rejected when it is more
+than `n_sigmas` robust standard deviations (1.4826 * MAD) from the median of
+the 2 * half_window + 1 points around it, and replaced by that median.
+Points near the ends use the first or last full window. Non-finite values and
+values outside optional (lower, upper) bounds are always rejected. There is no
+bound by default: the logged resistance carries an offset and is negative over
+most of the Feb sweeps. Sweeps that are noise throughout, such as the 20
+readings of Mar05 Temp_Sweep_2_Sample_2, cannot be repaired this way.
+
+hampel_filter() / hampel_segments() work on whole sweeps (or a ragged set of
+sweeps, see bandgap_batch.SweepSet); StreamingHampel gives the same result for
+data arriving in chunks, with a latency of half_window samples.
+"""
+
+import warnings
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+HALF_WINDOW = 5
+N_SIGMAS = 3
+MAD_SCALE = 1.4826  # MAD to standard deviation for Gaussian noise
+
+
+def _out_of_bounds(values, lower, upper):
+    bad = ~np.isfinite(values)
+    if lower is not None:
+        bad |= values < lower
+    if upper is not None:
+        bad |= values > upper
+    return bad
+
+
+def _window_medians(values, window_size):
+    # Median and MAD of every full window, ignoring rejected (NaN) points
+    windows = sliding_window_view(values, window_size)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(windows, axis=1)
+        mad = np.nanmedian(np.abs(windows - median[:, None]), axis=1)
+    return median, mad
+
+
+def _apply(values, median, mad, n_sigmas, bad):
+    with np.errstate(invalid='ignore'):
+        outlier = bad | (np.abs(values - median) > n_sigmas * MAD_SCALE * mad)
+    cleaned = np.where(outlier, median, values)
+    return cleaned, outlier
+
+
+def hampel_segments(values, offsets, half_window=HALF_WINDOW, n_sigmas=N_SIGMAS, lower=None, upper=None):
+    """
+    Hampel filter applied separately to every segment of a ragged array.
+    Returns (cleaned values, boolean mask of rejected points). In segments
+    shorter than the window only non-finite and out-of-bounds points are
+    rejected (and set to NaN).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.intp)
+    window_size = 2 * half_window + 1
+    bad = _out_of_bounds(values, lower, upper)
+    screened = np.where(bad, np.nan, values)
+    cleaned = screened.copy()
+    mask = bad.copy()
+
+    starts, stops = offsets[:-1], offsets[1:]
+    segment = np.repeat(np.arange(len(starts)), stops - starts)
+    usable = ((stops - starts) >= window_size)[segment]
+    if usable.any():
+        median, mad = _window_medians(screened, window_size)
+        # Window of each point, clipped so that it stays inside its own segment
+        window_start = np.clip(np.arange(len(values)) - half_window,
+                               starts[segment], stops[segment] - window_size)[usable]
+        cleaned[usable], mask[usable] = _apply(screened[usable], median[window_start], mad[window_start],
+                                               n_sigmas, bad[usable])
+    return cleaned, mask
+
+
+def hampel_filter(values, half_window=HALF_WINDOW, n_sigmas=N_SIGMAS, lower=None, upper=None):
+    """Hampel filter of one series. Returns (cleaned values, mask of rejected points)."""
+    values = np.asarray(values, dtype=np.float64)
+    return hampel_segments(values, [0, len(values)], half_window, n_sigmas, lower, upper)
+
+
+class StreamingHampel:
+    """
+    Hampel filter for chunks of (temperature, resistance) samples. push() and
+    finish() return (temperature, cleaned, rejected) for the samples that are
+    final, so the output can be passed straight to StreamingSavgol.push().
+    `n_masked` counts the rejected samples so far.
+    """
+
+    def __init__(self, half_window=HALF_WINDOW, n_sigmas=N_SIGMAS, lower=None, upper=None):
+        self.half_window = half_window
+        self.window_size = 2 * half_window + 1
+        self.n_sigmas = n_sigmas
+        self.lower = lower
+        self.upper = upper
+        self.reset()
+
+    def reset(self):
+        self.n_in = 0
+        self.n_out = 0
+        self.n_masked = 0
+        self._values = np.empty(0)  # screened samples from index n_in - len(_values)
+        self._T = np.empty(0)  # temperatures of the samples not yet emitted
+
+    def _process(self, stop):
+        base = self.n_in - len(self._values)
+        positions = np.arange(self.n_out, stop)
+        values = self._values[positions - base]
+        bad = np.isnan(values)
+        if self.n_in >= self.window_size:
+            median, mad = _window_medians(self._values, self.window_size)
+            window_start = np.clip(positions - self.half_window, 0, self.n_in - self.window_size)
+            cleaned, rejected = _apply(values, median[window_start - base], mad[window_start - base],
+                                       self.n_sigmas, bad)
+        else:
+            # Fewer samples than one window in the whole ramp
+            cleaned, rejected = values, bad
+        T = self._T[:len(positions)]
+        self._T = self._T[len(positions):]
+        self.n_out = stop
+        self.n_masked += int(rejected.sum())
+        # Keep the last full window plus everything not yet emitted
+        keep = max(self.window_size, self.n_in - self.n_out + self.half_window)
+        self._values = self._values[-keep:]
+        return T, cleaned, rejected
+
+    def push(self, temperature, resistance):
+        """Add a chunk of samples and return the ones that are now final."""
+        temperature = np.atleast_1d(np.asarray(temperature, dtype=np.float64))
+        resistance = np.atleast_1d(np.asarray(resistance, dtype=np.float64))
+        bad = _out_of_bounds(resistance, self.lower, self.upper)
+        self._values = np.concatenate([self._values, np.where(bad, np.nan, resistance)])
+        self._T = np.concatenate([self._T, temperature])
+        self.n_in += len(resistance)
+        # A point is final once the half window after it has arrived, and the
+        # first points once the first full window has
+        stop = self.n_in - self.half_window if self.n_in >= self.window_size else 0
+        return self._process(max(stop, self.n_out))
+
+    def finish(self):
+        """Flush the last half_window samples (judged against the last full window)."""
+        return self._process(self.n_in)
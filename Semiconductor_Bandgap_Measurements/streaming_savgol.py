@@ -0,0 +1,163 @@
+"""
+Streaming Savitzky-Golay smoothing and dR/dT for temperature ramps.
+
+linearization.py smooths the whole resistance column with
+savgol_filter(window=99, polyorder=3) and then takes np.gradient against the
+temperature. StreamingSavgol gives the same numbers for data that arrives in
+chunks (a ramp that is still being logged). The convolution coefficients and
+the edge-fit projection are computed once, only the last `window_size` raw
+samples are kept, and each point is emitted as soon as it is final:
+
+  * smoothed values lag the input by window_size // 2 samples, and dR/dT by
+    one more (the central difference needs the next smoothed value);
+  * the first and last window_size // 2 points use the polynomial fit of the
+    first and last window, as savgol_filter(mode='interp') does, so the last
+    ones only come out of finish().
+
+The filter is linear and keeps constants, so smoothing the raw resistance and
+subtracting the minimum afterwards is the same as smoothing the shifted curve.
+"""
+
+import numpy as np
+from scipy.signal import savgol_coeffs
+
+WINDOW_SIZE = 99
+POLY_ORDER = 3
+
+
+def interp_projection(window_size, poly_order):
+    """
+    Matrix P such that P @ window is the least squares polynomial of order
+    `poly_order` evaluated at every point of the window (savgol 'interp' edges).
+    """
+    vander = np.vander(np.arange(window_size, dtype=np.float64), poly_order + 1)
+    return vander @ np.linalg.pinv(vander)
+
+
+def gradient_weights(T_prev, T, T_next):
+    """Weights of np.gradient's second order central difference on an uneven grid."""
+    dx1 = T - T_prev
+    dx2 = T_next - T
+    a = -dx2 / (dx1 * (dx1 + dx2))
+    b = (dx2 - dx1) / (dx1 * dx2)
+    c = dx1 / (dx2 * (dx1 + dx2))
+    return a, b, c
+
+
+class StreamingSavgol:
+    """
+    Online savgol_filter(mode='interp') of the resistance with np.gradient
+    against temperature. push() returns (temperature, smoothed, dR/dT) for the
+    points completed by the new chunk; finish() returns the rest.
+    """
+
+    def __init__(self, window_size=WINDOW_SIZE, poly_order=POLY_ORDER):
+        if window_size % 2 != 1 or window_size <= poly_order:
+            raise ValueError("window_size must be odd and larger than poly_order.")
+        self.window_size = window_size
+        self.poly_order = poly_order
+        self.half = window_size // 2
+        self.coeffs = savgol_coeffs(window_size, poly_order)
+        self.projection = interp_projection(window_size, poly_order)
+        self.reset()
+
+    def reset(self):
+        self.n_in = 0  # samples received
+        self.n_smoothed = 0  # samples with a final smoothed value
+        self.n_out = 0  # samples emitted (smoothed value and derivative)
+        self.finished = False
+        self._raw = np.empty(0)  # last window_size resistances
+        # Temperatures and smoothed values from sample n_out - 1 onwards
+        self._T = np.empty(0)
+        self._smoothed = np.empty(0)
+
+    @property
+    def latency(self):
+        """Samples between a point arriving and its derivative being emitted."""
+        return self.half + 1
+
+    def _emit(self, final):
+        # Emit every point whose neighbours' smoothed values are known
+        start = max(self.n_out - 1, 0)
+        T = self._T
+        S = self._smoothed
+        stop = self.n_smoothed if final else self.n_smoothed - 1
+        idx = np.arange(self.n_out, stop)
+        if len(idx) == 0:
+            return np.empty(0), np.empty(0), np.empty(0)
+        local = idx - start
+        dRdT = np.empty(len(idx))
+        first = idx == 0
+        last = idx == self.n_smoothed - 1
+        middle = ~(first | last)
+        if first.any():
+            dRdT[first] = (S[1] - S[0]) / (T[1] - T[0])
+        if last.any():
+            dRdT[last] = (S[-1] - S[-2]) / (T[-1] - T[-2])
+        m = local[middle]
+        a, b, c = gradient_weights(T[m - 1], T[m], T[m + 1])
+        dRdT[middle] = a * S[m - 1] + b * S[m] + c * S[m + 1]
+
+        out = T[local], S[local], dRdT
+        self.n_out = stop
+        keep = max(self.n_out - 1, 0) - start
+        self._T = T[keep:]
+        self._smoothed = S[keep:]
+        return out
+
+    def push(self, temperature, resistance):
+        """Add a chunk of samples and return the points that are now final."""
+        if self.finished:
+            raise RuntimeError("finish() has already been called; reset() to start a new ramp.")
+        temperature = np.atleast_1d(np.asarray(temperature, dtype=np.float64))
+        resistance = np.atleast_1d(np.asarray(resistance, dtype=np.float64))
+        if temperature.shape != resistance.shape:
+            raise ValueError("temperature and resistance chunks must have the same length.")
+        raw_start = self.n_in - len(self._raw)
+        raw = np.concatenate([self._raw, resistance])
+        self.n_in += len(resistance)
+        self._T = np.concatenate([self._T, temperature])
+
+        w, h = self.window_size, self.half
+        new = []
+        if self.n_smoothed == 0 and self.n_in >= w:
+            # Everything since the first sample is still in `raw` at this point
+            new.append((self.projection[:h] @ raw[:w]))
+            self.n_smoothed = h
+        last_interior = self.n_in - h - 1
+        if self.n_smoothed and last_interior >= self.n_smoothed:
+            # Centres raw_start + h ... of the 'valid' convolution
+            full = np.convolve(raw, self.coeffs, mode='valid')
+            new.append(full[self.n_smoothed - raw_start - h:last_interior - raw_start - h + 1])
+            self.n_smoothed = last_interior + 1
+        if new:
+            self._smoothed = np.concatenate([self._smoothed] + new)
+        self._raw = raw[-w:]
+        return self._emit(final=False)
+
+    def finish(self):
+        """Flush the last window_size // 2 points (fitted to the last window)."""
+        if self.finished:
+            return np.empty(0), np.empty(0), np.empty(0)
+        if self.n_in < self.window_size:
+            raise ValueError(f"Need at least window_size={self.window_size} samples, got {self.n_in}.")
+        h = self.half
+        self._smoothed = np.concatenate([self._smoothed, self.projection[-h:] @ self._raw])
+        self.n_smoothed = self.n_in
+        self.finished = True
+        return self._emit(final=True)
+
+
+def stream_filter(chunks, window_size=WINDOW_SIZE, poly_order=POLY_ORDER):
+    """
+    Run StreamingSavgol over an iterable of (temperature, resistance) chunks,
+    yielding (temperature, smoothed, dR/dT) arrays as they become final.
+    """
+    smoother = StreamingSavgol(window_size, poly_order)
+    for temperature, resistance in chunks:
+        out = smoother.push(temperature, resistance)
+        if len(out[0]):
+            yield out
+    out = smoother.finish()
+    if len(out[0]):
+        yield out
@@ -0,0 +1,182 @@
+"""
+Comparison of repeated temperature sweeps (trials) on a common temperature grid.
+
+Side_by_side_plots.py overlaid trials from a hand-written list of absolute
+Windows paths. Here the trials come from a manifest (a JSON list of
+{"path": ..., "label": ...} entries, paths relative to the manifest) or from
+a glob, and are loaded concurrently into one bandgap_batch.SweepSet. Files
+with identical content are only used once. Every trial is then interpolated
+onto the same temperature grid in a single np.interp call, and the mean and
+standard deviation across trials are taken per grid temperature.
+
+    python trial_aggregator.py                      # every Temp_Sweep*.csv
+    python trial_aggregator.py --manifest trials.json --step 2
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+from bandgap_batch import SweepSet, discover_sweeps
+from outlier_rejection import hampel_segments
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from result_cache import default_cache
+
+GRID_STEP = 1.0  # K
+
+
+def default_label(path):
+    """'Feb 15 - 2' style label from a sweep path such as Feb15_Testing/Temp_Sweep_2.csv."""
+    folder = os.path.basename(os.path.dirname(path)).replace('_Testing', '').replace('_', '')
+    date = f"{folder[:3]} {folder[3:]}" if folder[3:].isdigit() else folder
+    name = os.path.splitext(os.path.basename(path))[0].replace('Temp_Sweep', '').strip('_').replace('_', ' ')
+    return f"{date} - {name}" if name else date
+
+
+def read_manifest(manifest_path):
+    """(path, label) pairs from a JSON manifest, with paths made absolute."""
+    with open(manifest_path) as f:
+        entries = json.load(f)
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    trials = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'path': entry}
+        path = os.path.normpath(os.path.join(base, entry['path']))
+        trials.append((path, entry.get('label') or default_label(path)))
+    return trials
+
+
+def deduplicate(trials):
+    """
+    Drop trials whose file content matches an earlier one (sha256 of the bytes).
+    Returns (unique trials, {dropped label: label it duplicates}).
+    """
+    cache = default_cache()
+    seen = {}
+    unique = []
+    duplicates = {}
+    for path, label in trials:
+        try:
+            digest = cache.file_digest(path)
+        except OSError:
+            # Missing files are reported by the loader
+            unique.append((path, label))
+            continue
+        if digest in seen:
+            duplicates[label] = seen[digest]
+            continue
+        seen[digest] = label
+        unique.append((path, label))
+    return unique, duplicates
+
+
+def load_trials(trials, max_workers=None):
+    """
+    Load (path, label) trials concurrently, skipping duplicate files and files
+    that cannot be read. Returns a SweepSet with `labels`, `duplicates` and
+    `skipped` attributes.
+    """
+    trials, duplicates = deduplicate(trials)
+    label_of = dict(trials)
+    sweeps = SweepSet.from_files([path for path, _ in trials], max_workers=max_workers)
+    sweeps.labels = [label_of[path] for path in sweeps.names]
+    sweeps.duplicates = duplicates
+    return sweeps
+
+
+def common_grid(sweeps, step=GRID_STEP, span='union'):
+    """
+    Temperature grid with spacing `step` covering every trial ('union') or only
+    the range shared by all of them ('overlap').
+    """
+    lengths = sweeps.lengths
+    starts = sweeps.offsets[:-1][lengths > 0]
+    T = sweeps.temperature
+    low = np.minimum.reduceat(T, starts)
+    high = np.maximum.reduceat(T, starts)
+    if span == 'overlap':
+        T_min, T_max = low.max(), high.min()
+        if T_min > T_max:
+            raise ValueError("The trials do not share a temperature range.")
+    else:
+        T_min, T_max = low.min(), high.max()
+    return np.arange(np.ceil(T_min / step) * step, T_max + step / 2, step)
+
+
+def resample(sweeps, grid, resistance=None):
+    """
+    Every trial interpolated onto `grid`, as a (trials, grid) array. Grid points
+    outside a trial's temperature range are NaN.
+
+    The samples are sorted by (trial, temperature) and each trial is shifted
+    along the temperature axis by a multiple of a span larger than any sweep,
+    so the whole set is one increasing sequence and a single np.interp call
+    serves every trial.
+    """
+    resistance = sweeps.resistance if resistance is None else resistance
+    n = len(sweeps)
+    segment = sweeps.segment
+    T = sweeps.temperature
+    order = np.lexsort((T, segment))
+    T, R, segment = T[order], resistance[order], segment[order]
+
+    shift = (max(T.max(), grid.max()) - min(T.min(), grid.min()) + 1) * 2
+    xp = T + segment * shift
+    x = grid[None, :] + (np.arange(n) * shift)[:, None]
+    values = np.interp(x.ravel(), xp, R).reshape(n, len(grid))
+
+    starts = sweeps.offsets[:-1]
+    stops = sweeps.offsets[1:]
+    nonempty = stops > starts
+    low = np.full(n, np.inf)
+    high = np.full(n, -np.inf)
+    low[nonempty] = np.minimum.reduceat(sweeps.temperature, starts[nonempty])
+    high[nonempty] = np.maximum.reduceat(sweeps.temperature, starts[nonempty])
+    outside = (grid[None, :] < low[:, None]) | (grid[None, :] > high[:, None])
+    values[outside] = np.nan
+    return values
+
+
+def aggregate(sweeps, step=GRID_STEP, span='union', reject_outliers=True):
+    """
+    Mean and sample standard deviation across trials at every grid temperature.
+    Returns a dict with the grid, the (trials, grid) resampled resistances,
+    the per-temperature mean, std and number of trials, and the labels.
+    """
+    resistance = sweeps.resistance
+    if reject_outliers:
+        resistance, _ = hampel_segments(resistance, sweeps.offsets)
+    grid = common_grid(sweeps, step, span)
+    values = resample(sweeps, grid, resistance)
+    n = np.isfinite(values).sum(axis=0)
+    total = np.nansum(values, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / n
+        std = np.sqrt(np.nansum((values - mean) ** 2, axis=0) / (n - 1))
+    return {'temperature': grid, 'resistance': values, 'mean': mean, 'std': std, 'n': n,
+            'labels': getattr(sweeps, 'labels', sweeps.names)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mean and spread of repeated temperature sweeps.")
+    parser.add_argument('--manifest', help="JSON list of trials (default: every Temp_Sweep*.csv)")
+    parser.add_argument('--step', type=float, default=GRID_STEP, help="temperature grid spacing in K")
+    parser.add_argument('--overlap', action='store_true', help="only use the temperature range shared by every trial")
+    args = parser.parse_args()
+
+    if args.manifest:
+        trials = read_manifest(args.manifest)
+    else:
+        trials = [(path, default_label(path)) for path in discover_sweeps()]
+    sweeps = load_trials(trials)
+    for label, original in sweeps.duplicates.items():
+        print(f"Skipped {label}: same content as {original}")
+    for path, reason in sweeps.skipped.items():
+        print(f"Skipped {path}: {reason}")
+    result = aggregate(sweeps, args.step, 'overlap' if args.overlap else 'union')
+    for T, mean, std, n in zip(result['temperature'], result['mean'], result['std'], result['n']):
+        print(f"{T:8.1f} K  {mean:12.1f} ± {std:10.1f} Ohms  ({n} trials)")
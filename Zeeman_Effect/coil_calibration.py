@@ -0,0 +1,282 @@
+"""
+Calibration of the Zeeman electromagnet: field B (G) against coil current I (mA).
+
+Mar_19/Plots.py fitted np.polyfit(I, 1000 * Recorded Field, 1) and printed
+the line. The calibration CSVs also carry the factor from the gaussmeter
+reading (kG) to gauss and the Earth field the probe picks up, and there is a
+second run (Coil_calibration_bad.csv) that was never looked at.
+
+CoilCalibration fits a weighted polynomial to one or more runs, with the
+weights from the gaussmeter accuracy (1% of the reading plus a digit, which
+matches the ~35 G scatter of the Mar_19 run: chi^2/dof ~ 1 below 600 mA) and
+the covariance scaled by the reduced chi^2 when the scatter is larger than
+that (with a warning from fit() when it is far larger, e.g. a straight line
+through the saturation of the yoke), subtracts the Earth field, and converts
+whole arrays of currents to fields (and back) with the fit uncertainty
+propagated. It can be saved to JSON, and calibrate()
+caches the fit on the content of the CSVs so scripts do not refit on every
+run.
+
+    calibration = calibrate('Mar_19/Coil_calibration.csv', current_range=(0, 600))
+    B, B_err = calibration.field(frame_currents)
+"""
+
+import os
+import sys
+import json
+import warnings
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+from result_cache import cached_call
+
+FIELD_ACCURACY = 0.01  # fraction of the reading, gaussmeter accuracy
+FIELD_RESOLUTION = 10.0  # G, last digit of the gaussmeter (0.01 kG)
+CURRENT_RESOLUTION = 0.1  # mA
+DEFAULT_FACTOR = 1000  # G per kG reading
+INVERSE_GRID = 4096
+POOR_FIT_CHI2 = 10  # reduced chi^2 above which the model is reported as not describing the points
+
+
+def read_calibration(path):
+    """
+    Current (mA), coil field (G) and Earth field (G) of one calibration CSV.
+    The header spells the current column 'Current (mADC)' or 'Current (mAdc)',
+    and the adjustment factor and Earth field are only filled in on the first
+    row.
+    """
+    data = pd.read_csv(path)
+    data.columns = [c.strip() for c in data.columns]
+    current_column = next(c for c in data.columns if c.lower().startswith('current'))
+    data = data.dropna(subset=[current_column, 'Recorded Field'])
+    factor = data['Adjustment Factor'].dropna() if 'Adjustment Factor' in data else pd.Series(dtype=float)
+    earth = data['Earth Field (G)'].dropna() if 'Earth Field (G)' in data else pd.Series(dtype=float)
+    factor = float(factor.iloc[0]) if len(factor) else DEFAULT_FACTOR
+    earth = float(earth.iloc[0]) if len(earth) else 0.0
+    return {'path': path, 'current': data[current_column].to_numpy(dtype=float),
+            'field': data['Recorded Field'].to_numpy(dtype=float) * factor, 'earth_field': earth}
+
+
+def _uniform_sigma(resolution):
+    # Standard deviation of the rounding to the last displayed digit
+    return resolution / np.sqrt(12)
+
+
+def _field_sigma(field):
+    # Gaussmeter accuracy: a fraction of the reading plus one digit
+    return FIELD_ACCURACY * np.abs(field) + FIELD_RESOLUTION
+
+
+class CoilCalibration:
+    """
+    Polynomial B(I) (coefficients highest power first, as np.polyfit) with its
+    covariance, the current range it was fitted over and the fitted points.
+    """
+
+    def __init__(self, coefficients, covariance, current_range, earth_field=0.0, chi2=np.nan, dof=0,
+                 data=None, sources=()):
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.covariance = np.asarray(covariance, dtype=float)
+        self.current_range = tuple(float(c) for c in current_range)
+        self.earth_field = float(earth_field)
+        self.chi2 = float(chi2)
+        self.dof = int(dof)
+        self.data = data
+        self.sources = list(sources)
+        self._prepare()
+
+    def _prepare(self):
+        # var(B(I)) = V C V^T with V = [I^d, ..., 1] is itself a polynomial in
+        # I whose coefficients are the anti-diagonal sums of the covariance
+        degree = self.degree
+        flipped = self.covariance[:, ::-1]
+        self._variance = np.array([np.trace(flipped, offset=degree - m) for m in range(2 * degree + 1)])
+        self._derivative = np.polyder(self.coefficients) if degree else np.zeros(1)
+        self._grid = None
+
+    @property
+    def degree(self):
+        return len(self.coefficients) - 1
+
+    @property
+    def reduced_chi2(self):
+        return self.chi2 / self.dof if self.dof else np.nan
+
+    #%% Fitting
+
+    @classmethod
+    def fit(cls, current, field, degree=1, earth_field=0.0, field_sigma=None, current_sigma=None, run=None,
+            sources=()):
+        """
+        Weighted least squares B(I) of degree `degree` on the Earth-field
+        corrected fields. field_sigma defaults to the gaussmeter accuracy; the
+        current uncertainty enters through the slope (effective variance).
+        The covariance is scaled up by the reduced chi^2 when it is above 1,
+        with a warning when it is above POOR_FIT_CHI2.
+        """
+        current = np.asarray(current, dtype=float)
+        field = np.asarray(field, dtype=float) - earth_field
+        field_sigma = np.broadcast_to(_field_sigma(field) if field_sigma is None else field_sigma, field.shape)
+        current_sigma = np.broadcast_to(_uniform_sigma(CURRENT_RESOLUTION) if current_sigma is None
+                                        else current_sigma, current.shape)
+        if len(current) <= degree + 1:
+            raise ValueError(f"A degree {degree} fit needs more than {degree + 1} points.")
+        # First pass for the slope, second with the effective variances
+        coefficients = np.polyfit(current, field, degree, w=1 / field_sigma)
+        slope = np.polyval(np.polyder(coefficients), current) if degree else 0.0
+        sigma = np.sqrt(field_sigma ** 2 + (slope * current_sigma) ** 2)
+        coefficients, covariance = np.polyfit(current, field, degree, w=1 / sigma, cov='unscaled')
+        residual = (field - np.polyval(coefficients, current)) / sigma
+        chi2 = float(np.sum(residual ** 2))
+        dof = len(current) - degree - 1
+        if chi2 / dof > 1:
+            covariance = covariance * chi2 / dof
+        if chi2 / dof > POOR_FIT_CHI2:
+            warnings.warn(f"Degree {degree} coil calibration over {current.min():g}-{current.max():g} mA has "
+                          f"chi^2/dof = {chi2 / dof:.0f}; its errors are scaled up to the scatter, but the model "
+                          f"may not describe the points (fit a higher degree or restrict current_range to the "
+                          f"linear region).", RuntimeWarning, stacklevel=2)
+        data = pd.DataFrame({'run': run if run is not None else 0, 'current': current, 'field': field,
+                             'sigma': sigma})
+        return cls(coefficients, covariance, (current.min(), current.max()), earth_field, chi2, dof, data, sources)
+
+    @classmethod
+    def from_csv(cls, paths, degree=1, current_range=None):
+        """
+        Fit to one calibration CSV, or to the merged points of several runs.
+        current_range = (low, high) mA keeps only the points inside it (for
+        instance to leave out the saturation of the yoke at high current).
+        """
+        paths = [paths] if isinstance(paths, (str, os.PathLike)) else list(paths)
+        runs = [read_calibration(p) for p in paths]
+        current = np.concatenate([r['current'] for r in runs])
+        field = np.concatenate([r['field'] - r['earth_field'] for r in runs])
+        run = np.concatenate([np.full(len(r['current']), i) for i, r in enumerate(runs)])
+        if current_range is not None:
+            keep = (current >= current_range[0]) & (current <= current_range[1])
+            current, field, run = current[keep], field[keep], run[keep]
+        earth_field = np.mean([r['earth_field'] for r in runs])
+        calibration = cls.fit(current, field, degree, run=run, sources=[os.path.basename(p) for p in paths])
+        # The points are already corrected run by run; record the mean offset used
+        calibration.earth_field = float(earth_field)
+        return calibration
+
+    def merge(self, *others, degree=None):
+        """One calibration fitted to the points of this run and `others` together."""
+        runs = [self, *others]
+        data = pd.concat([c.data.assign(run=i) for i, c in enumerate(runs)], ignore_index=True)
+        merged = CoilCalibration.fit(data['current'], data['field'], degree or self.degree, run=data['run'],
+                                     sources=[s for c in runs for s in c.sources])
+        merged.earth_field = float(np.mean([c.earth_field for c in runs]))
+        return merged
+
+    def compare(self, other):
+        """
+        Test whether the points of `other` agree with this calibration: chi^2
+        of their residuals over the combined point and model uncertainty,
+        within the current range both runs cover. Returns a dict with the
+        residuals, chi^2, degrees of freedom and p-value.
+        """
+        low = max(self.current_range[0], other.current_range[0])
+        high = min(self.current_range[1], other.current_range[1])
+        points = other.data[(other.data['current'] >= low) & (other.data['current'] <= high)]
+        model, model_err = self.field(points['current'].to_numpy(), corrected=True)
+        residual = points['field'].to_numpy() - model
+        sigma = np.hypot(points['sigma'].to_numpy(), model_err)
+        chi2 = float(np.sum((residual / sigma) ** 2))
+        return {'current': points['current'].to_numpy(), 'residual': residual, 'sigma': sigma,
+                'chi2': chi2, 'dof': len(points), 'p_value': float(stats.chi2.sf(chi2, len(points))),
+                'mean_offset': float(np.mean(residual)) if len(points) else np.nan}
+
+    #%% Conversions
+
+    def _outside(self, current):
+        return (current < self.current_range[0]) | (current > self.current_range[1])
+
+    def field(self, current, current_err=0.0, corrected=True, extrapolate=False):
+        """
+        Coil field (G) and its standard uncertainty at `current` (mA, any
+        shape). corrected=False adds the Earth field back, giving what the
+        gaussmeter would read. Currents outside the calibrated range give NaN
+        unless extrapolate=True.
+        """
+        current = np.asarray(current, dtype=float)
+        field = np.polyval(self.coefficients, current)
+        variance = np.polyval(self._variance, current)
+        if np.any(current_err):
+            variance = variance + (np.polyval(self._derivative, current) * current_err) ** 2
+        error = np.sqrt(np.maximum(variance, 0))
+        if not corrected:
+            field = field + self.earth_field
+        if not extrapolate:
+            outside = self._outside(current)
+            if np.any(outside):
+                field = np.where(outside, np.nan, field)
+                error = np.where(outside, np.nan, error)
+        return field, error
+
+    def current(self, field, field_err=0.0, corrected=True):
+        """
+        Current (mA) that gives `field` (G, any shape), with its uncertainty
+        from the field uncertainty and the calibration. Found by interpolating
+        a table of the calibration and one Newton step; fields the calibration
+        does not reach in its current range give NaN.
+        """
+        field = np.asarray(field, dtype=float)
+        if not corrected:
+            field = field - self.earth_field
+        if self._grid is None:
+            grid = np.linspace(*self.current_range, INVERSE_GRID)
+            values = np.polyval(self.coefficients, grid)
+            if not (np.all(np.diff(values) > 0) or np.all(np.diff(values) < 0)):
+                raise ValueError("The calibration is not monotonic over its current range, so I(B) is ambiguous.")
+            order = np.argsort(values)
+            self._grid = (values[order], grid[order])
+        values, grid = self._grid
+        current = np.interp(field, values, grid, left=np.nan, right=np.nan)
+        slope = np.polyval(self._derivative, current)
+        current = current - (np.polyval(self.coefficients, current) - field) / slope
+        model_err = np.sqrt(np.maximum(np.polyval(self._variance, current), 0))
+        error = np.sqrt(model_err ** 2 + np.asarray(field_err, dtype=float) ** 2) / np.abs(slope)
+        return current, error
+
+    #%% Persistence
+
+    def to_dict(self):
+        return {'coefficients': self.coefficients.tolist(), 'covariance': self.covariance.tolist(),
+                'current_range': list(self.current_range), 'earth_field': self.earth_field,
+                'chi2': self.chi2, 'dof': self.dof, 'sources': self.sources,
+                'data': None if self.data is None else self.data.to_dict(orient='list')}
+
+    @classmethod
+    def from_dict(cls, values):
+        values = dict(values)
+        data = values.pop('data', None)
+        return cls(data=None if data is None else pd.DataFrame(data), **values)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def __repr__(self):
+        terms = ', '.join(f"{c:.6g} ± {e:.2g}" for c, e in zip(self.coefficients, np.sqrt(np.diag(self.covariance))))
+        return (f"CoilCalibration(degree={self.degree}, coefficients=[{terms}], "
+                f"range={self.current_range[0]:g}-{self.current_range[1]:g} mA, chi2/dof={self.reduced_chi2:.3g})")
+
+
+def _fit_csv(*paths, degree=1, current_range=None):
+    return CoilCalibration.from_csv(list(paths), degree, current_range).to_dict()
+
+
+def calibrate(paths, degree=1, current_range=None):
+    """CoilCalibration.from_csv, cached on the content of the CSVs and the fit settings."""
+    paths = [paths] if isinstance(paths, (str, os.PathLike)) else list(paths)
+    current_range = None if current_range is None else tuple(current_range)
+    return CoilCalibration.from_dict(cached_call(_fit_csv, paths, degree=degree, current_range=current_range))
@@ -0,0 +1,211 @@
+"""
+Fringe analysis of a whole stack of Zeeman frames (a field sweep).
+
+data.ipynb loads one photograph with mpimg.imread and converts it with
+img.mean(axis=2), which holds the uint8 image and a float64 copy of it
+(~100 MB for a 12 MP frame). A sweep is a directory of photographs, or a
+video, taken at different coil currents. Here the frames are decoded lazily
+in a thread pool with only a few in flight at a time, converted straight to a
+uint8 (or float32) grayscale by Pillow, run through the fringe and ring
+analysis and dropped, so memory stays at a few frames however long the sweep
+is. The ring center is found on the first frame and reused, which also keeps
+the cached radius map of ring_profile valid for the whole stack; a frame whose
+splitting cannot be measured around it (the camera or etalon moved, or the
+first frame is a different setup, as sample.jpg is for Data) is analysed again
+around its own center and fringe band.
+
+    python frame_stack.py Data --components 3 --out sweep.csv
+"""
+
+import os
+import re
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from fringe_analysis import HEIGHT, DISTANCE, fringe_spacing
+from ring_profile import DOWNSAMPLE, RING_DISTANCE, find_center, fringe_band, radial_profile, ring_radii, zeeman_shift
+
+try:
+    import imageio.v3 as iio
+except ImportError:
+    # Only needed for video files
+    iio = None
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv')
+# Grayscale as the plain mean of the channels, as in data.ipynb
+_MEAN = (1 / 3, 1 / 3, 1 / 3, 0)
+_CURRENT = re.compile(r'(?P<value>[-+]?\d+(?:[.p]\d+)?)\s*(?P<unit>mA|A)(?![a-zA-Z])', re.IGNORECASE)
+
+
+def current_from_name(path):
+    """Coil current in A from a file name such as '1.25A.jpg' or 'I_350mA.png' (NaN if there is none)."""
+    match = _CURRENT.search(os.path.splitext(os.path.basename(path))[0])
+    if match is None:
+        return np.nan
+    value = float(match.group('value').replace('p', '.'))
+    return value / 1000 if match.group('unit').lower() == 'ma' else value
+
+
+def list_frames(directory):
+    """Image files of a directory, in natural order (frame_2 before frame_10)."""
+    names = [n for n in os.listdir(directory) if n.lower().endswith(IMAGE_EXTENSIONS)]
+    names.sort(key=lambda n: [int(p) if p.isdigit() else p.lower() for p in re.split(r'(\d+)', n)])
+    return [os.path.join(directory, n) for n in names]
+
+
+def read_gray(path, dtype=np.uint8, reduce=1):
+    """
+    Grayscale frame decoded by Pillow without a float copy of the colour image.
+    reduce > 1 lets the JPEG decoder skip detail and return an image that much
+    smaller on each side.
+    """
+    with Image.open(path) as img:
+        if reduce > 1:
+            img.draft('RGB', (img.size[0] // reduce, img.size[1] // reduce))
+        gray = img.convert('L', matrix=_MEAN) if img.mode == 'RGB' else img.convert('L')
+        gray = np.asarray(gray)
+    return gray if dtype == np.uint8 else gray.astype(dtype)
+
+
+def gray_from_array(frame, dtype=np.uint8):
+    """Grayscale of a decoded (rows, columns, channels) frame, as `dtype`."""
+    if frame.ndim == 2:
+        return frame.astype(dtype, copy=False)
+    total = frame[..., 0].astype(np.uint16)
+    total += frame[..., 1]
+    total += frame[..., 2]
+    if dtype == np.uint8:
+        total //= 3
+        return total.astype(np.uint8)
+    return (total / 3).astype(dtype)
+
+
+def _sources(source, dtype, reduce):
+    # (name, current, loader) for every frame; loaders run in the worker threads
+    if os.path.isdir(source):
+        for path in list_frames(source):
+            yield os.path.basename(path), current_from_name(path), \
+                lambda path=path: read_gray(path, dtype, reduce)
+    elif source.lower().endswith(VIDEO_EXTENSIONS):
+        if iio is None:
+            raise ImportError("Reading video frames needs imageio (pip install imageio[pyav]).")
+        # A video decodes in order, so frames are pulled here and only the
+        # conversion and analysis go to the pool
+        for index, frame in enumerate(iio.imiter(source)):
+            frame = frame[::reduce, ::reduce] if reduce > 1 else frame
+            yield f"{os.path.basename(source)}#{index}", np.nan, lambda frame=frame: gray_from_array(frame, dtype)
+    else:
+        yield os.path.basename(source), current_from_name(source), lambda: read_gray(source, dtype, reduce)
+
+
+def iter_frames(source, analyze, dtype=np.uint8, reduce=1, max_workers=None, in_flight=None):
+    """
+    Yield (name, current, analyze(gray)) for every frame of a directory, a
+    video or a single image, in order. At most `in_flight` frames (default
+    twice the workers) are decoded or being analysed at any time.
+    """
+    max_workers = max_workers or min(8, os.cpu_count() or 1)
+    in_flight = in_flight or 2 * max_workers
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for name, current, load in _sources(source, dtype, reduce):
+            pending.append((name, current, pool.submit(lambda load=load: analyze(load()))))
+            if len(pending) >= in_flight:
+                name, current, future = pending.popleft()
+                yield name, current, future.result()
+        while pending:
+            name, current, future = pending.popleft()
+            yield name, current, future.result()
+
+
+def analyze_frame(gray, center, mask, components=3, columns=None, height=HEIGHT, reduce=1):
+    """
+    Row-wise fringe spacing and ring splitting of one grayscale frame.
+    Distances are in pixels of the frame, which is `reduce` times smaller
+    than the full photograph.
+    """
+    result = {}
+    try:
+        rows = fringe_spacing(gray, columns=columns, height=height, distance=max(DISTANCE // reduce, 2), max_workers=1)
+        result.update(spacing=rows['spacing'], spacing_err=rows['spacing_err'], n_rows=rows['n_rows'])
+    except ValueError:
+        result.update(spacing=np.nan, spacing_err=np.nan, n_rows=0)
+    profile = radial_profile(gray, center, mask=mask)
+    split = zeeman_shift(ring_radii(profile, distance=max(RING_DISTANCE // reduce, 2)), components)
+    result.update(n_rings=sum(len(o) for o in split['orders']), order_spacing=split['order_spacing'],
+                  delta_nu=split['delta_nu'], delta_nu_err=split['delta_nu_err'],
+                  delta_lambda=split['delta_lambda'], delta_lambda_err=split['delta_lambda_err'],
+                  n_orders=split['n_orders'])
+    return result
+
+
+def process_stack(source, components=3, center=None, columns=None, height=HEIGHT, dtype=np.uint8, reduce=1,
+                  max_workers=None, in_flight=None, recenter='auto'):
+    """
+    Fringe spacing and Zeeman splitting of every frame of `source` as a
+    DataFrame (one row per frame, with the coil current parsed from the file
+    name and the ring center used). The ring center (unless given) and the
+    fringe band are taken from the first frame, since the optics normally do
+    not move during a sweep. With recenter='auto' a frame whose splitting
+    comes out NaN around them is analysed again around its own center and
+    band, recenter=True does that for every frame and recenter=False never.
+    Frames left without a splitting are reported with a warning.
+    """
+    factor = max(DOWNSAMPLE // reduce, 1)
+    first = next(_sources(source, dtype, reduce), None)
+    if first is None:
+        raise ValueError(f"No frames in {source}.")
+    gray = first[2]()
+    if center is None:
+        center, _ = find_center(gray, factor=factor)
+    mask = fringe_band(gray, factor=factor)
+    del gray
+
+    def analyze(gray):
+        result = analyze_frame(gray, center, mask, components, columns, height, reduce)
+        frame_center, recentered = center, False
+        if recenter is True or (recenter == 'auto' and not np.isfinite(result['delta_nu'])):
+            try:
+                frame_center, _ = find_center(gray, factor=factor)
+            except ValueError:
+                frame_center = center
+            else:
+                result = analyze_frame(gray, frame_center, fringe_band(gray, factor=factor), components, columns,
+                                       height, reduce)
+                recentered = True
+        return {**result, 'center_x': frame_center[0], 'center_y': frame_center[1], 'recentered': recentered}
+
+    records = []
+    for name, current, result in iter_frames(source, analyze, dtype, reduce, max_workers, in_flight):
+        records.append({'frame': name, 'current': current, **result})
+    table = pd.DataFrame(records)
+    table.attrs['center'] = center
+    failed = table.loc[~np.isfinite(table['delta_nu']), 'frame']
+    if len(failed):
+        warnings.warn(f"No Zeeman splitting could be measured on {len(failed)} frame(s): {', '.join(failed)}.",
+                      RuntimeWarning, stacklevel=2)
+    return table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fringe spacing and Zeeman splitting of a stack of frames.")
+    parser.add_argument('source', help="directory of images, a video file or a single image")
+    parser.add_argument('--components', type=int, default=3, help="rings per order (3 for the normal triplet)")
+    parser.add_argument('--reduce', type=int, default=1, help="decode JPEGs this many times smaller on each side")
+    parser.add_argument('--workers', type=int, default=None, help="decoding and analysis threads")
+    parser.add_argument('--recenter', action='store_true', help="find the ring center of every frame")
+    parser.add_argument('--out', help="write the table to this CSV file")
+    args = parser.parse_args()
+
+    table = process_stack(args.source, args.components, reduce=args.reduce, max_workers=args.workers,
+                          recenter=True if args.recenter else 'auto')
+    print(f"Ring center: {table.attrs['center']}")
+    print(table.to_string(index=False))
+    if args.out:
+        table.to_csv(args.out, index=False)
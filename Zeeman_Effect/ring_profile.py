@@ -0,0 +1,270 @@
+"""
+Radial (ring) profile of a Fabry-Perot Zeeman interferogram.
+
+The rings are concentric, but data.ipynb (and fringe_analysis.py) measure
+them along horizontal lines, so the peak spacing depends on where the line
+crosses the ring center. Here the ring center is found first: the image is
+downsampled and band-passed (difference of Gaussians), the fringe crests are
+picked out with fringe_analysis.find_fringe_peaks and grouped into arcs, and
+a circle is fitted to every arc at once from bincount moments. The center is
+the weighted median of the arc centers, weighted towards the strongly curved
+inner arcs; in our photographs the center is off to the left of the slit and
+the outer rings are flattened by the camera lens.
+
+The azimuthally averaged profile is then a np.bincount over a radius map.
+The map depends only on the image shape, the center and the bin width, so it
+is cached and a stack of frames from a field sweep only pays for the
+bincount. Ring radii come from the profile peaks, and with rings of order p
+at r_p^2, a splitting of delta(r^2) within an order is a frequency shift of
+FSR * delta(r^2) / Delta(r^2), Delta(r^2) being the r^2 spacing of orders.
+
+    gray = to_gray(mpimg.imread('Data/with_magnetic_field.jpg'))
+    profile = radial_profile(gray)
+    result = zeeman_shift(ring_radii(profile), components=3)
+"""
+
+import numpy as np
+from functools import lru_cache
+from scipy import ndimage
+from scipy.signal import find_peaks
+from scipy.constants import c
+
+from fringe_analysis import find_fringe_peaks
+
+WAVELENGTH = 585.249e-9  # m, neon line
+FSR = 30.0e9  # Hz, free spectral range of the etalon
+DOWNSAMPLE = 4
+BIN_WIDTH = 1.0  # pixels
+MIN_ARC_POINTS = 20
+MIN_ARC_EXTENT = 20  # rows of the downsampled image
+MIN_BIN_PIXELS = 20
+RING_DISTANCE = 8  # bins between neighbouring rings
+RESOLVED_GAP = 1.5
+
+
+def downsample(gray, factor=DOWNSAMPLE):
+    """Mean of factor x factor blocks (the edge rows and columns that do not fill a block are dropped)."""
+    h, w = gray.shape[0] // factor * factor, gray.shape[1] // factor * factor
+    return gray[:h, :w].reshape(h // factor, factor, w // factor, factor).mean(axis=(1, 3))
+
+
+def band_pass(small, fine=1.0, coarse=4.0):
+    """Difference of Gaussians: keeps features between the two scales (the fringes), drops the illumination."""
+    return ndimage.gaussian_filter(small, fine) - ndimage.gaussian_filter(small, coarse)
+
+
+def aperture_mask(small, fraction=0.25, margin=12):
+    """Lit part of the eyepiece aperture, shrunk by `margin` pixels so its edge is not taken for a fringe."""
+    lit = small > fraction * np.percentile(small, 99)
+    return ndimage.binary_erosion(lit, iterations=margin)
+
+
+def fringe_band(gray, factor=DOWNSAMPLE, threshold=0.25):
+    """
+    Full resolution mask of the slit band that carries the fringes: where the
+    smoothed band-passed contrast is above `threshold` of its peak.
+    """
+    small = downsample(gray, factor)
+    contrast = ndimage.gaussian_filter(np.abs(band_pass(small)), (factor, 4 * factor))
+    band = contrast > threshold * np.percentile(contrast, 99.9)
+    mask = np.zeros(gray.shape, dtype=bool)
+    mask[:band.shape[0] * factor, :band.shape[1] * factor] = band.repeat(factor, axis=0).repeat(factor, axis=1)
+    return mask
+
+
+def fit_arcs(y, x, labels):
+    """
+    Least squares (Kasa) circle through the points of every label at once.
+    Returns center x, center y, radius, rms residual and point count per label
+    (NaN for labels with fewer than three points).
+    """
+    n = labels.max() + 1
+    count = np.bincount(labels, minlength=n).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = np.bincount(labels, x, n) / count
+        y_mean = np.bincount(labels, y, n) / count
+    # Centered on each arc's mean for conditioning
+    X = x - x_mean[labels]
+    Y = y - y_mean[labels]
+    S = X * X + Y * Y
+
+    def total(values):
+        return np.bincount(labels, values, n)
+
+    A = np.empty((n, 3, 3))
+    A[:, 0, 0] = total(X * X)
+    A[:, 0, 1] = A[:, 1, 0] = total(X * Y)
+    A[:, 1, 1] = total(Y * Y)
+    A[:, 0, 2] = A[:, 2, 0] = A[:, 1, 2] = A[:, 2, 1] = 0  # sums of centered coordinates
+    A[:, 2, 2] = count
+    b = np.stack([total(X * S) / 2, total(Y * S) / 2, total(S)], axis=1)
+    solvable = (count >= 3) & (np.abs(np.linalg.det(A)) > 1e-9)
+    solution = np.full((n, 3), np.nan)
+    solution[solvable] = np.linalg.solve(A[solvable], b[solvable][..., None])[..., 0]
+    a, bb, k = solution.T
+    radius = np.sqrt(k + a * a + bb * bb)
+    residual = np.hypot(X - a[labels], Y - bb[labels]) - radius[labels]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rms = np.sqrt(np.bincount(labels, np.nan_to_num(residual ** 2), n) / count)
+    return a + x_mean, bb + y_mean, radius, rms, count
+
+
+def _weighted_median(values, weights):
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    return values[order][np.searchsorted(cumulative, cumulative[-1] / 2)]
+
+
+def find_center(gray, factor=DOWNSAMPLE, min_points=MIN_ARC_POINTS, min_extent=MIN_ARC_EXTENT):
+    """
+    (x, y) of the ring center in pixels of `gray`, possibly outside the image.
+    Returns the center and the table of fitted arcs (dict of arrays).
+    """
+    small = downsample(gray, factor)
+    filtered = band_pass(small)
+    filtered[~aperture_mask(small)] = 0
+    rows, columns = find_fringe_peaks(filtered, height=0.25 * np.percentile(filtered, 99.9), distance=3)
+    if len(rows) == 0:
+        raise ValueError("No fringes found in the image.")
+    crests = np.zeros(small.shape, dtype=bool)
+    crests[rows, columns] = True
+    # Crests on neighbouring rows that touch belong to the same arc
+    arcs, _ = ndimage.label(crests, structure=np.ones((3, 3)))
+    labels = arcs[rows, columns] - 1
+    cx, cy, radius, rms, count = fit_arcs(rows.astype(float), columns.astype(float), labels)
+    extent = ndimage.maximum(rows, labels, np.arange(len(count))) - ndimage.minimum(rows, labels, np.arange(len(count)))
+    extent = np.asarray(extent, dtype=float)
+
+    fitted = (count >= min_points) & (extent >= min_extent) & np.isfinite(radius)
+    if not fitted.any():
+        raise ValueError("No fringe arc is long enough to fit a circle to.")
+    # Spots and merged fringes fit a circle much worse than clean arcs do
+    good = fitted & (rms <= 2 * np.median(rms[fitted]))
+    # The curvature, and so the center, is best fixed by long arcs of small radius
+    weight = count[good] * np.minimum(extent[good] / radius[good], 0.5) ** 2
+    center = (_weighted_median(cx[good], weight) * factor + (factor - 1) / 2,
+              _weighted_median(cy[good], weight) * factor + (factor - 1) / 2)
+    arcs = {'x': cx[good] * factor, 'y': cy[good] * factor, 'radius': radius[good] * factor,
+            'rms': rms[good] * factor, 'points': count[good].astype(int)}
+    return center, arcs
+
+
+@lru_cache(maxsize=4)
+def radius_bins(shape, center, bin_width=BIN_WIDTH):
+    """
+    Flattened radius bin index of every pixel of an image of `shape` around
+    `center`, and the pixel count per bin. Cached per geometry, so use a
+    rounded center (as radial_profile does).
+    """
+    y, x = np.ogrid[:shape[0], :shape[1]]
+    r = np.sqrt((x - center[0]) ** 2 + (y - center[1]) ** 2, dtype=np.float32)
+    bins = (r / bin_width).astype(np.int32).ravel()
+    bins.flags.writeable = False
+    return bins, np.bincount(bins)
+
+
+def radial_profile(gray, center=None, bin_width=BIN_WIDTH, mask='band', min_pixels=MIN_BIN_PIXELS):
+    """
+    Azimuthally averaged intensity of `gray` around `center` (found if None).
+    mask is a boolean image of the pixels to use, 'band' for the fringe band
+    or None for the whole image. Bins with fewer than `min_pixels` pixels are
+    NaN. Returns a dict with the bin radii, intensity, pixel counts and center.
+    """
+    if center is None:
+        center, _ = find_center(gray)
+    center = (round(float(center[0]), 2), round(float(center[1]), 2))
+    bins, counts = radius_bins(gray.shape, center, bin_width)
+    values = gray.ravel()
+    if isinstance(mask, str):
+        mask = fringe_band(gray)
+    if mask is not None:
+        mask = mask.ravel()
+        bins, values = bins[mask], values[mask]
+        counts = np.bincount(bins, minlength=len(counts))
+    sums = np.bincount(bins, weights=values, minlength=len(counts))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        intensity = np.where(counts >= min_pixels, sums / counts, np.nan)
+    return {'radius': (np.arange(len(counts)) + 0.5) * bin_width, 'intensity': intensity,
+            'counts': counts, 'center': center}
+
+
+def ring_radii(profile, prominence=5, distance=RING_DISTANCE):
+    """
+    Radii of the bright rings in a radial profile: find_peaks on the profile,
+    refined to sub-bin precision with a parabola through each peak and its
+    neighbours.
+    """
+    intensity = profile['intensity']
+    valid = np.isfinite(intensity)
+    filled = np.where(valid, intensity, np.nanmin(intensity))
+    peaks, _ = find_peaks(filled, prominence=prominence, distance=distance)
+    peaks = peaks[(peaks > 0) & (peaks < len(filled) - 1)]
+    peaks = peaks[valid[peaks - 1] & valid[peaks + 1]]
+    left, mid, right = filled[peaks - 1], filled[peaks], filled[peaks + 1]
+    curvature = left - 2 * mid + right
+    with np.errstate(invalid='ignore', divide='ignore'):
+        offset = np.where(curvature < 0, 0.5 * (left - right) / curvature, 0.0)
+    bin_width = profile['radius'][1] - profile['radius'][0]
+    return profile['radius'][peaks] + offset * bin_width
+
+
+def group_orders(radii_squared, components=1):
+    """
+    Group r^2 values into interference orders (a list of arrays, one per
+    order). With components > 1 a gap between neighbouring rings is an order
+    boundary when it is more than half the largest gap around it, so the
+    growing order spacing at large radii does not matter.
+    """
+    r2 = np.sort(np.asarray(radii_squared, dtype=float))
+    if components == 1 or len(r2) < 3:
+        return [r2[i:i + 1] for i in range(len(r2))]
+    gaps = np.diff(r2)
+    padded = np.pad(gaps, components - 1, mode='edge')
+    local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * components - 1).max(axis=1)
+    boundary = gaps >= local_max
+    return np.split(r2, np.nonzero(boundary)[0] + 1)
+
+
+def zeeman_shift(radii, components=3, wavelength=WAVELENGTH, fsr=FSR):
+    """
+    Frequency and wavelength splitting between neighbouring components of
+    each order, from the ring radii (pixels). Only orders showing all
+    `components` rings are used. Delta(r^2) for each order is the spacing to
+    the next order, so a slowly varying spacing (lens distortion) cancels.
+    Returns a dict with Delta(r^2) from a straight line fit of the order
+    means, the per-order values and the combined shift with its standard error.
+    """
+    orders = group_orders(np.asarray(radii) ** 2, components)
+    means = np.array([o.mean() for o in orders])
+    complete = np.array([len(o) == components for o in orders])
+    # Order spacing from the complete orders (all of them without a field)
+    order = np.nonzero(complete)[0]
+    if len(order) > 2:
+        (spacing, _), cov = np.polyfit(order, means[order], 1, cov=True)
+        spacing_err = np.sqrt(cov[0, 0])
+    else:
+        spacing, spacing_err = np.nan, np.nan
+    splitting = np.array([np.diff(o).mean() if len(o) == components > 1 else np.nan for o in orders])
+    # Each complete order against the spacing to the following one; where the
+    # components blur together at large radii the grouping is arbitrary, so
+    # the gap to the next order must clearly exceed the gaps inside the order
+    widest = np.array([np.diff(o).max() if len(o) > 1 else np.nan for o in orders])
+    gap_to_next = np.array([after[0] - before[-1] for before, after in zip(orders[:-1], orders[1:])])
+    with np.errstate(invalid='ignore'):
+        use = np.isfinite(splitting[:-1]) & complete[1:] & (gap_to_next >= RESOLVED_GAP * widest[:-1])
+    frequency = fsr * splitting[:-1][use] / np.diff(means)[use]
+    shift = wavelength ** 2 * frequency / c
+    n = len(shift)
+    return {
+        'orders': orders,
+        'order_spacing': float(spacing),
+        'order_spacing_err': float(spacing_err),
+        'splitting': splitting,
+        'frequency': frequency,
+        'wavelength_shift': shift,
+        'delta_nu': float(frequency.mean()) if n else np.nan,
+        'delta_nu_err': float(frequency.std(ddof=1) / np.sqrt(n)) if n > 1 else np.nan,
+        'delta_lambda': float(shift.mean()) if n else np.nan,
+        'delta_lambda_err': float(shift.std(ddof=1) / np.sqrt(n)) if n > 1 else np.nan,
+        'n_orders': n,
+    }
@@ -0,0 +1,340 @@
+"""
+Benchmarks of the analysis hot paths, checked against stored baselines.
+
+Every stage runs on synthetic data shaped like the lab's own files, at sizes
+from 10^3 to 10^7 points (or 10 to 10^5 spectrum files):
+
+    noise_ingest       LabVIEW noise exports parsed into the sweep store (noise_store)
+    bandgap_ingest     Temperature,Resistance sweep CSVs (bandgap_reader)
+    concat             per-file DataFrames joined with pd.concat(axis=1), as the
+                       sweep scripts did before the store
+    combined           SweepStore.combined_dataframe of the same files
+    band_statistics    band averages of a (spectra x 41 frequencies) matrix
+    linearization      savgol_filter + np.gradient + argrelextrema of an R(T) curve
+    find_peaks         scipy find_peaks on every row of a fringe image (data.ipynb)
+    fringe_spacing     fringe_analysis.fringe_spacing of the same image
+    render_preview     a spectrum figure at PREVIEW_DPI (decimated)
+    render_publication the same figure at PUBLICATION_DPI with every point
+
+Each stage is timed as the best of a few samples. Calls shorter than
+MIN_SAMPLE are looped so that every sample lasts at least that long: a single
+run of a millisecond stage is dominated by timer and scheduler jitter. The
+peak Python memory is taken from a separate run under tracemalloc (which
+would slow the timed runs). Results are compared with benchmark_baselines.json; a stage more than
+TIME_TOLERANCE slower or MEMORY_TOLERANCE larger than its baseline is a
+regression, reported in a banner and with exit status 1:
+
+    python benchmark.py                      quick tier, compared with the baselines
+    python benchmark.py --tier full          every size up to 10^7 points / 10^5 files
+    python benchmark.py --update-baselines   store the results as the new baselines
+
+Baselines are only meaningful on the machine that wrote them; the machine is
+recorded with them and a warning is printed when it differs.
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+from scipy.signal import savgol_filter, argrelextrema, find_peaks
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+for _folder in ('Electrical_Noise', 'Semiconductor_Bandgap_Measurements', 'Zeeman_Effect'):
+    sys.path.append(os.path.join(_HERE, _folder))
+from noise_store import load_sweeps, read_noise_csv
+from band_stats import band_statistics
+from plot_rendering import render_figure, PREVIEW_DPI, PUBLICATION_DPI
+from bandgap_reader import read_sweep
+from fringe_analysis import fringe_spacing, HEIGHT, DISTANCE
+
+BASELINE_FILE = os.path.join(_HERE, 'benchmark_baselines.json')
+TIME_TOLERANCE = 0.5  # fractional slow-down counted as a regression
+MEMORY_TOLERANCE = 0.25  # fractional growth of the peak memory counted as a regression
+# Absolute slack so timer and allocator jitter on tiny stages is not flagged
+TIME_SLACK = 0.005  # s
+MEMORY_SLACK = 1 << 20  # bytes
+REPEAT = 3
+MIN_SAMPLE = 0.2  # s, shorter calls are looped until one timed sample lasts this long
+LONG_RUN = 1.0  # s, stages slower than this are timed once
+TIERS = {
+    'quick': {'points': [10 ** 3, 10 ** 5], 'files': [10, 100]},
+    'full': {'points': [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7], 'files': [10, 100, 10 ** 3, 10 ** 4, 10 ** 5]},
+}
+EXPORT_FREQUENCY = np.geomspace(10, 1e5, 41)
+IMAGE_WIDTH = 4032  # pixels, width of the Zeeman camera images
+FRINGE_PERIOD = 60  # pixels
+WINDOW_LENGTH = 99  # savgol_filter window of linearization.py
+POLYORDER = 3
+
+
+# Synthetic data
+
+def write_noise_sweep(directory, n_files, seed=0):
+    """n_files LabVIEW noise exports on the 41-point grid, named like the resistor sweeps."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    resistances = rng.uniform(1, 2000, n_files)  # kOhm
+    for i, R in enumerate(resistances):
+        noise = np.sqrt(4 * 1.380649e-23 * 295.65 * R * 1e3 + 1e-16 / EXPORT_FREQUENCY)
+        noise *= 1 + 0.05 * rng.standard_normal(EXPORT_FREQUENCY.size)
+        rows = '\n'.join(f"{f:.6f},{v:.6e}" for f, v in zip(EXPORT_FREQUENCY, noise))
+        with open(os.path.join(directory, f"Bench_{i:06d}_{R:.1f}KOhm_Metal.csv"), 'w') as f:
+            f.write("Frequency (Hz) - Plot 0,X noise (V per root Hz) - Plot 0\n" + rows + "\n")
+    return directory
+
+
+def resistance_curve(n_points, seed=0):
+    """(T, R) of a heating ramp through the extrinsic and intrinsic regions, with reading noise."""
+    rng = np.random.default_rng(seed)
+    T = np.linspace(300, 650, n_points)
+    # Falling extrinsic resistance with a minimum, then activated intrinsic conduction (Eg ~ 0.7 eV)
+    R = 40 + 0.05 * (T - 300) + 1e-4 * np.exp(0.7 * 1.602e-19 / (2 * 1.380649e-23 * T)) / 1e3
+    return T, R * (1 + 0.002 * rng.standard_normal(n_points))
+
+
+def write_bandgap_sweep(path, n_points, seed=0):
+    """A Temperature,Resistance sweep CSV with the LabVIEW date line."""
+    T, R = resistance_curve(n_points, seed)
+    with open(path, 'w') as f:
+        f.write("Semiconductor Band Gap Date: 2024-02-13,3:45 PM\nTemperature,Resistance\n")
+        np.savetxt(f, np.column_stack([T, R]), fmt='%.4f', delimiter=',')
+    return path
+
+
+def fringe_image(n_pixels, seed=0):
+    """Grayscale interferogram of about n_pixels, IMAGE_WIDTH wide, with vertical fringes and noise."""
+    rng = np.random.default_rng(seed)
+    width = min(IMAGE_WIDTH, n_pixels)
+    rows = max(n_pixels // width, 1)
+    columns = np.arange(width)
+    profile = 40 + 200 * np.cos(np.pi * columns / FRINGE_PERIOD) ** 2
+    return (profile + 8 * rng.standard_normal((rows, width))).astype(np.float32)
+
+
+def noise_matrix(n_points, seed=0):
+    """(spectra x 41) noise matrix with about n_points values."""
+    rng = np.random.default_rng(seed)
+    n_spectra = max(n_points // EXPORT_FREQUENCY.size, 1)
+    return np.abs(1e-7 * (1 + 0.05 * rng.standard_normal((n_spectra, EXPORT_FREQUENCY.size))))
+
+
+# Stages: each builds its input outside the timing and returns the call to time
+
+def _noise_ingest(size, workdir):
+    directory = write_noise_sweep(os.path.join(workdir, f'noise_{size}'), size)
+    return lambda: load_sweeps(directory, rebuild=True)
+
+
+def _bandgap_ingest(size, workdir):
+    path = write_bandgap_sweep(os.path.join(workdir, f'bandgap_{size}.csv'), size)
+    return lambda: read_sweep(path)
+
+
+def _concat(size, workdir):
+    directory = write_noise_sweep(os.path.join(workdir, f'noise_{size}'), size)
+    files = sorted(f for f in os.listdir(directory) if f.endswith('.csv'))
+    spectra = [read_noise_csv(os.path.join(directory, f)) for f in files]
+    frames = [pd.DataFrame({f: noise}, index=frequency) for f, (frequency, noise) in zip(files, spectra)]
+    return lambda: pd.concat(frames, axis=1)
+
+
+def _combined(size, workdir):
+    store = load_sweeps(write_noise_sweep(os.path.join(workdir, f'noise_{size}'), size))
+    return store.combined_dataframe
+
+
+def _band_statistics(size, workdir):
+    matrix = noise_matrix(size)
+    return lambda: band_statistics(EXPORT_FREQUENCY, matrix, (190, 1500))
+
+
+def _linearization(size, workdir):
+    T, R = resistance_curve(size)
+    window = min(WINDOW_LENGTH, size - (size % 2 == 0))
+
+    def run():
+        smoothed = savgol_filter(R, window, POLYORDER)
+        slope = np.gradient(np.log(smoothed), 1 / T)
+        return argrelextrema(slope, np.greater, order=5), argrelextrema(smoothed, np.less, order=5)
+    return run
+
+
+def _find_peaks(size, workdir):
+    gray = fringe_image(size)
+    return lambda: [find_peaks(row, height=HEIGHT, prominence=1, width=1, distance=DISTANCE)[0] for row in gray]
+
+
+def _fringe_spacing(size, workdir):
+    gray = fringe_image(size)
+    return lambda: fringe_spacing(gray, max_workers=1)
+
+
+def _render(preview, dpi):
+    def stage(size, workdir):
+        frequency = np.geomspace(10, 1e5, size)
+        noise = 1e-7 * (1 + 0.05 * np.random.default_rng(0).standard_normal(size))
+        spec = {'template': {'kind': 'spectrum', 'title': 'Benchmark', 'band': (190, 1500)},
+                'series': [{'x': frequency, 'y': noise, 'label': 'synthetic'},
+                           {'y': 1e-7, 'style': 'reference', 'color': 'C1'}],
+                'path': os.path.join(workdir, f'render_{size}_{dpi}.png'), 'preview': preview, 'dpi': dpi}
+        return lambda: render_figure(spec)
+    return stage
+
+
+# name: (stage, sized by 'points' or 'files')
+STAGES = {
+    'noise_ingest': (_noise_ingest, 'files'),
+    'bandgap_ingest': (_bandgap_ingest, 'points'),
+    'concat': (_concat, 'files'),
+    'combined': (_combined, 'files'),
+    'band_statistics': (_band_statistics, 'points'),
+    'linearization': (_linearization, 'points'),
+    'find_peaks': (_find_peaks, 'points'),
+    'fringe_spacing': (_fringe_spacing, 'points'),
+    'render_preview': (_render(True, PREVIEW_DPI), 'points'),
+    'render_publication': (_render(False, PUBLICATION_DPI), 'points'),
+}
+
+
+def _sample(run, loops):
+    # Mean seconds per call of `loops` back-to-back calls
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(loops):
+        run()
+    return (time.perf_counter() - start) / loops
+
+
+def measure(run, repeat=REPEAT, min_sample=MIN_SAMPLE):
+    """
+    (best seconds per call of `repeat` samples, peak traced bytes of one more
+    run) of a zero-argument call. Each sample loops the call until it lasts
+    at least `min_sample`; calls slower than LONG_RUN are timed only once.
+    """
+    per_call = _sample(run, 1)  # warm up caches and imports
+    if per_call > LONG_RUN:
+        repeat = 1
+    elif per_call < min_sample:
+        per_call = _sample(run, 1)  # the first call paid for the warm-up
+    loops = max(int(np.ceil(min_sample / max(per_call, 1e-9))), 1)
+    times = [_sample(run, loops) for _ in range(repeat)]
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def run_benchmarks(tier='quick', stages=None, repeat=REPEAT, workdir=None, min_sample=MIN_SAMPLE):
+    """
+    Results of every stage at every size of the tier, as a dict keyed
+    'stage:size' with the seconds, peak bytes and throughput (points or
+    files per second).
+    """
+    sizes = TIERS[tier]
+    results = {}
+    workdir = workdir or tempfile.mkdtemp(prefix='lab_bench_')
+    try:
+        for name in stages or STAGES:
+            stage, unit = STAGES[name]
+            for size in sizes[unit]:
+                seconds, peak = measure(stage(size, workdir), repeat, min_sample)
+                results[f'{name}:{size}'] = {'stage': name, 'size': size, 'unit': unit, 'seconds': seconds,
+                                             'peak_bytes': peak, 'throughput': size / seconds}
+                print(f"{name:20s} {size:>10d} {unit:6s} {seconds:10.4f} s {size / seconds:12.4g} {unit}/s "
+                      f"{peak / 2 ** 20:9.2f} MiB", flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def machine():
+    """Description of this machine stored with the baselines."""
+    return {'platform': platform.platform(), 'processor': platform.processor() or platform.machine(),
+            'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'cpus': os.cpu_count()}
+
+
+def load_baselines(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {'machine': None, 'results': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(results, path=BASELINE_FILE):
+    """Merge `results` into the stored baselines (other stages and sizes are kept)."""
+    baselines = load_baselines(path)
+    baselines['machine'] = machine()
+    baselines['results'].update({key: {'seconds': r['seconds'], 'peak_bytes': r['peak_bytes']}
+                                 for key, r in results.items()})
+    baselines['results'] = dict(sorted(baselines['results'].items()))
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=1)
+
+
+def regressions(results, baselines, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """A message for every result slower or larger than its baseline beyond the tolerances."""
+    found = []
+    for key, r in results.items():
+        base = baselines['results'].get(key)
+        if base is None:
+            continue
+        if r['seconds'] > base['seconds'] * (1 + time_tolerance) + TIME_SLACK:
+            found.append(f"{key}: {r['seconds']:.4f} s against a baseline of {base['seconds']:.4f} s "
+                         f"({r['seconds'] / base['seconds'] - 1:+.0%})")
+        if r['peak_bytes'] > base['peak_bytes'] * (1 + memory_tolerance) + MEMORY_SLACK:
+            found.append(f"{key}: peak {r['peak_bytes'] / 2 ** 20:.2f} MiB against a baseline of "
+                         f"{base['peak_bytes'] / 2 ** 20:.2f} MiB ({r['peak_bytes'] / base['peak_bytes'] - 1:+.0%})")
+    return found
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the analysis hot paths against stored baselines.")
+    parser.add_argument('--tier', choices=sorted(TIERS), default='quick', help="set of sizes to run")
+    parser.add_argument('--stage', action='append', choices=list(STAGES), help="stage to run (repeatable, default all)")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="timed samples per stage, the best is kept")
+    parser.add_argument('--min-sample', type=float, default=MIN_SAMPLE, help="shortest timed sample in seconds")
+    parser.add_argument('--baselines', default=BASELINE_FILE, help="baseline JSON file")
+    parser.add_argument('--update-baselines', action='store_true', help="store these results as the baselines")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.tier, args.stage, args.repeat, min_sample=args.min_sample)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'machine': machine(), 'results': results}, f, indent=1)
+    if args.update_baselines:
+        save_baselines(results, args.baselines)
+        print(f"Stored {len(results)} baselines in {args.baselines}")
+        sys.exit(0)
+
+    baselines = load_baselines(args.baselines)
+    missing = [key for key in results if key not in baselines['results']]
+    if missing:
+        print(f"No baseline for {', '.join(missing)}")
+    if baselines['machine'] and baselines['machine'] != machine():
+        print("Warning: the baselines were written on a different machine "
+              f"({baselines['machine']['processor']}, {baselines['machine']['cpus']} CPUs)")
+    found = regressions(results, baselines)
+    if found:
+        banner = '!' * 72
+        print(f"\n{banner}\nPERFORMANCE REGRESSION in {len(found)} measurement(s):", file=sys.stderr)
+        for message in found:
+            print(f"  {message}", file=sys.stderr)
+        print(banner, file=sys.stderr)
+        sys.exit(1)
+    print(f"No regressions in {len(results) - len(missing)} measurements against {args.baselines}")
@@ -0,0 +1,138 @@
+"""
+Monte Carlo / bootstrap uncertainties for the band gap and Boltzmann fits.
+
+The scripts report the linregress standard error only, while the stated
+instrument uncertainties (delta_T = 1 K and delta_R = 5 Ohm for the bandgap
+sweeps, Delta_T = 0.1 K and the 1% resistor tolerance for the noise sweeps)
+are declared but never propagated. Here every draw perturbs the inputs by
+those uncertainties (and, with bootstrap=True, also resamples the points with
+replacement), and the straight line is refitted in closed form.
+
+The draws for a chunk form one (n_draws, n_points) array and are all refitted
+at once, so there is no Python loop over draws. Chunks keep the memory
+bounded and can be spread over worker processes; each chunk has its own
+random stream spawned from `seed`, so the result does not depend on the
+number of workers.
+
+    result = bandgap_distribution(T, R_smoothed, n_draws=100000)
+    result['Eg']['mean'], result['Eg']['ci']
+"""
+
+import os
+import numpy as np
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from scipy.constants import Boltzmann, eV
+
+CHUNK_SIZE = 20000
+CONFIDENCE = 0.95
+
+
+def batched_slopes(x, y):
+    """
+    Least squares slope and intercept of y on x along the last axis, for any
+    number of leading (draw) axes. NaN points are left out of their own fit.
+    """
+    valid = np.isfinite(x) & np.isfinite(y)
+    x0 = np.where(valid, x, 0.0)
+    y0 = np.where(valid, y, 0.0)
+    n = valid.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = x0.sum(axis=-1) / n
+        y_mean = y0.sum(axis=-1) / n
+        dx = np.where(valid, x0 - x_mean[..., None], 0.0)
+        dy = np.where(valid, y0 - y_mean[..., None], 0.0)
+        slope = (dx * dy).sum(axis=-1) / (dx * dx).sum(axis=-1)
+    return slope, y_mean - slope * x_mean
+
+
+def _resample(rng, n_draws, n_points, bootstrap):
+    # Point indices of every draw (all points in order when not bootstrapping)
+    if bootstrap:
+        return rng.integers(0, n_points, size=(n_draws, n_points))
+    return np.broadcast_to(np.arange(n_points), (n_draws, n_points))
+
+
+def _bandgap_chunk(n_draws, seed, T, R, delta_T, delta_R, bootstrap):
+    rng = np.random.default_rng(seed)
+    idx = _resample(rng, n_draws, len(T), bootstrap)
+    T_draw = T[idx] + delta_T * rng.standard_normal(idx.shape)
+    R_draw = R[idx] + delta_R * rng.standard_normal(idx.shape)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Draws that push a resistance to or below zero drop that point
+        y = np.log(np.where(R_draw > 0, R_draw, np.nan) * T_draw ** 1.5)
+    slope, _ = batched_slopes(1 / T_draw, y)
+    return {'Eg': 2 * slope * Boltzmann / eV}
+
+
+def _boltzmann_chunk(n_draws, seed, R, V2, V2_err, T, delta_T, tolerance, bootstrap):
+    rng = np.random.default_rng(seed)
+    idx = _resample(rng, n_draws, len(R), bootstrap)
+    # Each resistor is off its nominal value by up to the tolerance; the
+    # temperature error is shared by every resistor in a draw
+    R_draw = R[idx] * (1 + tolerance * rng.standard_normal(idx.shape))
+    V2_draw = V2[idx] + V2_err[idx] * rng.standard_normal(idx.shape)
+    T_draw = T + delta_T * rng.standard_normal(n_draws)
+    slope, _ = batched_slopes(R_draw, V2_draw)
+    return {'k': slope / (4 * T_draw)}
+
+
+def run_draws(chunk_function, n_draws, seed=None, chunk_size=CHUNK_SIZE, max_workers=1):
+    """
+    Call chunk_function(n, seed) for chunks of at most `chunk_size` draws and
+    concatenate the returned sample arrays. max_workers > 1 (or None for all
+    cores) runs the chunks in worker processes; chunk_function must then be
+    picklable (a module level function or a partial of one).
+    """
+    sizes = [chunk_size] * (n_draws // chunk_size)
+    if n_draws % chunk_size:
+        sizes.append(n_draws % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if max_workers == 1 or len(sizes) <= 1:
+        chunks = [chunk_function(n, s) for n, s in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+            chunks = list(pool.map(chunk_function, sizes, seeds))
+    return {key: np.concatenate([c[key] for c in chunks]) for key in chunks[0]}
+
+
+def summarize(samples, confidence=CONFIDENCE):
+    """Mean, standard deviation, median and central confidence interval of a distribution."""
+    samples = np.asarray(samples)
+    samples = samples[np.isfinite(samples)]
+    tail = (1 - confidence) / 2 * 100
+    low, median, high = np.percentile(samples, [tail, 50, 100 - tail])
+    return {'mean': float(samples.mean()), 'std': float(samples.std(ddof=1)), 'median': float(median),
+            'ci': (float(low), float(high)), 'confidence': confidence, 'n': len(samples)}
+
+
+def bandgap_distribution(T, R, delta_T=1.0, delta_R=5.0, n_draws=100000, bootstrap=True, seed=None,
+                         chunk_size=CHUNK_SIZE, max_workers=1, confidence=CONFIDENCE):
+    """
+    Distribution of Eg from the ln(R T^3/2) vs 1/T fit of the points (T, R) in
+    the intrinsic window, with every temperature and resistance perturbed by
+    delta_T and delta_R (1 sigma). Returns {'samples': array, 'Eg': summary}.
+    """
+    T = np.asarray(T, dtype=np.float64)
+    R = np.asarray(R, dtype=np.float64)
+    chunk = partial(_bandgap_chunk, T=T, R=R, delta_T=delta_T, delta_R=delta_R, bootstrap=bootstrap)
+    samples = run_draws(chunk, n_draws, seed, chunk_size, max_workers)['Eg']
+    return {'samples': samples, 'Eg': summarize(samples, confidence)}
+
+
+def boltzmann_distribution(R, V2, V2_err, T, delta_T=0.1, tolerance=0.01, n_draws=100000, bootstrap=False,
+                           seed=None, chunk_size=CHUNK_SIZE, max_workers=1, confidence=CONFIDENCE):
+    """
+    Distribution of Boltzmann's constant from the V^2 = 4 k T R fit, with the
+    resistor tolerance, the V^2 uncertainties and the temperature uncertainty
+    (1 sigma each) propagated. Returns {'samples': array, 'k': summary}.
+    Bootstrapping is off by default: with a handful of resistors many
+    resamples contain only two or three distinct points.
+    """
+    R = np.asarray(R, dtype=np.float64)
+    V2 = np.asarray(V2, dtype=np.float64)
+    V2_err = np.broadcast_to(np.asarray(V2_err, dtype=np.float64), R.shape)
+    chunk = partial(_boltzmann_chunk, R=R, V2=V2, V2_err=V2_err, T=T, delta_T=delta_T,
+                    tolerance=tolerance, bootstrap=bootstrap)
+    samples = run_draws(chunk, n_draws, seed, chunk_size, max_workers)['k']
+    return {'samples': samples, 'k': summarize(samples, confidence)}
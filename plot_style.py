@@ -0,0 +1,27 @@
+"""
+Plot style shared by the lab scripts.
+
+The scripts each set plt.style.use('seaborn-whitegrid'), which was renamed
+'seaborn-v0_8-whitegrid' in matplotlib 3.6, and a 'figure.dpi' of 300-500,
+which turns every interactive figure into a huge raster. apply_style() picks
+the style name the installed matplotlib knows and keeps figures at screen
+resolution, with the high resolution only used when a figure is saved:
+
+    sys.path.append(<repository folder>)
+    from plot_style import apply_style
+    apply_style(publication_dpi=500)
+"""
+
+PREVIEW_DPI = 100
+PUBLICATION_DPI = 600
+STYLE = 'seaborn-v0_8-whitegrid'  # 'seaborn-whitegrid' before matplotlib 3.6
+
+
+def apply_style(preview_dpi=PREVIEW_DPI, publication_dpi=PUBLICATION_DPI, font_size=12):
+    """
+    The plot style used by the lab scripts, with screen-resolution figures and
+    `publication_dpi` only applied when a figure is saved.
+    """
+    import matplotlib.pyplot as plt
+    plt.style.use(STYLE if STYLE in plt.style.available else 'seaborn-whitegrid')
+    plt.rcParams.update({'font.size': font_size, 'figure.dpi': preview_dpi, 'savefig.dpi': publication_dpi})
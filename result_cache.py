@@ -0,0 +1,258 @@
+"""
+Content-addressed on-disk cache for derived analysis quantities.
+
+The raw CSVs never change once written, so a result such as a smoothed
+resistance curve, a set of band averages or a coil calibration fit is fully
+determined by the bytes of its input files, the function that computed it and
+the parameters it was called with (band limits, window size, poly order,
+temperature, ...). ResultCache.call() hashes those three things into a key
+and only runs the function when that key has not been seen before. The
+function is identified by its code, constants and default arguments and by
+the source of every repository module it uses (directly or through what it
+imports), so editing the function or anything it calls invalidates its
+entries.
+
+Entries are pickled into a cache directory (.analysis_cache at the top of the
+repository by default, or $LAB_CACHE_DIR) and tracked in a small sqlite index.
+When the total size goes over `max_bytes` the least recently used entries are
+evicted.
+"""
+
+import os
+import io
+import sys
+import time
+import types
+import pickle
+import sqlite3
+import hashlib
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.environ.get('LAB_CACHE_DIR',
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)), '.analysis_cache'))
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+# Bump to invalidate every entry when the key scheme changes
+CACHE_VERSION = 2
+_REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+_source_digests = {}
+
+
+def _update_digest(h, value):
+    # Feed a parameter value into the hash in a form that does not depend on
+    # dict ordering or on how numpy prints arrays
+    if isinstance(value, np.ndarray):
+        h.update(b'ndarray' + str(value.dtype).encode() + str(value.shape).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        h.update(b'dict')
+        for k in sorted(value, key=repr):
+            _update_digest(h, k)
+            _update_digest(h, value[k])
+    elif isinstance(value, (list, tuple)):
+        h.update(type(value).__name__.encode())
+        for item in value:
+            _update_digest(h, item)
+    elif isinstance(value, np.generic):
+        _update_digest(h, value.item())
+    else:
+        h.update(type(value).__name__.encode() + repr(value).encode())
+    h.update(b';')
+
+
+def _code_digest(h, code):
+    # Bytecode, referenced names and constants, recursing into nested functions
+    h.update(code.co_code)
+    h.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _code_digest(h, const)
+        else:
+            _update_digest(h, const)
+
+
+def _local_modules(module):
+    # Source files of the repository modules `module` uses, following the
+    # modules, functions and classes in its namespace
+    found, stack = set(), [module]
+    while stack:
+        m = stack.pop()
+        path = getattr(m, '__file__', None)
+        if not path or not path.endswith('.py'):
+            continue
+        path = os.path.abspath(path)
+        if path in found or not path.startswith(_REPO_ROOT + os.sep):
+            continue
+        found.add(path)
+        for value in list(vars(m).values()):
+            if isinstance(value, types.ModuleType):
+                stack.append(value)
+            else:
+                name = getattr(value, '__module__', None)
+                if isinstance(name, str) and name in sys.modules:
+                    stack.append(sys.modules[name])
+    return sorted(found)
+
+
+def _source_digest(path):
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _source_digests:
+        with open(path, 'rb') as f:
+            _source_digests[key] = hashlib.sha256(f.read()).hexdigest()
+    return _source_digests[key]
+
+
+def function_id(func):
+    """
+    Name of a function and a hash of its code, constants, default arguments
+    and the source of the repository modules it depends on, so editing any of
+    them invalidates its entries.
+    """
+    h = hashlib.sha256(f'v{CACHE_VERSION}'.encode())
+    code = getattr(func, '__code__', None)
+    if code is not None:
+        _code_digest(h, code)
+    _update_digest(h, getattr(func, '__defaults__', None))
+    _update_digest(h, getattr(func, '__kwdefaults__', None))
+    for path in _local_modules(sys.modules.get(getattr(func, '__module__', None) or '')):
+        h.update(_source_digest(path).encode())
+    return f"{func.__module__}.{getattr(func, '__qualname__', func.__name__)}:{h.hexdigest()[:16]}"
+
+
+class ResultCache:
+    """Size-bounded, least-recently-used cache of analysis results keyed by input content."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), timeout=30)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS entries '
+                             '(key TEXT PRIMARY KEY, size INTEGER, last_access REAL)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS file_hashes '
+                             '(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT)')
+
+    #%% Keys
+
+    def file_digest(self, path):
+        """
+        sha256 of a file's content. The digest is remembered against the file's
+        size and modification time so unchanged files are not re-read.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        row = self._db.execute('SELECT size, mtime_ns, digest FROM file_hashes WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        digest = h.hexdigest()
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)',
+                             (path, stat.st_size, stat.st_mtime_ns, digest))
+        return digest
+
+    def key(self, name, files=(), params=None):
+        """Cache key for `name` applied to the content of `files` with `params`."""
+        h = hashlib.sha256(name.encode())
+        for path in files:
+            h.update(self.file_digest(path).encode())
+        _update_digest(h, params or {})
+        return h.hexdigest()
+
+    #%% Storage
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.pkl')
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+        with self._db:
+            self._db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+        return value
+
+    def put(self, key, value):
+        buffer = io.BytesIO()
+        pickle.dump(value, buffer, protocol=pickle.HIGHEST_PROTOCOL)
+        data = buffer.getvalue()
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._db:
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?)', (key, len(data), time.time()))
+        self.evict()
+
+    def evict(self, max_bytes=None):
+        """Delete least recently used entries until the cache fits in `max_bytes`."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= max_bytes:
+            return
+        rows = self._db.execute('SELECT key, size FROM entries ORDER BY last_access').fetchall()
+        removed = []
+        for key, size in rows:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            removed.append((key,))
+            total -= size
+        with self._db:
+            self._db.executemany('DELETE FROM entries WHERE key = ?', removed)
+
+    def clear(self):
+        self.evict(max_bytes=0)
+
+    #%% Memoized calls
+
+    def get_or_compute(self, name, files, params, compute):
+        """Cached value for (name, file contents, params), running compute() on a miss."""
+        key = self.key(name, files, params)
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def call(self, func, files, *args, **kwargs):
+        """
+        func(*files, *args, **kwargs), or its cached result if the same function
+        has already been run on files with identical content and the same
+        arguments.
+        """
+        files = [files] if isinstance(files, (str, os.PathLike)) else list(files)
+        return self.get_or_compute(function_id(func), files, {'args': args, 'kwargs': kwargs},
+                                   lambda: func(*files, *args, **kwargs))
+
+
+_default_cache = None
+_default_cache_pid = None
+
+
+def default_cache():
+    """The process-wide cache in DEFAULT_CACHE_DIR."""
+    global _default_cache, _default_cache_pid
+    # A forked worker must not reuse its parent's sqlite connection
+    if _default_cache is None or _default_cache_pid != os.getpid():
+        _default_cache = ResultCache()
+        _default_cache_pid = os.getpid()
+    return _default_cache
+
+
+def cached_call(func, files, *args, **kwargs):
+    """ResultCache.call on the default cache."""
+    return default_cache().call(func, files, *args, **kwargs)